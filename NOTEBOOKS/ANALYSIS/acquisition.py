@@ -0,0 +1,683 @@
+"""
+Acquisition buffers
+
+The recorders turn every `board.get_board_data()` chunk into Python objects: `datacollectormain` appends one list per
+sample (`[sample[ch] for ch in eeg_channels]`), `datarecorder2` one tuple per sample (`zip` over nine rows). Over a
+long session at 256 Hz that's millions of small objects for the GC to walk. `SampleBuffer` keeps samples in one
+preallocated float array instead; each chunk goes in with a slice assignment, and readers get views, not copies.
+
+    buffer = SampleBuffer(len(rows), rows=rows)                # whole session, grows by doubling
+    buffer.append(board.get_board_data())
+    buffer.data                                                # (n_rows, n_samples) view
+
+    ring = SampleBuffer(9, capacity=4 * SFREQ, ring=True)      # last 4 s only, fixed memory
+    ring.window(start, stop)                                   # (n_rows, stop - start) view, any position
+
+The ring stores every sample twice (at i and i + capacity), so any window up to `capacity` long is one contiguous
+slice -- a view even when it wraps around the end.
+
+*One writer thread; readers must copy a ring view they keep, since the ring overwrites it eventually.*
+
+The recorders also used to keep the whole session in memory and write `P300.csv` only after the pygame loop ended:
+a crash or Bluetooth drop lost everything, and the final `writerows` stalled for seconds. `SessionWriter` streams
+chunks to disk from a background thread instead:
+
+    writer = SessionWriter(session_path("P300.csv"), header, rows=rows)  # spools to P300_<start time>.csv.part
+    writer.write(board.get_board_data())                                  # collector thread: just a queue put
+    writer.close()                                                        # clean exit: the CSV, same layout as before
+
+After a crash, `recover("P300_<start time>.csv.part")` turns the spool into the CSV (everything up to the last fsync
+survives).
+
+`MarkerAligner` puts each stimulus marker on the sample recorded closest to the stimulus onset, using the board's
+timestamp row, instead of on whatever chunk the collector thread happens to read next:
+
+    aligner.mark(2)                                            # stimulus loop, right after display.flip()
+    aligner.stamp(data); writer.write(data)                    # collector thread
+    aligner.report()                                           # onset -> sample error, ms
+
+`lsl.py` used to poll in a tight loop on the main thread and append every chunk with its own `to_csv(mode='a')`
+(thousands of file opens a second, mostly for a handful of samples). `BoardPoller` + `CsvAppender` split that into
+a producer and a consumer:
+
+    appender = CsvAppender("live.csv", names, rows=eeg_rows)   # file opened once, header written once
+    poller = BoardPoller(board, appender.write)                # polls every 0.1 s in a thread
+    poller.start(); ...; poller.stop(); appender.close()
+    appender.stats                                             # buffered / written / dropped samples
+"""
+
+
+import os
+import json
+import queue
+import threading
+import time
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from preprocess import SFREQ, _write_json
+
+
+class SampleBuffer:
+    """
+    Preallocated (n_rows, n_samples) sample store, channels in rows like BrainFlow.
+
+    Functionality:
+    - `append`: Copy one chunk in (optionally only some of the board's rows).
+    - `data`: All samples so far (growing buffer), as a view.
+    - `window` / `latest`: Any stretch of retained samples by absolute sample index, as a view.
+    - `n_samples`: Samples appended since the start; `first`: oldest sample still held.
+    """
+
+    def __init__(
+        self,
+        n_rows: int,
+        capacity: int = 60 * SFREQ,
+        ring: bool = False,
+        rows: list[int] = None,
+        dtype=np.float64
+    ):
+        """
+        Parameters:
+        - `n_rows`: Rows stored per sample.
+        - `capacity`: Samples held. Growing buffer: initial size, doubled when full. Ring: fixed, oldest dropped.
+        - `rows`: Rows of each appended chunk to keep (e.g. EEG + marker rows of the board data). Default: all.
+        """
+
+        self.n_rows = n_rows
+        self.capacity = capacity
+        self.ring = ring
+        self.rows = None if rows is None else list(rows)
+        self._data = np.empty((n_rows, 2 * capacity if ring else capacity), dtype=dtype)
+        self.n_samples = 0
+
+
+    def __len__(self) -> int:
+        return self.n_samples - self.first
+
+
+    @property
+    def first(self) -> int:
+        return max(self.n_samples - self.capacity, 0) if self.ring else 0
+
+
+    def append(self, chunk: np.ndarray) -> None:
+        """
+        Copy a (n_board_rows, n) chunk (e.g. straight from `get_board_data()`) into the buffer.
+        """
+
+        if self.rows is not None:
+            chunk = chunk[self.rows]
+        n = chunk.shape[1]
+        if n == 0:
+            return
+
+        if not self.ring:
+            if self.n_samples + n > self.capacity: # grow: amortized O(1) per sample
+                self.capacity = max(2 * self.capacity, self.n_samples + n)
+                grown = np.empty((self.n_rows, self.capacity), dtype=self._data.dtype)
+                grown[:, :self.n_samples] = self._data[:, :self.n_samples]
+                self._data = grown
+            self._data[:, self.n_samples:self.n_samples + n] = chunk
+            self.n_samples += n
+            return
+
+        cap = self.capacity
+        if n > cap: # only the newest `cap` samples can be kept
+            chunk = chunk[:, -cap:]
+            self.n_samples += n - cap
+            n = cap
+
+        # Write at p.. (p < cap, so it fits in 2 * cap), then mirror every sample to its other copy
+        p = self.n_samples % cap
+        self._data[:, p:p + n] = chunk
+        low = min(p + n, cap) - p # samples that landed below `cap`: mirror above; the rest: mirror to the start
+        self._data[:, p + cap:p + cap + low] = chunk[:, :low]
+        self._data[:, :n - low] = chunk[:, low:]
+        self.n_samples += n
+
+
+    @property
+    def data(self) -> np.ndarray:
+        """
+        Every retained sample, oldest first, as a (n_rows, len(self)) view.
+        """
+
+        if self.ring:
+            return self.window(self.first, self.n_samples)
+        return self._data[:, :self.n_samples]
+
+
+    def window(self, start: int, stop: int) -> np.ndarray:
+        """
+        Samples `start`..`stop` (absolute indices, stop exclusive) as a (n_rows, stop - start) view.
+        """
+
+        if start < self.first or stop > self.n_samples or start > stop:
+            raise IndexError(f"Samples {start}:{stop} not in buffer (holds {self.first}:{self.n_samples}).")
+
+        if not self.ring:
+            return self._data[:, start:stop]
+        p = start % self.capacity
+        return self._data[:, p:p + stop - start]
+
+
+    def latest(self, n: int) -> np.ndarray:
+        return self.window(self.n_samples - n, self.n_samples)
+
+
+
+FSYNC_INTERVAL = 1.0 # s between fsyncs of the spool: at most this much is lost on a power cut / kernel crash
+WRITER_QUEUE_SIZE = 256 # chunks (~25 s of 0.1 s chunks) the writer may fall behind before `write` blocks
+FINALIZE_FORMATS = ("csv", "npy", None)
+
+
+class SessionWriter:
+    """
+    Crash-safe, incremental session recording.
+
+    Functionality:
+    - `write`: Queue one (n_board_rows, n) chunk; returns immediately unless the writer is `queue_size` chunks behind.
+    - `close`: Drain the queue, then finalize the spool into `path` (CSV in the recorders' layout, or .npy).
+    - `stats`: Samples written, chunks queued, fsyncs done.
+
+    A background thread appends each chunk, as raw float64 samples (row-major, one row per sample), to `path + ".part"`
+    and flushes + fsyncs it every `fsync_interval` s. `path + ".part.json"` holds the header, so a spool is readable
+    on its own (`recover`).
+    """
+
+    def __init__(
+        self,
+        path: str,
+        columns: list[str],
+        rows: list[int] = None,
+        finalize: str | None = "csv",
+        fsync_interval: float = FSYNC_INTERVAL,
+        queue_size: int = WRITER_QUEUE_SIZE
+    ):
+        """
+        Parameters:
+        - `path`: Final file. Refuses to start if it, or a spool for it, already exists (no silent overwrites).
+        - `columns`: Header, one name per stored row.
+        - `rows`: Rows of each chunk to store (e.g. package number, EEG rows, marker row). Default: all.
+        - `finalize`: "csv", "npy" or None (keep the spool).
+        """
+
+        if finalize not in FINALIZE_FORMATS:
+            raise ValueError(f"Finalize format {finalize!r} not one of {FINALIZE_FORMATS}.")
+
+        self.path = os.path.abspath(path)
+        self.spool_path = self.path + ".part"
+        for existing in (self.path, self.spool_path):
+            if os.path.exists(existing):
+                raise FileExistsError(f"{existing} already exists; move it or pick another path.")
+
+        self.columns = list(columns)
+        self.rows = None if rows is None else list(rows)
+        self.finalize = finalize
+        self.fsync_interval = fsync_interval
+        self.stats = {"samples": 0, "chunks": 0, "fsyncs": 0}
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        _write_json(self.spool_path + ".json", {"columns": self.columns, "dtype": "float64"})
+        self._file = open(self.spool_path, "wb")
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._error = None
+        self._closing = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+
+    def write(self, chunk: np.ndarray) -> None:
+        """
+        Queue a chunk with samples in columns, like `get_board_data()`. Selected rows are copied here, so the
+        caller may reuse `chunk`.
+        """
+
+        if self._error is not None:
+            raise RuntimeError("Session writer failed.") from self._error
+
+        chunk = chunk[self.rows] if self.rows is not None else np.array(chunk)
+        if chunk.shape[0] != len(self.columns):
+            raise ValueError(f"Expected {len(self.columns)} rows, got {chunk.shape[0]}.")
+        if chunk.shape[1]:
+            self._put(chunk)
+            if self._error is not None: # died while we waited
+                raise RuntimeError("Session writer failed.") from self._error
+
+
+    def _put(self, item) -> None:
+        # Waits while the writer is behind, but not on one that has died (its full queue would never drain)
+        while self._thread.is_alive():
+            try:
+                self._queue.put(item, timeout=self.fsync_interval)
+                return
+            except queue.Full:
+                pass
+
+
+    def _run(self) -> None:
+        last_sync = time.monotonic()
+        try:
+            while True:
+                try:
+                    chunk = self._queue.get(timeout=self.fsync_interval)
+                except queue.Empty: # nothing new; still sync below
+                    chunk = None if self._closing else np.empty((len(self.columns), 0))
+                if chunk is None:
+                    break
+
+                if chunk.shape[1]:
+                    self._file.write(np.ascontiguousarray(chunk.T, dtype=np.float64).tobytes())
+                    self.stats["samples"] += chunk.shape[1]
+                    self.stats["chunks"] += 1
+
+                if time.monotonic() - last_sync >= self.fsync_interval:
+                    self._sync()
+                    last_sync = time.monotonic()
+        except Exception as e: # surfaced on the next `write` / `close`
+            self._error = e
+
+        try:
+            self._sync()
+            self._file.close()
+        except Exception as e: # e.g. the same full disk again; the first error is the one reported
+            self._error = self._error or e
+
+
+    def _sync(self) -> None:
+        if not self._file.closed:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self.stats["fsyncs"] += 1
+
+
+    def close(self) -> str:
+        """
+        Stop the writer (after everything queued is on disk) and finalize. Returns the path of the recording.
+        """
+
+        self._closing = True
+        self._put(None)
+        self._thread.join()
+        if self._error is not None:
+            raise RuntimeError(f"Session writer failed; spool kept at {self.spool_path}.") from self._error
+
+        if self.finalize is None:
+            return self.spool_path
+        return recover(self.spool_path, self.finalize)
+
+
+def session_path(path: str) -> str:
+    """
+    `path` with the local start time before the extension (P300.csv -> P300_2024-12-25_14-03-59.csv), so every
+    run of a recorder gets its own file instead of `SessionWriter` refusing to start.
+    """
+
+    root, ext = os.path.splitext(path)
+    return f"{root}_{time.strftime('%Y-%m-%d_%H-%M-%S')}{ext}"
+
+
+def recover(spool_path: str, fmt: str = "csv", chunk_rows: int = 1 << 16) -> str:
+    """
+    Turn a `SessionWriter` spool into the final file (`spool_path` minus ".part"), then delete the spool.
+    - "csv": header + one line per sample, written in `chunk_rows` blocks so memory stays flat.
+    - "npy": (n_samples, n_columns) float64 array; header in the ".json" next to it.
+    A partially written last sample (crash mid-write) is dropped.
+    """
+
+    with open(spool_path + ".json", "r") as f:
+        meta = json.load(f)
+    columns = meta["columns"]
+    path = spool_path[:-len(".part")]
+
+    n_samples = os.path.getsize(spool_path) // (8 * len(columns))
+    data = np.memmap(spool_path, dtype=meta["dtype"], mode="r", shape=(n_samples, len(columns))) if n_samples else \
+        np.empty((0, len(columns)))
+
+    if fmt == "npy":
+        path = os.path.splitext(path)[0] + ".npy"
+        np.save(path, data)
+        _write_json(path + ".json", meta)
+    else:
+        tmp_path = path + ".tmp"
+        pd.DataFrame(columns=columns).to_csv(tmp_path, index=False)
+        for start in range(0, n_samples, chunk_rows):
+            pd.DataFrame(data[start:start + chunk_rows]).to_csv(tmp_path, mode="a", header=False, index=False)
+        os.replace(tmp_path, path)
+
+    del data
+    os.remove(spool_path)
+    os.remove(spool_path + ".json")
+    return path
+
+
+class MarkerAligner:
+    """
+    Timestamp-accurate marker placement.
+
+    Functionality:
+    - `mark`: Stimulus onset with marker `value`. Call right after the flip that shows the stimulus.
+    - `stamp`: Write pending markers into a chunk's marker row, each on the sample whose board timestamp is nearest
+      to its onset. Markers newer than the chunk wait for the next one.
+    - `report` / `save`: Alignment error (sample time - onset time) over the recording, ms.
+
+    BrainFlow timestamps are unix time (`time.time()`), so onsets use that clock. The error left is half a sample
+    (~2 ms) plus, for an onset landing between two chunks, the distance to the new chunk's first sample
+    (it's reported, not hidden).
+    """
+
+    def __init__(self, timestamp_channel: int, marker_channel: int, sfreq: float = SFREQ):
+        self.timestamp_channel = timestamp_channel
+        self.marker_channel = marker_channel
+        self.sfreq = sfreq
+        self._pending = deque() # (onset time, value); appended by the stimulus loop, popped by the collector
+        self._errors = []
+        self.collisions = 0 # markers that landed on a sample already holding one (the later one wins)
+
+
+    def mark(self, value: int) -> None:
+        self._pending.append((time.time(), value))
+
+
+    def stamp(self, data: np.ndarray) -> None:
+        """
+        Set `data`'s marker row (zeros + the markers due in this chunk), in place.
+        """
+
+        data[self.marker_channel] = 0
+        if data.shape[1] == 0:
+            return
+
+        ts = data[self.timestamp_channel]
+        half_sample = 0.5 / self.sfreq
+        while self._pending and self._pending[0][0] <= ts[-1] + half_sample:
+            onset, value = self._pending.popleft()
+            i = min(int(np.searchsorted(ts, onset)), len(ts) - 1)
+            if i > 0 and onset - ts[i - 1] < ts[i] - onset:
+                i -= 1
+
+            if data[self.marker_channel, i] != 0:
+                self.collisions += 1
+            data[self.marker_channel, i] = value
+            self._errors.append(ts[i] - onset)
+
+
+    def report(self) -> dict:
+        """
+        n_markers, pending (never stamped), mean / std / max |error| in ms, and the share within one sample.
+        """
+
+        errors = np.asarray(self._errors) * 1e3
+        if len(errors) == 0:
+            return {"n_markers": 0, "pending": len(self._pending)}
+        return {
+            "n_markers": len(errors),
+            "pending": len(self._pending),
+            "mean_ms": float(errors.mean()),
+            "std_ms": float(errors.std()),
+            "max_abs_ms": float(np.abs(errors).max()),
+            "within_one_sample": float(np.mean(np.abs(errors) <= 1e3 / self.sfreq)),
+            "collisions": self.collisions,
+        }
+
+
+    def save(self, path: str) -> dict:
+        report = self.report()
+        _write_json(path, report)
+        return report
+
+
+POLL_INTERVAL = 0.1 # s between `get_board_data()` calls (~26 samples at 256 Hz)
+APPEND_INTERVAL = 1.0 # s of chunks `CsvAppender` coalesces into one write
+APPEND_MAX_BUFFERED = 60 * SFREQ # samples waiting to be written before new chunks are dropped
+
+
+class BoardPoller:
+    """
+    Producer thread: reads the board at a fixed cadence and hands each chunk to a sink.
+
+    Functionality:
+    - `start` / `stop`: Poll `board.get_board_data()` every `poll_interval` s in a daemon thread. `stop` does one last
+      poll, so nothing the board buffered before it is left behind.
+    - `stats`: Polls, empty polls, samples read.
+
+    The cadence is kept on a fixed schedule (a slow sink delays one poll, not all the following ones). `sink` runs on
+    the polling thread, so it should return quickly (`CsvAppender.write` does). An error in `sink` stops the poller
+    and is raised by `stop`.
+    """
+
+    def __init__(self, board, sink, poll_interval: float = POLL_INTERVAL):
+        self.board = board
+        self.sink = sink
+        self.poll_interval = poll_interval
+        self.stats = {"polls": 0, "empty_polls": 0, "samples": 0}
+
+        self._error = None
+        self._thread = None
+        self._stopping = threading.Event()
+
+
+    def poll(self) -> int:
+        """
+        One `get_board_data()` -> `sink`. Returns the number of samples read.
+        """
+
+        data = self.board.get_board_data()
+        self.stats["polls"] += 1
+        if data.shape[1] == 0:
+            self.stats["empty_polls"] += 1
+            return 0
+
+        self.sink(data)
+        self.stats["samples"] += data.shape[1]
+        return data.shape[1]
+
+
+    def _run(self) -> None:
+        next_poll = time.monotonic()
+        try:
+            while True:
+                self.poll()
+                next_poll = max(next_poll + self.poll_interval, time.monotonic())
+                if self._stopping.wait(next_poll - time.monotonic()):
+                    break
+        except Exception as e: # surfaced by `stop`
+            self._error = e
+
+
+    def start(self) -> None:
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+
+    def stop(self) -> None:
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._error is not None:
+            raise RuntimeError("Board poller failed.") from self._error
+        self.poll()
+
+
+class CsvAppender:
+    """
+    Live CSV that grows in large sequential writes.
+
+    Functionality:
+    - `write`: Hand over one (n_board_rows, n) chunk. Never blocks: if `max_buffered` samples are already waiting,
+      the chunk is dropped (and counted) rather than stalling the poller.
+    - `close`: Write out whatever is buffered, then close the file.
+    - `stats`: Samples buffered (waiting), written and dropped; batches (writes) done.
+
+    The file is opened once and the header written once. A background thread wakes every `flush_interval` s, takes
+    every chunk that arrived since, and appends them as one block (`to_csv` on the open file, then a flush so the
+    file can be tailed while it grows).
+    """
+
+    def __init__(
+        self,
+        path: str,
+        columns: list[str],
+        rows: list[int] = None,
+        flush_interval: float = APPEND_INTERVAL,
+        max_buffered: int = APPEND_MAX_BUFFERED
+    ):
+        """
+        Parameters:
+        - `path`: CSV to write. Replaced if it exists (a live file is per session).
+        - `columns`: Header, one name per stored row.
+        - `rows`: Rows of each chunk to store (e.g. `BoardShim.get_eeg_channels`). Default: all.
+        - `flush_interval`: s between writes; longer = fewer, bigger writes, more lost if the process dies.
+        - `max_buffered`: Samples allowed to wait for the writer (default 60 s) before chunks are dropped.
+        """
+
+        self.path = os.path.abspath(path)
+        self.columns = list(columns)
+        self.rows = None if rows is None else list(rows)
+        self.flush_interval = flush_interval
+        self.max_buffered = max_buffered
+        self.stats = {"buffered": 0, "written": 0, "dropped": 0, "batches": 0}
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._file = open(self.path, "w", newline="")
+        pd.DataFrame(columns=self.columns).to_csv(self._file, index=False)
+        self._file.flush()
+
+        self._chunks = [] # waiting for the writer; swapped out whole under the lock
+        self._lock = threading.Lock()
+        self._error = None
+        self._closing = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+
+    def write(self, chunk: np.ndarray) -> None:
+        """
+        Buffer a chunk with samples in columns, like `get_board_data()`. Selected rows are copied here, so the
+        caller may reuse `chunk`.
+        """
+
+        if self._error is not None:
+            raise RuntimeError("CSV appender failed.") from self._error
+
+        chunk = chunk[self.rows] if self.rows is not None else np.array(chunk)
+        if chunk.shape[0] != len(self.columns):
+            raise ValueError(f"Expected {len(self.columns)} rows, got {chunk.shape[0]}.")
+
+        n = chunk.shape[1]
+        with self._lock:
+            if self.stats["buffered"] + n > self.max_buffered:
+                self.stats["dropped"] += n
+                return
+            if n:
+                self._chunks.append(chunk)
+                self.stats["buffered"] += n
+
+
+    def _run(self) -> None:
+        try:
+            while not self._closing.wait(self.flush_interval):
+                self._flush()
+        except Exception as e: # surfaced on the next `write` / `close`
+            self._error = e
+            return
+        self._flush()
+
+
+    def _flush(self) -> None:
+        with self._lock:
+            chunks, self._chunks = self._chunks, []
+        if not chunks:
+            return
+
+        block = np.concatenate(chunks, axis=1).T
+        pd.DataFrame(block, columns=self.columns).to_csv(self._file, header=False, index=False)
+        self._file.flush()
+
+        with self._lock:
+            self.stats["buffered"] -= len(block)
+        self.stats["written"] += len(block)
+        self.stats["batches"] += 1
+
+
+    def close(self) -> str:
+        """
+        Write out everything buffered and close the file. Returns its path.
+        """
+
+        self._closing.set()
+        self._thread.join()
+        self._file.close()
+        if self._error is not None:
+            raise RuntimeError(f"CSV appender failed; {self.path} holds what was written before.") from self._error
+        return self.path
+
+
+
+if __name__ == "__main__":
+    import time
+    import tracemalloc
+
+    rng = np.random.default_rng(0)
+    chunks = [rng.standard_normal((32, rng.integers(0, 40))) for _ in range(2000)] # ~8 min of Crown-sized chunks
+    rows = list(range(1, 9)) + [31]
+
+    # Old way: list of per-sample lists
+    tracemalloc.start()
+    start = time.perf_counter()
+    samples = []
+    for chunk in chunks:
+        for sample in chunk.T:
+            samples.append([sample[ch] for ch in rows])
+    elapsed, peak = time.perf_counter() - start, tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"lists: {elapsed:.3f}s, peak {peak / 1e6:.1f} MB")
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    buffer = SampleBuffer(len(rows), rows=rows)
+    for chunk in chunks:
+        buffer.append(chunk)
+    elapsed, peak = time.perf_counter() - start, tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"SampleBuffer: {elapsed:.3f}s, peak {peak / 1e6:.1f} MB, same data: {np.array_equal(buffer.data.T, samples)}")
+
+    # Ring: every window is a view and matches the growing buffer
+    ring = SampleBuffer(len(rows), capacity=4 * SFREQ, ring=True, rows=rows)
+    for chunk in chunks:
+        ring.append(chunk)
+    w = ring.window(ring.n_samples - 700, ring.n_samples - 10)
+    print(f"ring window is a view: {np.shares_memory(w, ring._data)}, "
+          f"matches: {np.array_equal(w, buffer.window(ring.n_samples - 700, ring.n_samples - 10))}")
+
+    # Live CSV: one `to_csv(mode='a')` per poll vs. `CsvAppender`, same file either way
+    class FakeBoard:
+        def __init__(self):
+            self.chunks = iter(chunks)
+
+        def get_board_data(self):
+            return next(self.chunks, np.empty((32, 0)))
+
+    old_path, new_path = "acquisition_demo_old.csv", "acquisition_demo_new.csv"
+    start = time.perf_counter()
+    for chunk in chunks:
+        pd.DataFrame(chunk[rows].T, columns=[str(r) for r in rows]).to_csv(
+            old_path, mode="a", header=not os.path.exists(old_path), index=False
+        )
+    print(f"append per chunk: {time.perf_counter() - start:.3f}s, {len(chunks)} writes")
+
+    start = time.perf_counter()
+    appender = CsvAppender(new_path, [str(r) for r in rows], rows=rows, flush_interval=0.05, max_buffered=buffer.n_samples)
+    poller = BoardPoller(FakeBoard(), appender.write)
+    for _ in chunks: # polled back to back instead of in real time (that would take ~8 min)
+        poller.poll()
+    appender.close()
+    print(f"CsvAppender: {time.perf_counter() - start:.3f}s, {appender.stats}, poller {poller.stats}")
+    print("same file:", pd.read_csv(old_path).equals(pd.read_csv(new_path)))
+    os.remove(old_path), os.remove(new_path)
@@ -0,0 +1,243 @@
+"""
+Pipeline cache
+
+Disk cache for intermediate products of the preprocessing pipeline: filtered continuous data, event arrays,
+epoch tensors. Entries are content-addressed: the key is a hash of the source files' contents (SHA-1, from the
+sidecar) + the stage name + the exact parameters used (band, notch, tmin/tmax, picks, ...). Change either and it's
+a different entry, so nothing ever needs invalidating by hand. Old entries are evicted least-recently-used once the
+cache grows past `max_bytes`.
+
+    cache = PipelineCache()
+    arrays = cache.cached(
+        "epochs", path, {"band": (1, 18), "notch": 60, "tmin": -0.1, "tmax": 0.6},
+        lambda: {"X": X, "y": y}     # only runs on a miss
+    )
+
+Each entry is a folder of `.npy` files (loaded memory-mapped) + `meta.json`, under `.speakeeg_cache/pipeline/`.
+"""
+
+
+import os
+import json
+import time
+import shutil
+import hashlib
+
+import numpy as np
+
+from preprocess import CACHE_DIR_NAME, source_digest, _write_json
+
+
+CACHE_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", CACHE_DIR_NAME, "pipeline")
+CACHE_MAX_BYTES = 4 << 30 # 4 GiB
+CACHE_VERSION = 1 # bump when the entry layout changes; old entries just stop matching and get evicted
+
+
+def _jsonable(obj):
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, (set, frozenset)):
+        return sorted(obj)
+    raise TypeError(f"Can't use {type(obj).__name__} as a cache parameter.")
+
+
+def _glob_meta(root: str) -> list[str]:
+    # <root>/<2-char prefix>/<key>/meta.json; temp folders (".tmp<pid>") are skipped
+    paths = []
+    for prefix in os.listdir(root):
+        prefix_dir = os.path.join(root, prefix)
+        if not os.path.isdir(prefix_dir):
+            continue
+        for key in os.listdir(prefix_dir):
+            if ".tmp" not in key:
+                paths.append(os.path.join(prefix_dir, key, "meta.json"))
+    return paths
+
+
+class PipelineCache:
+    """
+    Size-bounded, content-addressed store of named NumPy arrays.
+
+    Functionality:
+    - `key`: Cache key for (stage, source files, parameters).
+    - `get` / `put`: Read (memory-mapped) / write one entry's arrays.
+    - `cached`: `get`, or compute + `put` on a miss.
+    - `evict`: Drop least-recently-used entries until the cache fits in `max_bytes`.
+    - `entries`, `clear`: Inspect / empty the cache.
+
+    The files are the only state (no shared index), so several processes can use the same cache.
+    Recency is the mtime of each entry's `meta.json`, bumped on every hit.
+    """
+
+    def __init__(self, root: str = CACHE_ROOT, max_bytes: int = CACHE_MAX_BYTES):
+        self.root = os.path.abspath(root)
+        self.max_bytes = max_bytes
+        os.makedirs(self.root, exist_ok=True)
+
+
+    def key(self, stage: str, sources: str | list[str], **params) -> str:
+        """
+        Hex key for `stage` run on `sources` (CSV paths) with `params`.
+        - Sources are identified by content, so a renamed/copied file still hits and an edited one misses.
+        - Params must be JSON-able (tuples == lists; numpy scalars/arrays are converted).
+        """
+
+        sources = [sources] if isinstance(sources, str) else list(sources)
+        payload = {
+            "version": CACHE_VERSION,
+            "stage": stage,
+            "sources": [source_digest(source) for source in sources],
+            "params": params,
+        }
+        encoded = json.dumps(payload, sort_keys=True, default=_jsonable).encode()
+        return hashlib.sha1(encoded).hexdigest()
+
+
+    def _entry_dir(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+
+    def get(self, key: str) -> dict[str, np.ndarray] | None:
+        """
+        Arrays stored under `key` (copy-on-write memmaps), or None on a miss.
+        """
+
+        entry_dir = self._entry_dir(key)
+        arrays = self._load(entry_dir)
+        if arrays is not None:
+            os.utime(os.path.join(entry_dir, "meta.json")) # mark as recently used
+
+        return arrays
+
+
+    def _load(self, entry_dir: str) -> dict[str, np.ndarray] | None:
+        # None if missing, half-evicted or unreadable (e.g. a truncated .npy, or not what meta.json describes)
+        try:
+            with open(os.path.join(entry_dir, "meta.json"), "r") as f:
+                meta = json.load(f)
+            arrays = {
+                name: np.load(os.path.join(entry_dir, f"{name}.npy"), mmap_mode="c")
+                for name in meta["arrays"]
+            }
+            for name, info in meta["arrays"].items():
+                if list(arrays[name].shape) != info["shape"] or str(arrays[name].dtype) != info["dtype"]:
+                    return None
+        except (FileNotFoundError, KeyError, TypeError, ValueError):
+            return None
+
+        return arrays
+
+
+    def put(self, key: str, arrays: dict[str, np.ndarray], stage: str = None) -> None:
+        """
+        Store `arrays` ({name: array}) under `key`, then evict if over budget.
+        - Written into a temp folder and renamed into place, so readers never see a partial entry.
+        - An existing entry that doesn't load (corrupt/partial) is replaced; a valid one is kept.
+        """
+
+        entry_dir = self._entry_dir(key)
+        tmp_dir = f"{entry_dir}.tmp{os.getpid()}"
+        os.makedirs(tmp_dir, exist_ok=True)
+
+        meta = {"version": CACHE_VERSION, "stage": stage, "arrays": {}, "size": 0, "created": time.time()}
+        for name, array in arrays.items():
+            array = np.asarray(array)
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), array, allow_pickle=False)
+            meta["arrays"][name] = {"shape": list(array.shape), "dtype": str(array.dtype)}
+            meta["size"] += array.nbytes
+        _write_json(os.path.join(tmp_dir, "meta.json"), meta)
+
+        try:
+            os.replace(tmp_dir, entry_dir)
+        except OSError:
+            if self._load(entry_dir) is None: # a broken entry is in the way: move it aside, then retry once
+                stale_dir = f"{entry_dir}.tmp{os.getpid()}.stale"
+                try:
+                    os.replace(entry_dir, stale_dir)
+                    shutil.rmtree(stale_dir, ignore_errors=True)
+                    os.replace(tmp_dir, entry_dir)
+                except OSError:
+                    pass
+            shutil.rmtree(tmp_dir, ignore_errors=True) # another process stored the same entry first
+
+        self.evict()
+
+
+    def cached(self, stage: str, sources: str | list[str], params: dict, compute) -> dict[str, np.ndarray]:
+        """
+        Arrays for (stage, sources, params): from the cache, or from `compute()` (-> {name: array}) on a miss.
+        """
+
+        key = self.key(stage, sources, **params)
+        arrays = self.get(key)
+        if arrays is None:
+            arrays = compute()
+            self.put(key, arrays, stage)
+
+        return arrays
+
+
+    def entries(self) -> list[dict]:
+        """
+        Every complete entry: key, stage, size (bytes), last_used (unix time). Oldest first.
+        """
+
+        entries = []
+        for meta_path in _glob_meta(self.root):
+            try:
+                with open(meta_path, "r") as f:
+                    meta = json.load(f)
+                last_used = os.stat(meta_path).st_mtime
+            except (FileNotFoundError, ValueError):
+                continue
+            entries.append({
+                "key": os.path.basename(os.path.dirname(meta_path)),
+                "stage": meta.get("stage"),
+                "size": meta.get("size", 0),
+                "last_used": last_used,
+            })
+
+        return sorted(entries, key=lambda entry: entry["last_used"])
+
+
+    def evict(self, max_bytes: int = None) -> int:
+        """
+        Delete least-recently-used entries until the total size is at most `max_bytes` (default: `self.max_bytes`).
+        Returns the number of entries deleted.
+        """
+
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = self.entries()
+        total = sum(entry["size"] for entry in entries)
+
+        evicted = 0
+        for entry in entries:
+            if total <= max_bytes:
+                break
+            shutil.rmtree(self._entry_dir(entry["key"]), ignore_errors=True)
+            total -= entry["size"]
+            evicted += 1
+
+        return evicted
+
+
+    def clear(self) -> None:
+        self.evict(max_bytes=0)
+
+
+
+if __name__ == "__main__":
+    from preprocess import MNEFilter
+
+    test_path = "../../DATA/neurosity/visual-p300/2024_12_25_s01/X_rishabh_P300_01.csv"
+    cache = PipelineCache()
+
+    for attempt in ("cold", "warm"):
+        start = time.perf_counter()
+        filtered = MNEFilter(test_path, backend="scipy", cache=cache).filtered_data()
+        print(f"{attempt}: {filtered.shape} in {time.perf_counter() - start:.3f}s")
+
+    for entry in cache.entries():
+        print(entry)
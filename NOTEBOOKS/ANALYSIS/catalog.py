@@ -0,0 +1,178 @@
+"""
+Dataset catalog for the DATA/ tree
+
+Scans every CSV under `DATA/neurosity/` once (in parallel) and keeps a JSON manifest of what each file is:
+format, length, marker counts, amplitude scale and the `X_` low-quality flag. Queries run on the manifest only,
+so finding sessions doesn't mean opening CSVs by hand. Rebuilding only rescans files that changed.
+
+    cat = Catalog().build()
+    sessions = cat.query(format="train", paradigm="visual-p300", min_markers={2: 100})
+"""
+
+
+import os
+import glob
+import json
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from preprocess import DEFAULT_COL, SFREQ, detect_mode, load_sidecar, load_sidecar_text, mode_layout, marker_onsets, _write_json
+
+
+DATA_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "DATA", "neurosity")
+MANIFEST_NAME = "catalog.json"
+MANIFEST_VERSION = 2  # 2: amplitude from the sample-to-sample scale
+
+RAW_COUNTS_THRESHOLD = 1e4  # median |sample-to-sample change| above this is raw ADC counts, not µV
+
+
+def scan_file(path: str) -> dict:
+    """
+    Catalog entry for one CSV. Runs in a worker process.
+    - Files that aren't EEG recordings (e.g. Fusion psd/focus streams) get `format: None` and no stats.
+    """
+
+    stat = os.stat(path)
+    entry = {
+        "format": detect_mode(path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "low_quality": os.path.basename(path).startswith("X_"),
+        "n_samples": None,
+        "duration": None,
+        "markers": {},
+        "amplitude": None,
+    }
+    if entry["format"] is None:
+        return entry
+
+    data, _ = load_sidecar(path)  # also warms the sidecar cache for later ReadCSV loads
+    channel_ix, marker_ix = mode_layout(entry["format"])
+
+    entry["n_samples"] = int(data.shape[0])
+    entry["duration"] = data.shape[0] / SFREQ
+
+    if marker_ix is not None:
+        markers = data[:, marker_ix]
+        values, counts = np.unique(markers[marker_onsets(markers)], return_counts=True)
+        entry["markers"] = {str(int(v)): int(c) for v, c in zip(values, counts)}
+    elif entry["format"] == "default":
+        # Default-format files label events by name (e.g. "vep") in the "none" column
+        labels = load_sidecar_text(path).get(DEFAULT_COL.index("none"))
+        if labels is not None:
+            values, counts = np.unique(labels[labels != ""], return_counts=True)
+            entry["markers"] = {str(v): int(c) for v, c in zip(values, counts)}
+
+    # Scale of the signal without its DC offset (the Crown's can be ~5e5 µV) or drift: the median step between
+    # samples. µV recordings, even noisy unfiltered ones, stay around 1e2-1e3.
+    scale = float(np.nanmedian(np.abs(np.diff(data[:, channel_ix], axis=0)))) if len(data) > 1 else 0.0
+    entry["amplitude"] = "counts" if scale > RAW_COUNTS_THRESHOLD else "uV"
+
+    return entry
+
+
+class Catalog:
+    """
+    Persisted manifest of every recording under `root`.
+
+    Functionality:
+    - `build`: (Re)scan new or changed files in parallel, drop deleted ones, save manifest.
+    - `query`: Filter entries by format/paradigm/marker counts without touching any CSV.
+    - `path`: Absolute path of a cataloged file.
+    """
+
+    def __init__(self, root: str = DATA_ROOT, manifest_path: str = None):
+        self.root = os.path.abspath(root)
+        self.manifest_path = manifest_path or os.path.join(self.root, MANIFEST_NAME)
+        self.entries: dict[str, dict] = {}  # relative path -> entry
+
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r") as f:
+                manifest = json.load(f)
+            if manifest.get("version") == MANIFEST_VERSION:
+                self.entries = manifest["entries"]
+
+
+    def build(self, max_workers: int = None) -> "Catalog":
+        """
+        Incremental scan: only files whose size/mtime differ from the manifest are parsed.
+        """
+
+        paths = {
+            os.path.relpath(p, self.root): p
+            for p in glob.glob(os.path.join(self.root, "**", "*.csv"), recursive=True)
+        }
+
+        stale = []
+        for rel_path, path in paths.items():
+            stat = os.stat(path)
+            entry = self.entries.get(rel_path)
+            if entry is None or entry["size"] != stat.st_size or entry["mtime_ns"] != stat.st_mtime_ns:
+                stale.append(rel_path)
+
+        entries = {rel_path: entry for rel_path, entry in self.entries.items() if rel_path in paths}
+        if stale:
+            with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                for rel_path, entry in zip(stale, pool.map(scan_file, [paths[p] for p in stale])):
+                    entries[rel_path] = entry
+
+        self.entries = dict(sorted(entries.items()))
+        _write_json(self.manifest_path, {"version": MANIFEST_VERSION, "entries": self.entries})
+
+        return self
+
+
+    def query(
+        self,
+        format: str | list[str] = None,
+        paradigm: str = None,
+        min_markers: dict[int | str, int] = None,
+        min_duration: float = None,
+        amplitude: str = None,
+        include_low_quality: bool = False
+    ) -> list[str]:
+        """
+        Relative paths of entries matching every given criterion. Answered from the manifest alone.
+        - `format`: one of `preprocess.modes`, or a list of them.
+        - `paradigm`: top-level folder, e.g. "visual-p300" or "visual-n170".
+        - `min_markers`: e.g. {2: 100} = at least 100 target (2) markers. Keys can also be event names ("vep").
+        - `include_low_quality`: `X_` files are left out unless this is set.
+        """
+
+        formats = [format] if isinstance(format, str) else format
+        matches = []
+
+        for rel_path, entry in self.entries.items():
+            if entry["format"] is None:
+                continue
+            if formats is not None and entry["format"] not in formats:
+                continue
+            if paradigm is not None and rel_path.split(os.sep)[0] != paradigm:
+                continue
+            if min_markers and any(entry["markers"].get(str(m), 0) < n for m, n in min_markers.items()):
+                continue
+            if min_duration is not None and entry["duration"] < min_duration:
+                continue
+            if amplitude is not None and entry["amplitude"] != amplitude:
+                continue
+            if entry["low_quality"] and not include_low_quality:
+                continue
+            matches.append(rel_path)
+
+        return matches
+
+
+    def path(self, rel_path: str) -> str:
+        return os.path.join(self.root, rel_path)
+
+
+
+if __name__ == "__main__":
+    cat = Catalog().build()
+
+    for rel_path, entry in cat.entries.items():
+        if entry["format"] is not None:
+            print(f"{entry['format']:>10}  {entry['duration']:7.1f}s  {entry['amplitude']:>6}  {entry['markers']}  {rel_path}")
+
+    print(cat.query(format="train", paradigm="visual-p300", min_markers={2: 50}))
@@ -5,11 +5,13 @@
 
 import pygame
 import time
-import csv
 from brainflow.board_shim import BoardShim, BrainFlowInputParams, BoardIds, BrainFlowError
 import threading
 import random
 
+from acquisition import SessionWriter, session_path
+from detector import STREAMER_URI
+
 # Initialize Pygame
 pygame.init()
 
@@ -50,24 +52,27 @@ except BrainFlowError as e:
     pygame.quit()
     exit()
 
-# EEG Data Collection
-eeg_data = []
+# Live copy for detector.py; optional, so a failure here doesn't stop the recording
+try:
+    board.add_streamer(STREAMER_URI)
+except BrainFlowError as e:
+    print(f"Warning: no live stream for the detector ({e}); recording anyway.")
 
 # Get EEG and marker channel indices
 eeg_channels = BoardShim.get_eeg_channels(board_id)
 marker_channel = BoardShim.get_marker_channel(board_id)
 
+# EEG Data Collection -- EEG rows + marker row of every chunk, streamed to disk as it arrives
+# (a new P300_<start time>.csv every run, .part until the session ends; acquisition.recover() turns it into the CSV after a crash)
+header = ['EEG Channel {}'.format(ch) for ch in eeg_channels]
+header.append('Marker')
+eeg_data = SessionWriter(session_path('P300.csv'), header, rows=eeg_channels + [marker_channel])  # Change path to your liking
+stop_flag = False
+
 def collect_data():
-    while True:
+    while not stop_flag:
         try:
-            data = board.get_board_data()
-            if data.shape[1] > 0:
-                data = data.T  # Transpose to iterate over samples
-                for sample in data:
-                    eeg_sample = [sample[ch] for ch in eeg_channels]
-                    marker = sample[marker_channel]
-                    eeg_sample.append(marker)
-                    eeg_data.append(eeg_sample)
+            eeg_data.write(board.get_board_data())
             time.sleep(0.05)  # Adjusted sleep time for data collection
         except BrainFlowError as e:
             print(f"Error collecting data: {e}")
@@ -121,82 +126,78 @@ non_target_marker_indices = random.sample(
     num_target_stimuli  # Ensure equal number of markers
 )
 
-running = True
-current_stimulus_index = 0
-flash_time = pygame.time.get_ticks()
-current_stimulus = "plus"
-
-# Variables to store oddball properties
-oddball_letter = None
-oddball_color = None
-oddball_size = None
-oddball_position = None
-
-while running and current_stimulus_index < len(stimuli_sequence):
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-
-    current_time = pygame.time.get_ticks()
-
-    if current_stimulus == "plus" and current_time - flash_time > flash_interval:
-        stimulus = stimuli_sequence[current_stimulus_index]
-        current_stimulus = stimulus
-        if stimulus == 'blue_circle':
-            stimulus_duration = blue_duration
-        else:
-            stimulus_duration = random.randint(oddball_min_duration, oddball_max_duration)
-            # Randomize oddball properties once when the oddball is first presented
-            random_index = random.randint(0, len(letters) - 1)
-            oddball_letter = letters[random_index]
-            oddball_color = colors[random_index]
-            oddball_size = random.randint(200, 400)  # Adjust size as needed
-            oddball_x = random.randint(50, screen.get_width() - 150)
-            oddball_y = random.randint(50, screen.get_height() - 150)
-            oddball_position = (oddball_x, oddball_y)
-            beep_sound.stop()  # Ensure the beep sound is not already playing
-
-        # Insert markers
-        if stimulus == 'oddball':
-            board.insert_marker(2)
-            target_marker_count += 1
-        elif current_stimulus_index in non_target_marker_indices:
-            board.insert_marker(1)
-            non_target_marker_count += 1
-
-        flash_time = current_time
-        current_stimulus_index += 1
-
-    elif current_stimulus in ["oddball", "blue_circle"] and current_time - flash_time > stimulus_duration:
-        if current_stimulus == "oddball":
-            beep_sound.stop()  # Stop the beep sound after the oddball duration
-            # Reset oddball properties
-            oddball_letter = None
-            oddball_color = None
-            oddball_size = None
-            oddball_position = None
-        current_stimulus = "plus"
-        flash_time = current_time
-
-    draw_stimulus(current_stimulus, oddball_letter, oddball_color, oddball_size, oddball_position)
-
-# Save the EEG data to a CSV file
-header = ['EEG Channel {}'.format(ch) for ch in eeg_channels]
-header.append('Marker')
-
-with open('P300.csv', 'w', newline='') as csvfile:  # Change path to your liking
-    writer = csv.writer(csvfile)
-    writer.writerow(header)
-    writer.writerows(eeg_data)
-
-# Clean up
 try:
-    board.stop_stream()
-    board.release_session()
-except BrainFlowError as e:
-    print(f"Error stopping BrainFlow session: {e}")
-
-pygame.quit()
+    running = True
+    current_stimulus_index = 0
+    flash_time = pygame.time.get_ticks()
+    current_stimulus = "plus"
+
+    # Variables to store oddball properties
+    oddball_letter = None
+    oddball_color = None
+    oddball_size = None
+    oddball_position = None
+
+    while running and current_stimulus_index < len(stimuli_sequence):
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+
+        current_time = pygame.time.get_ticks()
+
+        if current_stimulus == "plus" and current_time - flash_time > flash_interval:
+            stimulus = stimuli_sequence[current_stimulus_index]
+            current_stimulus = stimulus
+            if stimulus == 'blue_circle':
+                stimulus_duration = blue_duration
+            else:
+                stimulus_duration = random.randint(oddball_min_duration, oddball_max_duration)
+                # Randomize oddball properties once when the oddball is first presented
+                random_index = random.randint(0, len(letters) - 1)
+                oddball_letter = letters[random_index]
+                oddball_color = colors[random_index]
+                oddball_size = random.randint(200, 400)  # Adjust size as needed
+                oddball_x = random.randint(50, screen.get_width() - 150)
+                oddball_y = random.randint(50, screen.get_height() - 150)
+                oddball_position = (oddball_x, oddball_y)
+                beep_sound.stop()  # Ensure the beep sound is not already playing
+
+            # Insert markers
+            if stimulus == 'oddball':
+                board.insert_marker(2)
+                target_marker_count += 1
+            elif current_stimulus_index in non_target_marker_indices:
+                board.insert_marker(1)
+                non_target_marker_count += 1
+
+            flash_time = current_time
+            current_stimulus_index += 1
+
+        elif current_stimulus in ["oddball", "blue_circle"] and current_time - flash_time > stimulus_duration:
+            if current_stimulus == "oddball":
+                beep_sound.stop()  # Stop the beep sound after the oddball duration
+                # Reset oddball properties
+                oddball_letter = None
+                oddball_color = None
+                oddball_size = None
+                oddball_position = None
+            current_stimulus = "plus"
+            flash_time = current_time
+
+        draw_stimulus(current_stimulus, oddball_letter, oddball_color, oddball_size, oddball_position)
+
+finally:
+    # Stop data collection, free the headset (even if the loop crashed), then finish the recording
+    stop_flag = True
+    data_thread.join()
+    try:
+        board.stop_stream()
+        board.release_session()
+    except BrainFlowError as e:
+        print(f"Error stopping BrainFlow session: {e}")
+
+    print(f"EEG data saved to {eeg_data.close()}")
+    pygame.quit()
 
 print(f"Total target markers: {target_marker_count}")
 print(f"Total non-target markers: {non_target_marker_count}")
@@ -1,11 +1,12 @@
 import pygame
 import time
-import csv
 from brainflow.board_shim import BoardShim, BrainFlowInputParams, BoardIds, BrainFlowError
 from brainflow.data_filter import DataFilter, FilterTypes, AggOperations
 import threading
 import random
 
+from acquisition import SessionWriter, MarkerAligner, session_path
+
 # Initialize Pygame
 pygame.init()
 
@@ -46,36 +47,26 @@ except BrainFlowError as e:
     pygame.quit()
     exit()
 
-# EEG Data Collection
-eeg_data = []
-
-# Marker values
+# Marker values -- set when a stimulus starts, stamped once it's on screen
 marker_value = 0
-marker_lock = threading.Lock()
 
 channels = ['1-31', 'CP3', 'C3', 'F5', 'PO3', 'PO4', 'F6', 'C4', 'CP4']
+marker_channel = BoardShim.get_marker_channel(board_id)
+
+# markers go on the sample nearest to each stimulus onset (board timestamps), not on the next chunk read
+markers = MarkerAligner(BoardShim.get_timestamp_channel(board_id), marker_channel)
+
+# EEG Data Collection -- package number, 8 EEG rows, marker; streamed to disk as it arrives
+# (a new P300_<start time>.csv every run)
+eeg_data = SessionWriter(session_path('P300.csv'), channels + ["Marker"], rows=list(range(len(channels))) + [marker_channel])  # Change path to your liking
+stop_flag = False
 
 def collect_data():
-    global marker_value
-    while True:
+    while not stop_flag:
         try:
             data = board.get_board_data()
-            with marker_lock:
-                if marker_value != 0:
-                    markers = [marker_value] + [0] * (len(data[0]) - 1)
-                else:
-                    markers = [0] * len(data[0])
-                eeg_data.extend(zip(data[0],
-                                    data[channels.index('CP3')],
-                                    data[channels.index('C3')],
-                                    data[channels.index('F5')],
-                                    data[channels.index('PO3')],
-                                    data[channels.index('PO4')],
-                                    data[channels.index('F6')],
-                                    data[channels.index('C4')],
-                                    data[channels.index('CP4')],
-                                    markers))
-                marker_value = 0
+            markers.stamp(data)
+            eeg_data.write(data)
             time.sleep(0.1)
         except BrainFlowError as e:
             print(f"Error collecting data: {e}")
@@ -101,68 +92,68 @@ def draw_stimulus(stimulus, letter=None, color=None, size=None, position=None):
         beep_sound.play()  # Play the beep sound
     pygame.display.flip()
 
-running = True
-flash_time = 0
-current_stimulus = "plus"
-last_flash_time = pygame.time.get_ticks()
-flash_interval = 1000  # Set interval for flashes
-blue_duration = 300  # Longer duration for blue circle stimulus
-oddball_min_duration = 50  # Minimum duration for oddball stimulus
-oddball_max_duration = 200  # Maximum duration for oddball stimulus
-
-while running:
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-
-    current_time = pygame.time.get_ticks()
-
-    if current_stimulus == "plus" and current_time - last_flash_time > flash_interval:
-        rand_value = random.random()
-        if rand_value < 0.8:  # 80% chance for blue circle
-            current_stimulus = "blue_circle"
-            stimulus_duration = blue_duration
-            with marker_lock:
+try:
+    running = True
+    flash_time = 0
+    current_stimulus = "plus"
+    last_flash_time = pygame.time.get_ticks()
+    flash_interval = 1000  # Set interval for flashes
+    blue_duration = 300  # Longer duration for blue circle stimulus
+    oddball_min_duration = 50  # Minimum duration for oddball stimulus
+    oddball_max_duration = 200  # Maximum duration for oddball stimulus
+
+    while running:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+
+        current_time = pygame.time.get_ticks()
+
+        if current_stimulus == "plus" and current_time - last_flash_time > flash_interval:
+            rand_value = random.random()
+            if rand_value < 0.8:  # 80% chance for blue circle
+                current_stimulus = "blue_circle"
+                stimulus_duration = blue_duration
                 marker_value = 1
-            flash_time = current_time
-            last_flash_time = current_time
-        else:  # 20% chance for oddball letter
-            current_stimulus = "oddball"
-            stimulus_duration = random.randint(oddball_min_duration, oddball_max_duration)  # Varying duration
-            random_index = random.randint(0, 3)
-            oddball_letter = letters[random_index]
-            oddball_color = colors[random_index]
-            oddball_size = random.randint(400, 700)  # Varying sizes
-            oddball_x = random.randint(50, screen.get_width() - 150)
-            oddball_y = random.randint(50, screen.get_height() - 150)
-            oddball_position = (oddball_x, oddball_y)
-            with marker_lock:
+                flash_time = current_time
+                last_flash_time = current_time
+            else:  # 20% chance for oddball letter
+                current_stimulus = "oddball"
+                stimulus_duration = random.randint(oddball_min_duration, oddball_max_duration)  # Varying duration
+                random_index = random.randint(0, 3)
+                oddball_letter = letters[random_index]
+                oddball_color = colors[random_index]
+                oddball_size = random.randint(400, 700)  # Varying sizes
+                oddball_x = random.randint(50, screen.get_width() - 150)
+                oddball_y = random.randint(50, screen.get_height() - 150)
+                oddball_position = (oddball_x, oddball_y)
                 marker_value = 2
-            flash_time = current_time
-            last_flash_time = current_time
-    elif current_stimulus in ["oddball", "blue_circle"] and current_time - flash_time > stimulus_duration:
-        if current_stimulus == "oddball":
-            beep_sound.stop()  # Stop the beep sound after the oddball duration
-        current_stimulus = "plus"
-        with marker_lock:
+                flash_time = current_time
+                last_flash_time = current_time
+        elif current_stimulus in ["oddball", "blue_circle"] and current_time - flash_time > stimulus_duration:
+            if current_stimulus == "oddball":
+                beep_sound.stop()  # Stop the beep sound after the oddball duration
+            current_stimulus = "plus"
+
+        draw_stimulus(current_stimulus, oddball_letter if current_stimulus == "oddball" else None,
+                      oddball_color if current_stimulus == "oddball" else None,
+                      oddball_size if current_stimulus == "oddball" else None,
+                      oddball_position if current_stimulus == "oddball" else None)
+        if marker_value != 0:  # stimulus onset = the flip above
+            markers.mark(marker_value)
             marker_value = 0
 
-    draw_stimulus(current_stimulus, oddball_letter if current_stimulus == "oddball" else None,
-                  oddball_color if current_stimulus == "oddball" else None,
-                  oddball_size if current_stimulus == "oddball" else None,
-                  oddball_position if current_stimulus == "oddball" else None)
-
-# Save the EEG data to a CSV file
-with open('P300.csv', 'w', newline='') as csvfile:  # Change path to your liking
-    writer = csv.writer(csvfile)
-    writer.writerow(["1-31", "CP3", "C3", "F5", "PO3", "PO4", "F6", "C4", "CP4", "Marker"])
-    writer.writerows(eeg_data)
-
-# Clean up
-try:
-    board.stop_stream()
-    board.release_session()
-except BrainFlowError as e:
-    print(f"Error stopping BrainFlow session: {e}")
-
-pygame.quit()
+finally:
+    # Stop data collection, free the headset (even if the loop crashed), then finish the recording
+    stop_flag = True
+    data_thread.join()
+    try:
+        board.stop_stream()
+        board.release_session()
+    except BrainFlowError as e:
+        print(f"Error stopping BrainFlow session: {e}")
+
+    recording = eeg_data.close()
+    print(f"EEG data saved to {recording}")
+    print(f"Marker alignment: {markers.save(recording + '.markers.json')}")
+    pygame.quit()
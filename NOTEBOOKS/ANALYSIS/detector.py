@@ -0,0 +1,329 @@
+"""
+Online P300 detection
+
+Classifies every flash while the session is still running, instead of after `datacollectormain.py` has written its
+CSV. Samples from the live BrainFlow stream go through `online.StreamFilter` into a ring buffer; every marker the
+stimulus loop inserts with `board.insert_marker` opens an epoch, which is cut and classified as soon as the samples up
+to `tmax` (600 ms) after it have arrived. Each decision goes out on a queue (same process) or as JSON over UDP
+(e.g. to the speller), stamped with its marker-to-decision latency.
+
+    checker = P300Checker.load("p300_checker.pt", n_threads=1)
+    detector = P300Detector(checker.predict, out=UDPSink())
+    detector.start(open_stream())          # polls in a thread until `detector.stop()`
+
+The recorder and the detector can't both own the headset, so the recorder republishes its stream
+(`board.add_streamer(STREAMER_URI)`) and the detector reads that copy through BrainFlow's streaming board.
+
+*Causal filter: epochs differ slightly from the offline (zero-phase) ones the model was trained on.*
+"""
+
+
+import json
+import queue
+import socket
+import threading
+import time
+
+import numpy as np
+
+from preprocess import SFREQ, channels
+from online import StreamFilter
+from acquisition import SampleBuffer
+
+try:
+    from brainflow.board_shim import BoardShim, BrainFlowInputParams, BoardIds
+except ImportError: # the detector itself only needs arrays (see `replay`)
+    BoardShim = None
+
+
+STREAM_IP, STREAM_PORT = "225.1.1.1", 6677 # multicast group the recorder streams to
+STREAMER_URI = f"streaming_board://{STREAM_IP}:{STREAM_PORT}"
+DETECTOR_HOST, DETECTOR_PORT = "127.0.0.1", 5005 # where `UDPSink` sends decisions
+
+RING_SECONDS = 4 # history kept; epochs whose start has already been overwritten are dropped
+POLL_INTERVAL = 0.02 # s between `get_board_data()` calls (~5 samples)
+
+
+class UDPSink:
+    """
+    Sends each decision as one JSON datagram. Fire-and-forget: a missing listener never blocks the detector.
+    """
+
+    def __init__(self, host: str = DETECTOR_HOST, port: int = DETECTOR_PORT):
+        self.address = (host, port)
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+
+    def __call__(self, decision: dict) -> None:
+        self._socket.sendto(json.dumps(decision).encode(), self.address)
+
+
+    def close(self) -> None:
+        self._socket.close()
+
+
+class P300Detector:
+    """
+    Marker-locked online classifier over a live sample stream.
+
+    Functionality:
+    - `feed`: Push one `get_board_data()` chunk (rows = board channels); classifies every epoch that's complete.
+    - `start` / `stop`: Poll a BrainFlow board in a background thread and `feed` it. An error in `classify` or `out`
+      stops the thread and is raised by the next `feed` or by `stop`.
+    - `out`: Where decisions go (queue.Queue by default, or any callable, e.g. `UDPSink`).
+    - `stats`: Counts (markers, decided, rejected, dropped) + latency of the decisions so far.
+
+    A decision is a dict: marker, sample (index in the stream), score (target probability, None if rejected),
+    rejected (criteria failed), latency_ms (marker -> decision) and wait_ms (latency minus the `tmax` every
+    decision has to wait for the epoch to end -- i.e. what polling + filtering + classifying added).
+    """
+
+    def __init__(
+        self,
+        classify,
+        eeg_channels: list[int] = None,
+        marker_channel: int = None,
+        timestamp_channel: int = None,
+        tmin: float = -0.1,
+        tmax: float = 0.6,
+        sfreq: float = SFREQ,
+        stream_filter: StreamFilter | None = "default",
+        rejector=None,
+        markers: list[int] = None,
+        out=None,
+        ring_seconds: float = RING_SECONDS
+    ):
+        """
+        Parameters:
+        - `classify`: (n_epochs, 8, n_times) volts -> (n_epochs,) scores, e.g. `P300Checker.predict`. Called once per
+          `feed` with every epoch that completed in that chunk.
+        - `eeg_channels`, `marker_channel`, `timestamp_channel`: Rows of the board data (`BoardShim.get_*_channel`).
+          Defaults: the Crown's layout (`board_rows`). Without a timestamp row latency is measured from the
+          time the marker's chunk arrived.
+        - `stream_filter`: `StreamFilter` for the EEG rows; None if the stream is already filtered.
+        - `rejector`: e.g. `rejection.StreamingRejector`; rejected epochs are reported but not classified.
+        - `markers`: Marker values to classify (default: any nonzero marker).
+        """
+
+        if eeg_channels is None:
+            eeg_channels, marker_channel, timestamp_channel = board_rows()
+
+        self.classify = classify
+        self.eeg_channels = list(eeg_channels)
+        self.marker_channel = marker_channel
+        self.timestamp_channel = timestamp_channel
+        self.sfreq = sfreq
+        self.stream_filter = StreamFilter(len(self.eeg_channels), sfreq) if stream_filter == "default" else stream_filter
+        self.rejector = rejector
+        self.markers = None if markers is None else set(markers)
+        self.out = queue.Queue() if out is None else out
+        self.tmax = tmax
+
+        self._start, self._stop = int(round(tmin * sfreq)), int(round(tmax * sfreq)) # same rounding as MNE
+        self.n_times = self._stop - self._start + 1
+
+        # Ring of filtered EEG in volts; epochs are views into it
+        capacity = max(int(ring_seconds * sfreq), self.n_times)
+        self._ring = SampleBuffer(len(self.eeg_channels), capacity, ring=True, dtype=np.float32)
+
+        self._pending = [] # (sample, marker, marker time), waiting for the rest of their epoch
+        self._latencies = []
+        self.stats = {"markers": 0, "decided": 0, "rejected": 0, "dropped": 0}
+
+        self._error = None
+        self._thread = None
+        self._running = threading.Event()
+
+
+    def feed(self, data: np.ndarray) -> list[dict]:
+        """
+        Process one chunk of board data (all rows, like `get_board_data()` returns). Returns the decisions made.
+        """
+
+        if self._error is not None: # the polling thread died; its decisions would never go out
+            raise RuntimeError("Detector thread failed.") from self._error
+
+        arrived = time.time()
+        if data.shape[1] == 0:
+            return []
+
+        eeg = data[self.eeg_channels] * 1e-6 # BrainFlow gives µV; the models are trained on volts (as `MNEFilter`)
+        if self.stream_filter is not None:
+            eeg = self.stream_filter(eeg)
+
+        # BrainFlow puts each marker on a single sample
+        marker_ix = np.flatnonzero(data[self.marker_channel])
+        for i in marker_ix:
+            marker = int(data[self.marker_channel, i])
+            if self.markers is not None and marker not in self.markers:
+                continue
+            onset_time = arrived if self.timestamp_channel is None else float(data[self.timestamp_channel, i])
+            self._pending.append((self._ring.n_samples + int(i), marker, onset_time))
+            self.stats["markers"] += 1
+
+        self._ring.append(eeg)
+        n_samples = self._ring.n_samples
+
+        # Every pending epoch whose last sample is in is cut now; the rest wait for the next chunk
+        ready = [p for p in self._pending if p[0] + self._stop < n_samples]
+        if not ready:
+            return []
+        self._pending = [p for p in self._pending if p[0] + self._stop >= n_samples]
+
+        epochs, decisions = [], []
+        for sample, marker, onset_time in ready:
+            if sample + self._start < self._ring.first: # before the stream started / already overwritten
+                self.stats["dropped"] += 1
+                continue
+
+            epoch = self._ring.window(sample + self._start, sample + self._stop + 1) # view
+            decision = {"marker": marker, "sample": sample, "score": None, "rejected": [], "onset_time": onset_time}
+            if self.rejector is not None and not self.rejector(epoch):
+                decision["rejected"] = list(self.rejector.last_reasons)
+                self.stats["rejected"] += 1
+            else:
+                epochs.append(epoch)
+            decisions.append(decision)
+
+        # One batched classifier call for everything that completed in this chunk
+        if epochs:
+            scores = iter(self.classify(np.stack(epochs))) # the one copy of each epoch
+            for decision in decisions:
+                if not decision["rejected"]:
+                    decision["score"] = float(next(scores))
+
+        decided = time.time()
+        for decision in decisions:
+            latency = (decided - decision.pop("onset_time")) * 1e3
+            decision["latency_ms"] = latency
+            decision["wait_ms"] = latency - self.tmax * 1e3
+            self._latencies.append(latency)
+            self.stats["decided"] += 1
+            self._emit(decision)
+
+        return decisions
+
+
+    def _emit(self, decision: dict) -> None:
+        if isinstance(self.out, queue.Queue):
+            self.out.put(decision)
+        else:
+            self.out(decision)
+
+
+    def latency(self) -> dict:
+        """
+        p50/p99/max marker-to-decision latency so far, in ms.
+        """
+
+        if not self._latencies:
+            return {}
+        latencies = np.asarray(self._latencies)
+        return {
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p99_ms": float(np.percentile(latencies, 99)),
+            "max_ms": float(latencies.max()),
+        }
+
+
+    def _run(self, board, poll_interval: float) -> None:
+        try:
+            while self._running.is_set():
+                self.feed(board.get_board_data())
+                time.sleep(poll_interval)
+        except Exception as e: # surfaced by `feed` / `stop`
+            self._error = e
+            self._running.clear()
+
+
+    def start(self, board, poll_interval: float = POLL_INTERVAL) -> None:
+        """
+        Poll `board` (a streaming BoardShim) every `poll_interval` s in a daemon thread.
+        """
+
+        self._error = None
+        self._running.set()
+        self._thread = threading.Thread(target=self._run, args=(board, poll_interval), daemon=True)
+        self._thread.start()
+
+
+    def stop(self) -> None:
+        self._running.clear()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._error is not None:
+            raise RuntimeError("Detector thread failed.") from self._error
+
+
+def board_rows(board_id: int = None) -> tuple[list[int], int, int]:
+    """
+    (eeg_channels, marker_channel, timestamp_channel) rows of a board's data. Default: the Crown.
+    """
+
+    if BoardShim is None:
+        raise ImportError("brainflow is needed to look up the board layout; pass the channel rows instead.")
+
+    board_id = BoardIds.CROWN_BOARD.value if board_id is None else board_id
+    return (
+        BoardShim.get_eeg_channels(board_id),
+        BoardShim.get_marker_channel(board_id),
+        BoardShim.get_timestamp_channel(board_id),
+    )
+
+
+def open_stream(master_board: int = None, ip: str = STREAM_IP, port: int = STREAM_PORT):
+    """
+    Join the stream a recorder republishes with `board.add_streamer(STREAMER_URI)`. Returns the started board.
+    Its rows are laid out like the master board's (see `board_rows`).
+    """
+
+    if BoardShim is None:
+        raise ImportError("brainflow is needed to open a stream.")
+
+    params = BrainFlowInputParams()
+    params.ip_address, params.ip_port = ip, port
+    params.master_board = BoardIds.CROWN_BOARD.value if master_board is None else master_board
+
+    board = BoardShim(BoardIds.STREAMING_BOARD.value, params)
+    board.prepare_session()
+    board.start_stream()
+    return board
+
+
+def replay(detector: P300Detector, data: np.ndarray, chunk: int = 25, realtime: bool = False) -> list[dict]:
+    """
+    Feed a recorded (n_rows, n_samples) array through `detector` in `chunk`-sample pieces, as if it were live.
+    `realtime=True` waits between chunks like the board would.
+    """
+
+    decisions = []
+    for i in range(0, data.shape[1], chunk):
+        decisions += detector.feed(data[:, i:i + chunk])
+        if realtime:
+            time.sleep(chunk / detector.sfreq)
+    return decisions
+
+
+
+if __name__ == "__main__":
+    from preprocess import load_sidecar, extract_epochs, find_events
+
+    # Offline check on a recorded session: train-format columns are index, 8 channels, marker
+    test_path = "../../DATA/neurosity/visual-p300/headset_test/oct_RISHABH_test4.csv"
+    data = load_sidecar(test_path)[0].T # (10, n_samples)
+    eeg_rows, marker_row = list(range(1, len(channels) + 1)), len(channels) + 1
+
+    seen = []
+    def classify(X): # stand-in for `P300Checker.predict` so this runs without torch/a trained model
+        seen.append(X)
+        return np.zeros(len(X))
+
+    detector = P300Detector(classify, eeg_rows, marker_row, stream_filter=None)
+    decisions = replay(detector, data)
+
+    # Same epochs as offline extraction of the (unfiltered) recording?
+    X, y, events = extract_epochs(data[eeg_rows] * 1e-6, data[marker_row], events=find_events(data[marker_row]))
+    print(detector.stats, len(X))
+    print("matches offline epochs:", np.allclose(np.concatenate(seen), X, rtol=1e-5, atol=1e-9))
+    print("latency (replay, no waiting for samples):", detector.latency())
@@ -0,0 +1,308 @@
+"""
+On-disk epoch store
+
+Epochs from every session go into one append-only binary file, read back as a memory-mapped
+(n_epochs, n_channels, n_times) array, + a metadata table (session, subject, marker, onset, source file).
+Sessions are added as they're recorded; training reads epochs straight off disk through `EpochDataset`,
+so months of sessions don't have to fit in RAM.
+
+    store = EpochStore()
+    store.add_session("DATA/.../oct_RISHABH_test4.csv", subject="rishabh")
+    train = store.dataset(store.select(subject="rishabh", marker=[1, 2]), label_map={1: 0, 2: 1})
+    loader = DataLoader(train, batch_size=64, sampler=WeightedRandomSampler(...), num_workers=4)
+
+Layout of `root/`:
+- `epochs.bin`: raw C-order epochs, back to back
+- `metadata.csv`: one row per epoch
+- `meta.json`: shape/dtype + `n_epochs` + `metadata_bytes` (committed size of `metadata.csv`). Written last on
+  every append, so it's the commit point: anything past them (e.g. from a crash mid-append) is ignored and cut off
+  on the next append.
+"""
+
+
+import os
+import json
+
+import numpy as np
+import pandas as pd
+
+from preprocess import CACHE_DIR_NAME, SFREQ, MNEFilter, _write_json
+
+try:
+    import torch
+    from torch.utils.data import Dataset
+except ImportError: # the store itself works without torch
+    torch = None
+    Dataset = object
+
+
+EPOCH_STORE_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", CACHE_DIR_NAME, "epochs")
+EPOCH_STORE_VERSION = 1
+METADATA_COLUMNS = ["session", "subject", "marker", "onset", "source"]
+_METADATA_READ = {"dtype": {"session": str, "subject": str, "source": str}, "keep_default_na": False} # "" stays ""
+
+
+class EpochStore:
+    """
+    Append-only, memory-mapped store of fixed-shape epochs.
+
+    Functionality:
+    - `append`: Add a batch of epochs + their metadata.
+    - `add_session`: Epoch a recording (`MNEFilter.epochs`) and append it.
+    - `X`: Read-only memmap of all epochs. `metadata`: pd.DataFrame, one row per epoch.
+    - `select`: Epoch indices matching session/subject/marker.
+    - `dataset`: torch Dataset over (a subset of) the store.
+
+    One writer at a time; any number of readers.
+    """
+
+    def __init__(self, root: str = EPOCH_STORE_ROOT, n_channels: int = 8, n_times: int = None, dtype=np.float32):
+        """
+        Opens the store at `root`, or creates it. Shape/dtype come from `meta.json` for an existing store;
+        for a new one they're taken from the arguments, or from the first `append` if `n_times` isn't given.
+        """
+
+        self.root = os.path.abspath(root)
+        self._data_path = os.path.join(self.root, "epochs.bin")
+        self._metadata_path = os.path.join(self.root, "metadata.csv")
+        self._meta_path = os.path.join(self.root, "meta.json")
+
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path, "r") as f:
+                self._meta = json.load(f)
+            if self._meta.get("version") != EPOCH_STORE_VERSION:
+                raise ValueError(f"Epoch store at {self.root} is version {self._meta.get('version')}, expected {EPOCH_STORE_VERSION}.")
+        else:
+            self._meta = {
+                "version": EPOCH_STORE_VERSION,
+                "n_epochs": 0,
+                "n_channels": n_channels,
+                "n_times": n_times,
+                "dtype": np.dtype(dtype).name,
+                "metadata_bytes": 0,
+            }
+
+        self._X = None
+        self._metadata = None
+
+
+    def __len__(self) -> int:
+        return self._meta["n_epochs"]
+
+
+    @property
+    def shape(self) -> tuple[int, int, int]:
+        return (self._meta["n_epochs"], self._meta["n_channels"], self._meta["n_times"])
+
+
+    @property
+    def dtype(self) -> np.dtype:
+        return np.dtype(self._meta["dtype"])
+
+
+    @property
+    def X(self) -> np.ndarray:
+        """
+        (n_epochs, n_channels, n_times) read-only memmap of the committed epochs. Nothing is read until indexed.
+        """
+
+        if self._X is None or self._X.shape != self.shape:
+            if len(self) == 0:
+                self._X = np.empty((0, self._meta["n_channels"], self._meta["n_times"] or 0), dtype=self.dtype)
+            else:
+                self._X = np.memmap(self._data_path, dtype=self.dtype, mode="r", shape=self.shape)
+        return self._X
+
+
+    @property
+    def metadata(self) -> pd.DataFrame:
+        if self._metadata is None or len(self._metadata) != len(self):
+            if len(self) == 0:
+                self._metadata = pd.DataFrame(columns=METADATA_COLUMNS)
+            else:
+                self._metadata = pd.read_csv(self._metadata_path, nrows=len(self), **_METADATA_READ)
+        return self._metadata
+
+
+    @property
+    def labels(self) -> np.ndarray:
+        return self.metadata["marker"].to_numpy()
+
+
+    def _epoch_bytes(self) -> int:
+        return self._meta["n_channels"] * self._meta["n_times"] * self.dtype.itemsize
+
+
+    def _truncate_uncommitted(self) -> None:
+        # Drop whatever a crashed append left past the commit point. Only file sizes are checked, so an append
+        # costs the same however big the store is.
+        n = len(self)
+        if os.path.exists(self._data_path) and os.path.getsize(self._data_path) > n * self._epoch_bytes():
+            os.truncate(self._data_path, n * self._epoch_bytes())
+        if not os.path.exists(self._metadata_path):
+            return
+
+        if "metadata_bytes" not in self._meta: # store from before the offset was recorded: count rows, once
+            metadata = pd.read_csv(self._metadata_path, **_METADATA_READ) if n else []
+            if len(metadata) > n:
+                metadata.iloc[:n].to_csv(self._metadata_path, index=False)
+            self._meta["metadata_bytes"] = os.path.getsize(self._metadata_path) if n else 0
+
+        if os.path.getsize(self._metadata_path) > self._meta["metadata_bytes"]:
+            os.truncate(self._metadata_path, self._meta["metadata_bytes"]) # empty store: header goes too, rewritten next
+
+
+    def append(
+        self,
+        X: np.ndarray,
+        markers: np.ndarray,
+        session: str,
+        subject: str = "",
+        onsets: np.ndarray = None,
+        source: str = ""
+    ) -> range:
+        """
+        Append epochs `X` (n, n_channels, n_times) with their marker values. Returns their indices in the store.
+        - `X` is cast to the store's dtype and written straight to the end of `epochs.bin`.
+        - `onsets`: sample index of each epoch's event in its recording (e.g. `events[:, 0]`).
+        """
+
+        X = np.ascontiguousarray(X, dtype=self.dtype)
+        markers = np.asarray(markers)
+        if X.ndim != 3 or len(X) != len(markers):
+            raise ValueError(f"Expected X of shape (n, n_channels, n_times) and n markers, got {X.shape} and {markers.shape}.")
+
+        if self._meta["n_times"] is None: # first append decides the epoch length
+            self._meta["n_channels"], self._meta["n_times"] = X.shape[1:]
+        if X.shape[1:] != (self._meta["n_channels"], self._meta["n_times"]):
+            raise ValueError(f"Epochs of shape {X.shape[1:]} don't fit store of {self.shape[1:]}.")
+
+        os.makedirs(self.root, exist_ok=True)
+        self._truncate_uncommitted()
+
+        start = len(self)
+        with open(self._data_path, "ab") as f:
+            f.write(X.tobytes()) # X is C-contiguous, so this is one straight copy
+            f.flush()
+            os.fsync(f.fileno())
+
+        with open(self._metadata_path, "a", newline="") as f:
+            pd.DataFrame({
+                "session": session,
+                "subject": subject,
+                "marker": markers.astype(np.int64),
+                "onset": -1 if onsets is None else np.asarray(onsets, dtype=np.int64),
+                "source": source,
+            }, index=range(len(X)), columns=METADATA_COLUMNS).to_csv(f, header=start == 0, index=False)
+            f.flush()
+            os.fsync(f.fileno()) # on disk before the commit that counts it
+
+        self._meta["n_epochs"] = start + len(X)
+        self._meta["metadata_bytes"] = os.path.getsize(self._metadata_path)
+        _write_json(self._meta_path, self._meta) # commit
+
+        return range(start, len(self))
+
+
+    def add_session(
+        self,
+        csv_file_path: str,
+        subject: str = "",
+        session: str = None,
+        tmin: float = -0.1,
+        tmax: float = 0.6,
+        event_id: dict = None,
+        baseline: tuple = None,
+        **filter_kwargs
+    ) -> range:
+        """
+        Filter + epoch one recording (see `MNEFilter.epochs`) and append its epochs.
+        - `session` defaults to the file name. `filter_kwargs` go to MNEFilter (backend, cache, ...).
+        """
+
+        if self._meta["n_times"] is not None and self._meta["n_times"] != int(round(tmax * SFREQ)) - int(round(tmin * SFREQ)) + 1:
+            raise ValueError(f"tmin/tmax ({tmin}, {tmax}) give a different epoch length than this store's {self._meta['n_times']}.")
+
+        session = os.path.basename(csv_file_path) if session is None else session
+        X, y, events = MNEFilter(csv_file_path, **filter_kwargs).epochs(tmin, tmax, event_id, baseline)
+
+        return self.append(X, y, session, subject, events[:, 0], os.path.abspath(csv_file_path))
+
+
+    def select(self, session=None, subject=None, marker=None) -> np.ndarray:
+        """
+        Indices of epochs matching every given criterion (each one a value or a list of values).
+        """
+
+        metadata = self.metadata
+        keep = np.ones(len(metadata), dtype=bool)
+        for column, wanted in (("session", session), ("subject", subject), ("marker", marker)):
+            if wanted is not None:
+                keep &= metadata[column].isin(np.atleast_1d(wanted)).to_numpy()
+
+        return np.flatnonzero(keep)
+
+
+    def dataset(self, indices: np.ndarray = None, label_map: dict = None, transform=None) -> "EpochDataset":
+        return EpochDataset(self.root, indices, label_map, transform)
+
+
+class EpochDataset(Dataset):
+    """
+    torch Dataset over an `EpochStore`: item i = (epoch tensor (n_channels, n_times), label).
+    - `indices`: subset of the store (e.g. from `EpochStore.select`, or `preprocess.balanced_indices`).
+    - `label_map`: marker -> class, e.g. {1: 0, 2: 1}. Default: the marker value itself.
+    - Each item reads one epoch off the memmap. The memmap is opened per process (after pickling into
+      DataLoader workers), never copied between them.
+    """
+
+    def __init__(self, root: str, indices: np.ndarray = None, label_map: dict = None, transform=None):
+        if torch is None:
+            raise ImportError("EpochDataset needs torch.")
+
+        self.root = root
+        self._store = EpochStore(root)
+        self.indices = np.arange(len(self._store)) if indices is None else np.asarray(indices)
+        self.transform = transform
+
+        labels = self._store.labels[self.indices]
+        if label_map is not None:
+            labels = pd.Series(labels).map(label_map).to_numpy()
+        self.labels = torch.tensor(labels, dtype=torch.long) # a copy: `labels` may be a read-only view of the metadata
+
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+
+    def __getitem__(self, i: int):
+        x = torch.from_numpy(np.array(self._store.X[self.indices[i]])) # own the epoch, not the mapped page
+        if self.transform is not None:
+            x = self.transform(x)
+        return x, self.labels[i]
+
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_store"] = None # reopened in the worker
+        return state
+
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._store = EpochStore(self.root)
+
+
+
+if __name__ == "__main__":
+    from catalog import Catalog
+
+    cat = Catalog().build()
+    store = EpochStore()
+
+    done = set(store.metadata["source"]) # sessions already in the store
+    for rel_path in cat.query(format="train", paradigm="visual-p300", include_low_quality=True):
+        if cat.path(rel_path) not in done:
+            print(rel_path, len(store.add_session(cat.path(rel_path), backend="scipy")))
+
+    print(store.shape, store.metadata["marker"].value_counts().to_dict())
@@ -0,0 +1,192 @@
+"""
+Neurosity Fusion session bundles
+
+A Fusion export (e.g. `DATA/neurosity/visual-p300/fusion_headset_test/fusion_P300_test_1/`) is a folder of CSVs,
+one per stream: rawBrainwaves, events, psd, powerByBand, focus, calm, signalQuality, accelerometer.
+`FusionBundle` opens each stream only when it's first used and puts every stream on the same clock
+(`timestamp`, unix ms), so any stream can be joined onto the EEG timeline with one sorted-timestamp merge.
+
+    bundle = FusionBundle("DATA/neurosity/visual-p300/fusion_headset_test/fusion_P300_test_1")
+    bundle.events                          # events with the JSON `data` column expanded into columns
+    quality = bundle.align("signalQuality") # one signalQuality row per EEG sample
+    markers = bundle.markers()             # train-format style marker column for epoching
+"""
+
+
+import os
+import io
+import glob
+
+import numpy as np
+import pandas as pd
+
+from preprocess import FUSION_COL, channels, load_sidecar
+
+
+STREAMS = ("rawBrainwaves", "events", "psd", "powerByBand", "focus", "calm", "signalQuality", "accelerometer")
+
+
+def _to_ms(timestamps: pd.Series) -> pd.Series:
+    """
+    Fusion streams mix unix seconds (events) and unix milliseconds (everything else). Normalize to ms.
+    """
+
+    timestamps = timestamps.astype(np.float64)
+    return timestamps * 1000 if timestamps.max() < 1e11 else timestamps
+
+
+class FusionBundle:
+    """
+    Lazily loaded Neurosity Fusion export.
+
+    Functionality:
+    - `<stream name>` (e.g. `bundle.psd`): pd.DataFrame of that stream, loaded + cached on first access.
+      Every stream has a float `timestamp` column in unix ms and is sorted by it.
+    - `align`: Join any stream onto the EEG timeline (one row per EEG sample).
+    - `event_samples`: EEG sample index of each event.
+    - `markers`: Marker column on the EEG timeline, same layout as train-format data.
+    """
+
+    def __init__(self, directory: str):
+        if not os.path.isdir(directory):
+            raise FileNotFoundError(f"The directory at {directory} does not exist.")
+
+        self.directory = directory
+        self._paths: dict[str, str] = {}
+        for stream in STREAMS:
+            matches = sorted(glob.glob(os.path.join(directory, f"{stream}_*.csv")))
+            if matches:
+                self._paths[stream] = matches[0]
+
+        if "rawBrainwaves" not in self._paths:
+            raise ValueError(f"No rawBrainwaves_*.csv in {directory}.")
+
+        self._streams: dict[str, pd.DataFrame] = {}
+
+
+    def __getattr__(self, name: str) -> pd.DataFrame:
+        # Only called when normal lookup fails, i.e. for the stream names
+        if name in STREAMS:
+            return self.stream(name)
+        raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+
+
+    @property
+    def available(self) -> list[str]:
+        return list(self._paths)
+
+
+    def stream(self, name: str) -> pd.DataFrame:
+        """
+        Load (once) and return one stream.
+        """
+
+        if name not in self._streams:
+            if name not in self._paths:
+                raise ValueError(f"Stream {name!r} not in bundle {self.directory} (has {self.available}).")
+
+            df = getattr(self, f"_load_{name}", self._load_generic)(self._paths[name])
+            if not df["timestamp"].is_monotonic_increasing:
+                df = df.sort_values("timestamp", kind="stable", ignore_index=True)
+            self._streams[name] = df
+
+        return self._streams[name]
+
+
+    def _load_rawBrainwaves(self, path: str) -> pd.DataFrame:
+        data, _ = load_sidecar(path) # no header; columns are FUSION_COL
+        return pd.DataFrame(data, columns=FUSION_COL, copy=False)
+
+
+    def _load_events(self, path: str) -> pd.DataFrame:
+        """
+        `data` is an unquoted JSON object (full of commas), so rows are split on the first two commas only.
+        The whole JSON column is then parsed in one `read_json` pass (JSON lines) instead of json.loads per row.
+        """
+
+        with open(path, "r") as f:
+            header = f.readline().strip().split(",")
+            lines = pd.Series(f.read().splitlines())
+
+        lines = lines[lines.str.len() > 0]
+        df = lines.str.split(",", n=len(header) - 1, expand=True)
+        df.columns = header
+        df = df.reset_index(drop=True)
+
+        payload = pd.read_json(io.StringIO("\n".join(df["data"])), lines=True)
+
+        df = pd.concat([df.drop(columns="data"), payload.add_prefix("data_")], axis=1)
+        df["startTimestamp"] = df["startTimestamp"].astype(np.float64)
+        df["duration"] = df["duration"].astype(np.float64)
+        df["timestamp"] = _to_ms(df["startTimestamp"])
+        return df
+
+
+    def _load_psd(self, path: str) -> pd.DataFrame:
+        """
+        Each channel cell is a ";"-joined spectrum. Expanded to one float column per (channel, bin): "CP3_0", ...
+        """
+
+        df = pd.read_csv(path)
+        spectra = [
+            df[ch].str.split(";", expand=True).astype(np.float64).add_prefix(f"{ch}_")
+            for ch in channels
+        ]
+
+        timestamp = _to_ms(df["unixTimestamp"]).rename("timestamp")
+        return pd.concat([df[["unixTimestamp"]], *spectra, timestamp], axis=1)
+
+
+    def _load_generic(self, path: str) -> pd.DataFrame:
+        """
+        powerByBand, signalQuality (`unixTimestamp`), focus, calm, accelerometer (`timestamp`).
+        """
+
+        df = pd.read_csv(path)
+        source = "unixTimestamp" if "unixTimestamp" in df.columns else "timestamp"
+        df["timestamp"] = _to_ms(df[source])
+        return df
+
+
+    def align(self, name: str, direction: str = "backward", tolerance: float = None) -> pd.DataFrame:
+        """
+        One row of stream `name` per EEG sample, picked with a sorted-timestamp join (`pd.merge_asof`).
+        - `direction="backward"`: latest row at or before each sample (the value "in effect").
+          Also "forward" or "nearest".
+        - `tolerance`: max gap in ms; samples further than this from any row get NaN.
+        - Index matches the rawBrainwaves rows.
+        """
+
+        return pd.merge_asof(
+            self.rawBrainwaves[["timestamp"]],
+            self.stream(name),
+            on="timestamp",
+            direction=direction,
+            tolerance=tolerance
+        )
+
+
+    def event_samples(self) -> np.ndarray:
+        """
+        Index of the EEG sample nearest to each event's start (vectorized searchsorted on the sorted timeline).
+        """
+
+        eeg_ts = self.rawBrainwaves["timestamp"].to_numpy()
+        event_ts = self.events["timestamp"].to_numpy()
+
+        right = np.searchsorted(eeg_ts, event_ts).clip(1, len(eeg_ts) - 1)
+        left = right - 1
+        nearest = np.where(event_ts - eeg_ts[left] <= eeg_ts[right] - event_ts, left, right)
+
+        return nearest
+
+
+    def markers(self, value_column: str = "data_id") -> np.ndarray:
+        """
+        Float marker column on the EEG timeline (0 everywhere except at event samples), like train-format files.
+        Can be stacked with the channels and epoched the same way.
+        """
+
+        markers = np.zeros(len(self.rawBrainwaves), dtype=np.float64)
+        markers[self.event_samples()] = self.events[value_column].to_numpy(dtype=np.float64)
+        return markers
@@ -5,21 +5,27 @@ The overall process to effectively use brainflow is by starting a session and
 continously appending data recorded to a CSV file. A thread runs in the background
 to check if the enter key is hit, and if it is the stream is stopped and the CSV
 file is saved.
+
+Polling and writing happen off the main thread (`acquisition.BoardPoller` reads the
+board every POLL_INTERVAL s, `acquisition.CsvAppender` coalesces the chunks into one
+append every APPEND_INTERVAL s); the main thread only prints their counters.
 """
 
 
 import brainflow
-import numpy as np
-import pandas as pd
 from brainflow.board_shim import BoardShim, BrainFlowInputParams, BoardIds
 import threading
-import time
+
+from acquisition import BoardPoller, CsvAppender
 
 # initialize neurosity features
 EEG_INDICES = [0, 1, 2, 3, 4, 5, 6, 7]  # Indices for the 8 channels
 SAMPLE_FREQ = 256  # Sampling frequency
 EEG_CHANNELS = ["C3", "C4", "CP3", "CP4", "F5", "F6", "PO3", "PO4"]  # Channel names
 CSV_FILE = 'collected_eeg_data.csv'
+POLL_INTERVAL = 0.1  # seconds between board reads
+APPEND_INTERVAL = 1.0  # seconds of data per CSV write
+STATUS_INTERVAL = 5  # seconds between status prints
 
 # start brainflow
 brainflow_params = BrainFlowInputParams()
@@ -53,42 +59,22 @@ def initialize_board():
         print(f"failure to prep session {e}")
         exit(1)
 
-# Starts appending data to CSV file
-def collect_data(board):
-    try:
-        data = board.get_board_data()  # takes data from board
-        print("completed!")
-
-        # DATA PROCESSING
-        
-        data = data.T  # Transpose data
-        #basic data info
-        ch_names = BoardShim.get_eeg_names(board_id)
-        eeg_data = data[:, BoardShim.get_eeg_channels(board_id)]
-        timestamps = data[:, BoardShim.get_timestamp_channel(board_id)]
-
-        df = pd.DataFrame(eeg_data, index=timestamps, columns=ch_names)
-        
-        # Append data to CSV file
-        df.to_csv(CSV_FILE, mode='a', header=not pd.io.common.file_exists(CSV_FILE), index=False)
-        print("Data saved to CSV file.")
-    except Exception as e:
-        print(f"Error collecting or processing data: {e}")
-
 # thread listning for stop
 thread = threading.Thread(target=listen_for_stop)
 thread.start()
 
-# clear csv after every use
-with open(CSV_FILE, 'w') as f:
-    f.truncate()
-
 # prep board
 board = initialize_board()
 
+# csv is replaced every use; header = eeg channel names
+appender = CsvAppender(CSV_FILE, BoardShim.get_eeg_names(board_id), rows=BoardShim.get_eeg_channels(board_id),
+                       flush_interval=APPEND_INTERVAL)
+poller = BoardPoller(board, appender.write, poll_interval=POLL_INTERVAL)
+
 # stream start
 try:
     board.start_stream()
+    poller.start()
     print("Stream started.")
 except Exception as e:
     print(f"Error starting stream: {e}")
@@ -97,14 +83,24 @@ except Exception as e:
 
 
 
-# continously loop every 5 seconds
+# main thread just reports until enter is pressed
 try:
-    while not stop_recording.is_set():
-        #! time.sleep(.3)  # Collect data every .3 seconds
-        collect_data(board)
+    while not stop_recording.wait(STATUS_INTERVAL):
+        print(f"written {appender.stats['written']}, buffered {appender.stats['buffered']}, dropped {appender.stats['dropped']}")
 except KeyboardInterrupt:
     pass
 
+# polling stop (one last read), then everything buffered goes to the csv
+try:
+    poller.stop()
+except Exception as e:
+    print(f"Error collecting data: {e}")
+try:
+    appender.close()
+    print(f"Data saved to CSV file: {appender.stats}")
+except Exception as e:
+    print(f"Error writing CSV file: {e}")
+
 # stream stop
 try:
     board.stop_stream()
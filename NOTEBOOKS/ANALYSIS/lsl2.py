@@ -17,7 +17,8 @@ RED = (255, 0, 0)
 TRAINING_PHRASE = "HELLOWORLD"
 
 
-def Start_GUI():
+def Start_GUI(decoder=None):
+    # decoder: speller.SpellerDecoder -- gets every flash, and types the keys it selects (None: just flash)
     pygame.init()
 
     # Set up the display to get the screen size
@@ -80,13 +81,17 @@ def Start_GUI():
                 pygame.draw.rect(screen, RED, [x, y, key_width, key_height], 2)
                 screen.blit(txt, text_pos)
 
+    def draw_typed():
+        txt = font.render(decoder.typed, True, WHITE)
+        screen.blit(txt, [(screen_width - 6 * key_width) // 2, (screen_height - 6 * key_height) // 2 - key_height])
+
     Init_Keys()
     clock = pygame.time.Clock()
     running = True
     last_flash_time = time.time()
 
     training_index = 0
-    training_mode = True
+    training_mode = decoder is None  # with a decoder: free spelling
     training_start_time = time.time()
 
     while running:
@@ -118,7 +123,14 @@ def Start_GUI():
                 flash_rows = random.sample(range(6), N_KEYS_PER_FLASH // 2)
                 flash_cols = random.sample(range(6), N_KEYS_PER_FLASH // 2)
                 flash_keys(flash_rows, flash_cols)
+                if decoder is not None:
+                    draw_typed()
                 pygame.display.flip()
+                if decoder is not None:  # marker right after the flip, when the flash is on screen
+                    decoder.flashed(flash_rows, flash_cols)
+
+            if decoder is not None and decoder.poll() is not None:
+                print(f"Typed: {decoder.typed}")
 
         clock.tick(FRAMERATE_CAP)
 
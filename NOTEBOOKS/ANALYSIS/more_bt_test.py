@@ -2,12 +2,13 @@
 
 
 import pygame
-import pandas as pd
 import time
 from brainflow.board_shim import BoardShim, BrainFlowInputParams, BoardIds, BrainFlowError
 import threading
 import random
 
+from acquisition import SessionWriter, session_path
+
 # Set up BrainFlow parameters for Neurosity Crown
 params = BrainFlowInputParams()
 params.mac_address = "C0:EE:40:A1:7F:BA"  # Replace with your Neurosity Crown MAC Address
@@ -51,8 +52,10 @@ colors = [RED, GREEN, YELLOW, PURPLE]
 marker_value = 0
 marker_lock = threading.Lock()
 
-# EEG Data Collection
-eeg_data = []
+# EEG Data Collection -- streamed to disk as it arrives (a new P300_<start time>.csv every run, .part until the session ends)
+eeg_channel_indices = board.get_eeg_channels(board_id)  # Get EEG channel indices
+marker_channel = board.get_marker_channel(board_id)
+eeg_data = SessionWriter(session_path("P300.csv"), board.get_eeg_names(board_id) + ["Marker"], rows=eeg_channel_indices + [marker_channel])
 stop_flag = False
 
 def collect_data():
@@ -61,11 +64,10 @@ def collect_data():
     while not stop_flag:
         try:
             data = board.get_board_data()  # Fetch streamed data
-            eeg_channel_indices = board.get_eeg_channels(board_id)  # Get EEG channel indices
             with marker_lock:
                 current_marker = marker_value
-            for row in data.T:  # Iterate through collected rows
-                eeg_data.append([row[channel] for channel in eeg_channel_indices] + [current_marker])
+            data[marker_channel] = current_marker  # current marker on every sample of the chunk
+            eeg_data.write(data)
             time.sleep(0.1)  # Adjust sleep time for desired update frequency
         except BrainFlowError as e:
             print(f"Error collecting data: {e}")
@@ -147,18 +149,14 @@ finally:
     stop_flag = True
     data_thread.join()
 
-    # Save data to CSV
-    column_names = board.get_eeg_names(board_id) + ["Marker"]
-    df = pd.DataFrame(eeg_data, columns=column_names)
-    output_file = "P300.csv"
-    df.to_csv(output_file, index=False)
-    print(f"Data saved to {output_file}")
-
-    # Clean up
+    # Clean up (headset first, so it's freed even if finishing the recording fails)
     try:
         board.stop_stream()
         board.release_session()
     except BrainFlowError as e:
         print(f"Error stopping BrainFlow session: {e}")
 
+    # Finish the recording
+    print(f"Data saved to {eeg_data.close()}")
+
     pygame.quit()
@@ -1,11 +1,12 @@
 import pygame
 import time
-import csv
 from brainflow.board_shim import BoardShim, BrainFlowInputParams, BoardIds, BrainFlowError
 from brainflow.data_filter import DataFilter, FilterTypes, AggOperations
 import threading
 import random
 
+from acquisition import SessionWriter, MarkerAligner, session_path
+
 pygame.init()
 
 screen = pygame.display.set_mode((800, 600))
@@ -33,34 +34,23 @@ except BrainFlowError as e:
     pygame.quit()
     exit()
 
-eeg_data = []
+channels = ['1-31', 'CP3', 'C3', 'F5', 'PO3', 'PO4', 'F6', 'C4', 'CP4']
+marker_channel = BoardShim.get_marker_channel(board_id)
 
-marker_value = 0
-marker_lock = threading.Lock()
+# markers go on the sample nearest to each stimulus onset (board timestamps), not on the next chunk read
+markers = MarkerAligner(BoardShim.get_timestamp_channel(board_id), marker_channel)
 
-channels = ['1-31', 'CP3', 'C3', 'F5', 'PO3', 'PO4', 'F6', 'C4', 'CP4']
+# streamed to disk as it arrives (a new N170_RISH_<start time>.csv every run)
+eeg_data = SessionWriter(session_path('data_master/neurosity/visual-n170/N170_RISH.csv'), channels + ["Marker"],
+                         rows=list(range(len(channels))) + [marker_channel])
+stop_flag = False
 
 def collect_data():
-    global marker_value
-    while True:
+    while not stop_flag:
         try:
             data = board.get_board_data()
-            with marker_lock:
-                if marker_value != 0:
-                    markers = [marker_value] + [0] * (len(data[0]) - 1)
-                else:
-                    markers = [0] * len(data[0])
-                eeg_data.extend(zip(data[0],
-                                    data[channels.index('CP3')],
-                                    data[channels.index('C3')],
-                                    data[channels.index('F5')],
-                                    data[channels.index('PO3')],
-                                    data[channels.index('PO4')],
-                                    data[channels.index('F6')],
-                                    data[channels.index('C4')],
-                                    data[channels.index('CP4')],
-                                    markers))
-                marker_value = 0
+            markers.stamp(data)
+            eeg_data.write(data)
             time.sleep(0.1)
         except BrainFlowError as e:
             print(f"Error collecting data: {e}")
@@ -75,50 +65,49 @@ def draw_stimulus(image):
                         screen.get_height() // 2 - image.get_height() // 2))
     pygame.display.flip()
 
-running = True
-flash_time = 0
-last_flash_time = pygame.time.get_ticks()
-stimulus_duration = 500
-interstimulus_interval = 1000
-
-while running:
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-
-    current_time = pygame.time.get_ticks()
-
-    if current_time - last_flash_time > interstimulus_interval:
-        rand_value = random.random()
-        if rand_value < 0.5:
-            face_index = random.randint(0, 4)
-            with marker_lock:
-                marker_value = 2
-            draw_stimulus(faces[face_index])
-        else:
-            non_face_index = random.randint(0, 4)
-            with marker_lock:
-                marker_value = 1
-            draw_stimulus(non_faces[non_face_index])
-
-        flash_time = current_time
-        last_flash_time = current_time
-
-    if current_time - flash_time > stimulus_duration:
-        screen.fill(WHITE)
-        pygame.display.flip()
-        with marker_lock:
-            marker_value = 0
-
-with open('data_master/neurosity/visual-n170/N170_RISH_3.csv', 'w', newline='') as csvfile:
-    writer = csv.writer(csvfile)
-    writer.writerow(["1-31", "CP3", "C3", "F5", "PO3", "PO4", "F6", "C4", "CP4", "Marker"])
-    writer.writerows(eeg_data)
-
 try:
-    board.stop_stream()
-    board.release_session()
-except BrainFlowError as e:
-    print(f"Error stopping BrainFlow session: {e}")
-
-pygame.quit()
+    running = True
+    flash_time = 0
+    last_flash_time = pygame.time.get_ticks()
+    stimulus_duration = 500
+    interstimulus_interval = 1000
+
+    while running:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+
+        current_time = pygame.time.get_ticks()
+
+        if current_time - last_flash_time > interstimulus_interval:
+            rand_value = random.random()
+            if rand_value < 0.5:
+                face_index = random.randint(0, 4)
+                draw_stimulus(faces[face_index])
+                markers.mark(2)  # onset = right after the flip
+            else:
+                non_face_index = random.randint(0, 4)
+                draw_stimulus(non_faces[non_face_index])
+                markers.mark(1)
+
+            flash_time = current_time
+            last_flash_time = current_time
+
+        if current_time - flash_time > stimulus_duration:
+            screen.fill(WHITE)
+            pygame.display.flip()
+
+finally:
+    # free the headset even if the loop crashed, then finish the recording
+    stop_flag = True
+    data_thread.join()
+    try:
+        board.stop_stream()
+        board.release_session()
+    except BrainFlowError as e:
+        print(f"Error stopping BrainFlow session: {e}")
+
+    recording = eeg_data.close()
+    print(f"EEG data saved to {recording}")
+    print(f"Marker alignment: {markers.save(recording + '.markers.json')}")
+    pygame.quit()
@@ -0,0 +1,118 @@
+"""
+Online (live) processing
+
+`MNEFilter` filters whole recordings after the fact (zero-phase FIR, needs the future samples). During a session the
+recorders only ever get short chunks from `board.get_board_data()`, so this filters those chunks as they arrive:
+a causal IIR band-pass + powerline notch, as second-order sections, whose state is carried from one chunk to the next.
+Filtering the session chunk by chunk gives exactly the same output as filtering it in one go -- no edge artifacts.
+
+    stream_filter = StreamFilter()
+    while True:
+        data = board.get_board_data()                    # (n_rows, ~25)
+        filtered = stream_filter(data[eeg_channels])     # (8, ~25), ready for online detection
+
+*Causal, so there's some phase delay compared to the offline filters (a few samples at P300 frequencies).*
+"""
+
+
+import functools
+
+import numpy as np
+from scipy import signal
+
+from preprocess import SFREQ, CUTOFF_LOW_FREQ, CUTOFF_HIGH_FREQ, POWERLINE_FREQ, channels
+
+
+NOTCH_Q = 30 # quality factor of the powerline notch (-3 dB width = 60 / 30 = 2 Hz)
+
+
+@functools.lru_cache(maxsize=None)
+def design_sos(
+    sfreq: float = SFREQ,
+    band: tuple = (CUTOFF_LOW_FREQ, CUTOFF_HIGH_FREQ),
+    notch: float = POWERLINE_FREQ,
+    order: int = 4
+) -> np.ndarray:
+    """
+    Butterworth band-pass (`order` per edge) followed by an IIR notch, stacked into one (n_sections, 6) SOS array.
+    - `notch=None` leaves out the notch (e.g. when it's above Nyquist).
+    - Memoized; the returned array is read-only since it's shared.
+    """
+
+    sos = signal.butter(order, band, btype="bandpass", fs=sfreq, output="sos")
+    if notch is not None:
+        sos = np.vstack([sos, signal.tf2sos(*signal.iirnotch(notch, NOTCH_Q, fs=sfreq))])
+
+    sos.setflags(write=False)
+    return sos
+
+
+class StreamFilter:
+    """
+    Chunk-in / chunk-out band-pass + notch filter that keeps its state between calls.
+
+    Functionality:
+    - `__call__` / `process`: Filter one (n_channels, n_samples) chunk; returns a new array of the same shape.
+    - `reset`: Forget the state (e.g. after a dropped connection).
+    """
+
+    def __init__(
+        self,
+        n_channels: int = len(channels),
+        sfreq: float = SFREQ,
+        band: tuple = (CUTOFF_LOW_FREQ, CUTOFF_HIGH_FREQ),
+        notch: float = POWERLINE_FREQ,
+        order: int = 4
+    ):
+        self.n_channels = n_channels
+        self.sos = design_sos(sfreq, tuple(band), notch, order).copy() # sosfilt won't take a read-only array
+        self._zi_step = signal.sosfilt_zi(self.sos) # (n_sections, 2) steady state for a unit step
+        self._zi = None
+
+
+    def reset(self):
+        self._zi = None
+
+
+    def process(self, chunk: np.ndarray) -> np.ndarray:
+        """
+        Filter the next `chunk` (channels in rows, like MNE / BrainFlow).
+        - The first chunk starts the filter in steady state at its first sample, so a DC offset
+          (raw Crown data sits far from 0) doesn't ring through the first seconds.
+        - Empty chunks are fine (`get_board_data()` often returns nothing).
+        """
+
+        chunk = np.asarray(chunk, dtype=np.float64)
+        if chunk.shape[0] != self.n_channels:
+            raise ValueError(f"Expected {self.n_channels} channels (rows), got {chunk.shape[0]}.")
+        if chunk.shape[1] == 0:
+            return chunk.copy()
+
+        if self._zi is None:
+            self._zi = self._zi_step[:, None, :] * chunk[None, :, :1] # (n_sections, n_channels, 2)
+
+        filtered, self._zi = signal.sosfilt(self.sos, chunk, axis=-1, zi=self._zi)
+        return filtered
+
+
+    __call__ = process
+
+
+
+if __name__ == "__main__":
+    import time
+    from preprocess import ReadCSV
+
+    test_path = "../../DATA/neurosity/visual-p300/2024_12_25_s01/X_rishabh_P300_01.csv"
+    data = ReadCSV(test_path)._DF.to_numpy().T[:8] # train-format file, 8 EEG rows
+
+    # Whole file at once vs. 25-sample chunks (about what the recorders get every 0.1s)
+    whole = StreamFilter()(data)
+
+    stream_filter = StreamFilter()
+    start = time.perf_counter()
+    chunks = [stream_filter(data[:, i:i + 25]) for i in range(0, data.shape[1], 25)]
+    elapsed = time.perf_counter() - start
+
+    print(f"max |chunked - whole| = {np.abs(np.hstack(chunks) - whole).max():.2e}")
+    print(f"{elapsed / len(chunks) * 1e6:.1f} µs per 25-sample chunk")
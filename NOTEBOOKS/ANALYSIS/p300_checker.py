@@ -1,100 +1,325 @@
-from preprocess import MNEFilter, ReadCSV
+from preprocess import MNEFilter, SFREQ, balanced_weights
+
+import os
+import time
 
-import mne
 import numpy as np
-import pandas as pd
 
 import torch
 import torch.nn as nn
-from torch.utils.data import TensorDataset, WeightedRandomSampler
-
-mne.set_config("MNE_BROWSE_RAW_SIZE", "10,5") # Window size = 10in x 5in
+from torch.utils.data import DataLoader, TensorDataset, WeightedRandomSampler
 
-# GPU acceleration
+# GPU acceleration (training only -- inference is tuned for the CPU, see `P300Checker.predict`)
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
+# Epoch window around each flash, same as the notebooks
+EPOCH_TMIN, EPOCH_TMAX = -0.1, 0.6
+N_TIMES = int(round(EPOCH_TMAX * SFREQ)) - int(round(EPOCH_TMIN * SFREQ)) + 1 # 181 samples
+EVENT_ID = {"Non-Target": 1, "Target": 2}
+
+INFERENCE_BACKENDS = ("torchscript", "compile", "eager")
+
+
+class P300Net(nn.Module):
+    """
+    Compact EEGNet-style CNN (Lawhern et al., 2018, https://doi.org/10.1088/1741-2552/aace8c).
+    (batch, 8 channels, 181 samples) in volts -> (batch, 2) logits [non-target, target].
+    - Temporal conv (learned band-pass) -> depthwise spatial conv (per-filter channel weights) ->
+      separable conv -> linear. ~2k parameters, so a flash batch runs in well under a millisecond on a CPU.
+    """
+
+    def __init__(self, n_channels: int = 8, n_times: int = N_TIMES, F1: int = 8, D: int = 2, dropout: float = 0.25):
+        super().__init__()
+        F2 = F1 * D
+
+        self.features = nn.Sequential(
+            nn.Conv2d(1, F1, (1, 33), padding=(0, 16), bias=False), # ~130 ms kernel
+            nn.BatchNorm2d(F1),
+            nn.Conv2d(F1, F2, (n_channels, 1), groups=F1, bias=False),
+            nn.BatchNorm2d(F2),
+            nn.ELU(),
+            nn.AvgPool2d((1, 4)),
+            nn.Dropout(dropout),
+            nn.Conv2d(F2, F2, (1, 9), padding=(0, 4), groups=F2, bias=False),
+            nn.Conv2d(F2, F2, 1, bias=False),
+            nn.BatchNorm2d(F2),
+            nn.ELU(),
+            nn.AvgPool2d((1, 8)),
+            nn.Dropout(dropout),
+        )
+
+        with torch.no_grad():
+            n_features = self.features(torch.zeros(1, 1, n_channels, n_times)).numel()
+        self.classifier = nn.Linear(n_features, 2)
+
 
-class P300Checker(MNEFilter):
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        x = x.unsqueeze(1) * 1e6 # volts -> µV, so the first layer sees O(1)-O(100) values
+        return self.classifier(self.features(x).flatten(1))
+
+
+class P300Checker:
     """
     Class for P300 detection using Convolutional Neural Networks (CNNs).
-    
+
     Functionality:
+    - `extract_data`: Epochs one or more recordings into (X, y) tensors.
     - `train`: Trains CNN model on training data.
     - `evaluate`: Evaluates model on test data.
-    - `predict`: Predicts P300 signal on new data.
-    - `plot`: Plots P300 signal.
+    - `export` / `load`: Save / load the model as TorchScript (what `predict` runs).
+    - `predict`: Target probability for a batch of epochs (fast CPU path).
+    - `benchmark`: `predict` latency, p50/p99.
     """
-    
-    def __init__(self, train_path, test_path):
+
+    def __init__(
+        self,
+        train_path: str | list[str] = None,
+        test_path: str | list[str] = None,
+        model: nn.Module = None,
+        n_threads: int = None,
+        max_batch: int = 36,
+        backend: str = "torchscript"
+    ):
         """
         Parameters:
-        - `train_path` (str): Path to training data CSV file.
-        - `test_path` (str): Path to test data CSV file.
+        - `train_path`, `test_path` (str or list of str): Training / test recordings (train-format CSVs). Optional,
+          e.g. when loading an exported model just to `predict`.
+        - `model` (nn.Module): Model to use (default: new `P300Net`).
+        - `n_threads` (int): Intra-op threads for inference. 1-2 gives the lowest latency for small batches.
+          `torch.set_num_threads` is process-wide, so it's only applied when `predict` builds its runtime (never
+          here, and never for training); None (default) leaves torch's setting alone.
+        - `max_batch` (int): Largest batch `predict` takes without splitting (36 = every key of the speller).
+        - `backend` (str): How `predict` runs the model: "torchscript" (traced + frozen), "compile" (torch.compile)
+          or "eager".
         """
 
-        super().__init__()
+        if backend not in INFERENCE_BACKENDS:
+            raise ValueError(f"Inference backend {backend!r} not one of {INFERENCE_BACKENDS}.")
 
         self.train_path = train_path
         self.test_path = test_path
+        self.backend = backend
+        self.max_batch = max_batch
+        self.n_threads = n_threads
 
-        self.train_F = self._quick_filter(train_path)
-        self.test_F = self._quick_filter(test_path)
-
-        """
-        TODO: stopped here
-        
-        ! - p300 checker algorithm
-        ! - find out how to place markers in CSV (preferably at column 10)
-        !     - ref chacklam code
-        """
-
-        
         # Extract training and test data
-        self.X_train, self.y_train = self.extract_data(self.train_data)
-        self.X_test, self.y_test = self.extract_data(self.test_data)
-        
+        self.X_train, self.y_train = self.extract_data(train_path) if train_path else (None, None)
+        self.X_test, self.y_test = self.extract_data(test_path) if test_path else (None, None)
+
         # Initialize CNN model
-        self.model = self.init_model()
-        
-        # Initialize loss function and optimizer
+        self.model = self.init_model() if model is None else model
+
+        # Initialize loss function and optimizer (a frozen, loaded model has no trainable parameters)
         self.criterion = nn.CrossEntropyLoss()
-        self.optimizer = torch.optim.Adam(self.model.parameters(), lr=0.001)
-    
-    def _quick_filter(self, path):
-        """
-        Uses ReadCSV and MNEFilter commands to quickly filter data.
-        """
+        parameters = list(self.model.parameters())
+        self.optimizer = torch.optim.Adam(parameters, lr=0.001) if parameters else None
+
+        # Inference state: built on first `predict`, reset whenever the weights change
+        self._runtime = None
+        self._buffer = torch.empty((max_batch, 8, N_TIMES), dtype=torch.float32) # reused by every `predict`
 
-        return path._load_df().iloc[:, 1:9].to_mne().filter_mne()
 
-        
-    def extract_data(self, data):
+    def extract_data(self, paths: str | list[str]) -> tuple[torch.Tensor, torch.Tensor]:
         """
-        Extracts data from MNE `Raw` object.
-        
+        Epochs recordings with `MNEFilter.epochs` (scipy filters, float32 throughout).
+
         Parameters:
-        - `data` (mne.io.RawArray): MNE `Raw` object.
-        
+        - `paths` (str or list of str): Train-format CSV file(s).
+
         Returns:
-        - `X` (torch.Tensor): Tensor of shape (n_samples, n_channels, n_timepoints).
-        - `y` (torch.Tensor): Tensor of shape (n_samples).
-        """
-        
-        # Extract data and labels
-        X = torch.tensor(data.get_data(), dtype=torch.float32).unsqueeze(1)
-        y = torch.tensor(data.annotations.description, dtype=torch.long)
-        
+        - `X` (torch.Tensor): Tensor of shape (n_epochs, n_channels, n_timepoints), volts.
+        - `y` (torch.Tensor): Tensor of shape (n_epochs), 1 = target, 0 = non-target.
+        """
+
+        paths = [paths] if isinstance(paths, str) else paths
+        X, y = [], []
+        for path in paths:
+            X_i, y_i, _ = MNEFilter(path, backend="scipy", dtype=np.float32).epochs(EPOCH_TMIN, EPOCH_TMAX, EVENT_ID)
+            X.append(X_i)
+            y.append(y_i == EVENT_ID["Target"])
+
+        X = torch.from_numpy(np.concatenate(X)) # float32 already, no copy
+        y = torch.from_numpy(np.concatenate(y).astype(np.int64))
+
         return X, y
-    
-    
-    def init_model(self):
+
+
+    def init_model(self) -> nn.Module:
         """
         Initializes CNN model.
-        
+
         Returns:
         - `model` (nn.Module): CNN model.
         """
-        
-        
-        # model = nn.Sequential(
-            # nn.Conv
\ No newline at end of file
+
+        return P300Net()
+
+
+    def train(self, n_epochs: int = 30, batch_size: int = 64, seed: int = 0) -> list[float]:
+        """
+        Trains the model on `X_train`, `y_train`. Targets are rare (~1 in 5 flashes), so batches are drawn
+        class-balanced with a WeightedRandomSampler. Returns the mean loss of each training epoch.
+        """
+
+        if self.X_train is None:
+            raise ValueError("No training data; pass `train_path`.")
+        if self.optimizer is None:
+            raise ValueError("Model has no trainable parameters (loaded from an export?).")
+
+        generator = torch.Generator().manual_seed(seed)
+        weights = torch.from_numpy(balanced_weights(self.y_train.numpy()))
+        sampler = WeightedRandomSampler(weights, num_samples=len(weights), replacement=True, generator=generator)
+        loader = DataLoader(TensorDataset(self.X_train, self.y_train), batch_size=batch_size, sampler=sampler)
+
+        self.model.to(device).train()
+        losses = []
+        for _ in range(n_epochs):
+            total = 0.0
+            for X, y in loader:
+                X, y = X.to(device), y.to(device)
+                self.optimizer.zero_grad()
+                loss = self.criterion(self.model(X), y)
+                loss.backward()
+                self.optimizer.step()
+                total += loss.item() * len(X)
+            losses.append(total / len(weights))
+
+        self.model.to("cpu").eval()
+        self._runtime = None # weights changed
+        return losses
+
+
+    def evaluate(self) -> dict:
+        """
+        Evaluates model on test data. Returns accuracy and balanced accuracy (mean of per-class recall;
+        plain accuracy is misleading with ~80% non-targets).
+        """
+
+        if self.X_test is None:
+            raise ValueError("No test data; pass `test_path`.")
+
+        predicted = self.predict(self.X_test) >= 0.5
+        y = self.y_test.numpy().astype(bool)
+
+        return {
+            "accuracy": float(np.mean(predicted == y)),
+            "balanced_accuracy": float(np.mean([np.mean(predicted[y == c] == c) for c in (False, True)])),
+        }
+
+
+    def _frozen(self) -> torch.jit.ScriptModule:
+        # Traced + frozen model (a loaded export already is one)
+        model = self.model.to("cpu").eval()
+        if isinstance(model, torch.jit.ScriptModule):
+            return model
+
+        with torch.inference_mode(False), torch.no_grad(): # tracing can't happen under inference_mode
+            return torch.jit.freeze(torch.jit.trace(model, self._buffer[:1].zero_()))
+
+
+    def _build_runtime(self):
+        if self.n_threads is not None: # inference-only process setting (see `__init__`)
+            torch.set_num_threads(self.n_threads)
+
+        if self.backend == "eager":
+            return self.model.to("cpu").eval()
+        if self.backend == "compile":
+            return torch.compile(self.model.to("cpu").eval())
+
+        # optimize_for_inference's output can't be saved and reloaded, so it's applied here, after loading
+        with torch.inference_mode(False), torch.no_grad():
+            return torch.jit.optimize_for_inference(self._frozen())
+
+
+    def export(self, path: str) -> None:
+        """
+        Save the model as a frozen TorchScript file: loadable with `torch.jit.load`, no Python class needed.
+        """
+
+        torch.jit.save(self._frozen(), path)
+
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> "P300Checker":
+        """
+        Checker around an exported model, ready to `predict`. `kwargs` as for `P300Checker`.
+        """
+
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"The model at {path} does not exist.")
+
+        return cls(model=torch.jit.load(path, map_location="cpu"), **kwargs)
+
+
+    def predict(self, X) -> np.ndarray:
+        """
+        Probability that each epoch contains a P300.
+
+        Parameters:
+        - `X` (np.ndarray or torch.Tensor): (n_epochs, 8, 181) epochs in volts, e.g. one flash batch.
+
+        Returns:
+        - (n_epochs,) np.ndarray of target probabilities.
+
+        Runs under `torch.inference_mode` with the exported model. Epochs are copied into a preallocated
+        input buffer (batches larger than `max_batch` are split), so a call allocates nothing but its output.
+        """
+
+        if self._runtime is None:
+            self._runtime = self._build_runtime()
+
+        X = torch.as_tensor(X)
+        out = np.empty(len(X), dtype=np.float32)
+
+        with torch.inference_mode():
+            for start in range(0, len(X), self.max_batch):
+                batch = X[start:start + self.max_batch]
+                n = len(batch)
+                self._buffer[:n].copy_(batch) # also casts float64 -> float32
+                logits = self._runtime(self._buffer[:n])
+                out[start:start + n] = torch.softmax(logits, dim=1)[:, 1].numpy()
+
+        return out
+
+
+    def benchmark(self, batch_size: int = 12, n_runs: int = 500, warmup: int = 50) -> dict:
+        """
+        Latency of `predict` on random (batch_size, 8, 181) batches, in ms. Default batch = one round of
+        6 row + 6 column flashes. Returns p50, p99, mean and max.
+        """
+
+        X = np.random.default_rng(0).standard_normal((batch_size, 8, N_TIMES)).astype(np.float32) * 1e-5
+        for _ in range(warmup): # first calls include TorchScript profiling/optimization passes
+            self.predict(X)
+
+        latencies = np.empty(n_runs)
+        for i in range(n_runs):
+            start = time.perf_counter()
+            self.predict(X)
+            latencies[i] = time.perf_counter() - start
+
+        latencies *= 1e3
+        return {
+            "batch_size": batch_size,
+            "threads": torch.get_num_threads(),
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p99_ms": float(np.percentile(latencies, 99)),
+            "mean_ms": float(latencies.mean()),
+            "max_ms": float(latencies.max()),
+        }
+
+
+
+if __name__ == "__main__":
+    data_dir = "../../DATA/neurosity/visual-p300/headset_test"
+    checker = P300Checker(
+        train_path=os.path.join(data_dir, "oct_RISHABH_test4.csv"),
+        test_path=os.path.join(data_dir, "nov_RISHABH_test1.csv"),
+    )
+
+    print("loss:", checker.train(n_epochs=30)[-1])
+    print(checker.evaluate())
+
+    checker.export("p300_checker.pt")
+    live = P300Checker.load("p300_checker.pt", n_threads=1)
+    print(live.benchmark())
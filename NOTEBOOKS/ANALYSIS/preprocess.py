@@ -1,8 +1,16 @@
 import pandas as pd
 import os
+import json
+import hashlib
+import uuid
+import functools
 import numpy as np
+from scipy import signal
 
-import mne
+try:
+    import mne # only needed for the "mne" filter backend and plotting
+except ImportError:
+    mne = None
 import matplotlib.pyplot as plt
 
 
@@ -15,46 +23,592 @@ channels = ["CP3", "C3", "F5", "PO3", "PO4", "F6", "C4", "CP4"]
 DEFAULT_COL = ["index", *channels, "none", "timestamp"]
 FUSION_COL = ["index", "timestamp", *channels]
 TRAIN_COL = ["index", *channels, "marker"]
+BRAINFLOW_COL = [*channels, "marker"]  # BrainFlow export, header "EEG Channel 1,...,EEG Channel 8,Marker"
+MARKERLESS_COL = [*channels]
 
 modes: dict[str, tuple] = {
-    "default": (DEFAULT_COL, (1, 9 ), False),
-    "fusion" : (FUSION_COL , (2, 10), False),
-    "train"  : (TRAIN_COL  , (1, 10), True )
+    "default"   : (DEFAULT_COL   , (1, 9 ), False),
+    "fusion"    : (FUSION_COL    , (2, 10), False),
+    "train"     : (TRAIN_COL     , (1, 10), True ),
+    "brainflow" : (BRAINFLOW_COL , (0, 9 ), True ),
+    "markerless": (MARKERLESS_COL, (0, 8 ), False)
 }
 col_labels, CHANNEL_IX, IS_TRAIN_DATA = modes[DATA_MODE]
 
+SFREQ = 256 # Neurosity Crown sampling rate
+
+DTYPE = np.float64 # ? np.float32 -- halves memory from parse to model; 8 channels at 256 Hz don't need doubles
+
+# Band-pass + powerline filter applied by MNEFilter (both backends)
+CUTOFF_LOW_FREQ, CUTOFF_HIGH_FREQ = 1, 18  # !! 10/9/24 # Changed from 1, 40 to 1, 18
+    # Other P300 bands (compared in sweep.py):
+    # https://arc.net/l/quote/yiztowhs (0.1, 20)
+    # https://arc.net/l/quote/vadqwzby (1, 40)
+POWERLINE_FREQ = 60 # 60 Hz in Americas
+
+FILTER_BACKENDS = ("mne", "scipy")
+RAW_POLICIES = ("share", "copy", "none") # see MNEFilter
+
+
+# Binary sidecars live next to each CSV, e.g. `DATA/.../.speakeeg_cache/oct_RISHABH_test4.csv/`
+CACHE_DIR_NAME = ".speakeeg_cache"
+SIDECAR_VERSION = 2
+
+
+def file_digest(path: str, chunk_size: int = 1 << 20) -> str:
+    """
+    SHA-1 hex digest of a file's contents. Read in `chunk_size` pieces so big recordings don't sit in memory.
+    """
+
+    sha = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def _sidecar_dir(csv_file_path: str) -> str:
+    head, name = os.path.split(os.path.abspath(csv_file_path))
+    return os.path.join(head, CACHE_DIR_NAME, name)
+
+
+def _has_header(csv_file_path: str) -> bool:
+    """
+    True if the first line of the CSV has any non-numeric field (e.g. "1-31,CP3,..." or "EEG Channel 1,...").
+    Empty fields (the "none" column in default-format files) don't count.
+    """
+
+    with open(csv_file_path, "r") as f:
+        first_line = f.readline()
+
+    for field in first_line.strip().split(","):
+        field = field.strip()
+        if not field:
+            continue
+        try:
+            float(field)
+        except ValueError:
+            return True
+    return False
+
+
+def detect_mode(csv_file_path: str) -> str | None:
+    """
+    Guess which of `modes` a CSV is in from its first two lines. Returns None if it isn't EEG data we know
+    (e.g. the psd/focus/... streams of a Fusion export).
+    - "train": header "1-31,CP3,...,CP4,Marker"
+    - "brainflow": header "EEG Channel 1,...,EEG Channel 8,Marker"
+    - "default": no header, 11 columns (index, 8 channels, empty, timestamp)
+    - "fusion": no header, 10 columns (index, ms timestamp, 8 channels)
+    - "markerless": no header, 8 channels only
+    """
+
+    with open(csv_file_path, "r") as f:
+        first_line = f.readline().strip()
+        second_line = f.readline().strip()
+
+    first = [field.strip() for field in first_line.split(",")]
+
+    if _has_header(csv_file_path):
+        if first[0].startswith("EEG Channel") and len(first) == len(BRAINFLOW_COL):
+            return "brainflow"
+        if first[1:len(TRAIN_COL)-1] == channels and len(first) == len(TRAIN_COL):
+            return "train"
+        return None
+
+    n_cols = len(first)
+    if n_cols == len(DEFAULT_COL):
+        return "default"
+    if n_cols == len(FUSION_COL) and float(first[1]) > 1e12: # unix time in ms
+        return "fusion"
+    if n_cols == len(MARKERLESS_COL) and len(second_line.split(",")) == n_cols:
+        return "markerless"
+    return None
+
+
+def mode_layout(mode: str) -> tuple[slice, int | None]:
+    """
+    Where things are in a file of the given mode: (slice of the 8 EEG columns, marker column index or None).
+    """
+
+    _, (start, stop), has_marker = modes[mode]
+    if has_marker:
+        return slice(start, stop - 1), stop - 1
+    return slice(start, stop), None
+
+
+def marker_onsets(markers: np.ndarray) -> np.ndarray:
+    """
+    Sample indices where the marker column steps to a new nonzero value. One vectorized diff, no loops.
+    - Markers stamped on a single sample (board.insert_marker) and markers held for a whole chunk both count once.
+    """
+
+    markers = np.asarray(markers)
+    changed = np.diff(markers, prepend=0) != 0
+    return np.flatnonzero(changed & (markers != 0))
+
+
+def _parse_csv(csv_file_path: str) -> tuple[np.ndarray, list[str], dict[int, np.ndarray]]:
+    """
+    Parse a CSV straight into a C-contiguous float64 array (round-trip precision) + column labels.
+    Files without a header row get their column positions as labels.
+
+    Text columns (e.g. "vep" event labels in the "none" column of default-format files) are NaN in the float
+    array and returned separately as {column index: string array}.
+    """
+
+    has_header = _has_header(csv_file_path)
+    df = pd.read_csv(
+        csv_file_path,
+        header=0 if has_header else None,
+        skipinitialspace=True,  # default-format files are ", "-separated
+        float_precision="round_trip"
+    )
+
+    text = {}
+    for i, col in enumerate(df.columns):
+        if not pd.api.types.is_numeric_dtype(df[col]):
+            text[i] = df[col].fillna("").astype(str).to_numpy(dtype=str)
+            df[col] = np.nan
+
+    return np.ascontiguousarray(df.to_numpy(dtype=np.float64)), [str(c) for c in df.columns], text
+
+
+def _sidecar_meta(csv_file_path: str) -> tuple[str, dict]:
+    """
+    (sidecar directory, metadata) for a CSV, building the sidecar first if it's missing or stale.
+    """
+
+    stat = os.stat(csv_file_path)
+    cache_dir = _sidecar_dir(csv_file_path)
+    meta_path = os.path.join(cache_dir, "meta.json")
+
+    meta = None
+    if os.path.exists(meta_path):
+        with open(meta_path, "r") as f:
+            meta = json.load(f)
+        source = meta.get("source", {})
+
+        if meta.get("version") != SIDECAR_VERSION or source.get("size") != stat.st_size:
+            meta = None
+        elif source.get("mtime_ns") != stat.st_mtime_ns:
+            if source.get("sha1") == file_digest(csv_file_path):
+                # File was touched but not changed -- keep the sidecar, remember the new mtime
+                meta["source"]["mtime_ns"] = stat.st_mtime_ns
+                _write_json(meta_path, meta)
+            else:
+                meta = None
+
+    if meta is None:
+        data, columns, text = _parse_csv(csv_file_path)
+        meta = _write_sidecar(csv_file_path, cache_dir, data, columns, text, stat)
+
+    return cache_dir, meta
+
+
+def load_sidecar(csv_file_path: str, dtype=np.float64) -> tuple[np.ndarray, list[str]]:
+    """
+    Load a CSV through its binary sidecar cache. Returns (memory-mapped float array, column labels).
+
+    - First load parses the CSV and writes `block_*.npy` + `meta.json` into `.speakeeg_cache/<file name>/`.
+    - Later loads memory-map the `.npy` (copy-on-write, so callers can't corrupt the cache).
+    - Sidecar is rebuilt whenever the source file's size or contents change.
+      mtime is checked first; the SHA-1 is only recomputed if the mtime moved.
+    - Text columns come back as NaN; see `load_sidecar_text`.
+    - `dtype=np.float32`: a float32 copy of the block is written once (next to the float64 one) and mapped from then on.
+    """
+
+    cache_dir, meta = _sidecar_meta(csv_file_path)
+
+    dtype = np.dtype(dtype)
+    block_meta = meta["blocks"]
+    if dtype != np.float64:
+        block_meta = meta.get("variants", {}).get(dtype.name) or _write_variant(cache_dir, meta, dtype)
+
+    blocks = [np.load(os.path.join(cache_dir, b["file"]), mmap_mode="c") for b in block_meta]
+    data = blocks[0] if len(blocks) == 1 else np.concatenate(blocks, axis=1)
+
+    return data, meta["columns"]
+
+
+def load_sidecar_text(csv_file_path: str) -> dict[int, np.ndarray]:
+    """
+    Text columns of a CSV (e.g. default-format event labels) as {column index: memory-mapped string array}.
+    """
+
+    cache_dir, meta = _sidecar_meta(csv_file_path)
+    return {t["column"]: np.load(os.path.join(cache_dir, t["file"]), mmap_mode="r") for t in meta["text"]}
+
+
+def source_digest(csv_file_path: str) -> str:
+    """
+    SHA-1 of a CSV's contents, as recorded in its sidecar. Costs a stat + a small JSON read once the sidecar exists.
+    """
+
+    _, meta = _sidecar_meta(csv_file_path)
+    return meta["source"]["sha1"]
+
+
+def _write_json(path: str, obj) -> None:
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"  # per writer: pool workers/threads may build the same sidecar at once
+    with open(tmp_path, "w") as f:
+        json.dump(obj, f)
+    os.replace(tmp_path, path)  # atomic, so a half-written meta.json never gets read
+
+
+def _save_npy(path: str, array: np.ndarray) -> None:
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp.npy"
+    np.save(tmp_path, array)
+    os.replace(tmp_path, path)  # atomic, so a memmap never opens a half-written block
+
+
+def _write_variant(cache_dir: str, meta: dict, dtype: np.dtype) -> list[dict]:
+    """
+    Cast the float64 blocks of a sidecar to `dtype`, save them alongside and record them in `meta.json`.
+    A rebuilt sidecar starts without variants, so they're never stale.
+    """
+
+    variant = []
+    for b in meta["blocks"]:
+        block_file = b["file"].replace(".npy", f".{dtype.name}.npy")
+        _save_npy(os.path.join(cache_dir, block_file), np.load(os.path.join(cache_dir, b["file"]), mmap_mode="r").astype(dtype))
+        variant.append({**b, "file": block_file, "dtype": dtype.name})
+
+    meta.setdefault("variants", {})[dtype.name] = variant
+    _write_json(os.path.join(cache_dir, "meta.json"), meta)
+
+    return variant
+
+
+def _write_sidecar(csv_file_path, cache_dir, data, columns, text, stat) -> dict:
+    os.makedirs(cache_dir, exist_ok=True)
+
+    # One float block for now (all numeric columns share float64). `blocks` leaves room for per-dtype column groups.
+    block_file = "block_0.npy"
+    _save_npy(os.path.join(cache_dir, block_file), data)
+
+    text_meta = []
+    for i, values in text.items():
+        text_file = f"text_{i}.npy"
+        _save_npy(os.path.join(cache_dir, text_file), values)  # fixed-width unicode, so no pickling
+        text_meta.append({"file": text_file, "column": i})
+
+    meta = {
+        "version": SIDECAR_VERSION,
+        "source": {
+            "path": os.path.abspath(csv_file_path),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha1": file_digest(csv_file_path),
+        },
+        "shape": list(data.shape),
+        "columns": columns,
+        "blocks": [{"file": block_file, "columns": [0, data.shape[1]], "dtype": str(data.dtype)}],
+        "text": text_meta,
+    }
+    _write_json(os.path.join(cache_dir, "meta.json"), meta)  # written last: marks the sidecar as complete
+
+    return meta
+
+
+def strided_windows(data: np.ndarray, size: int, hop: int = None) -> np.ndarray:
+    """
+    Zero-copy sliding windows over a (n_times, n_channels) array. Returns read-only (n_windows, size, n_channels) view.
+    - `hop` defaults to `size` (back-to-back windows). Only complete windows are included.
+    - Works on any strides (column slices, transposed MNE data, memmaps), nothing is copied.
+    """
+
+    hop = size if hop is None else hop
+    if size <= 0 or hop <= 0:
+        raise ValueError(f"Window size {size} and hop {hop} must be positive.")
+
+    n_times, n_channels = data.shape
+    n_windows = 0 if n_times < size else (n_times - size) // hop + 1
+    time_stride, channel_stride = data.strides
+
+    return np.lib.stride_tricks.as_strided(
+        data,
+        shape=(n_windows, size, n_channels),
+        strides=(hop * time_stride, time_stride, channel_stride),
+        writeable=False
+    )
+
+
+# **** EPOCHING **** #
+def find_events(markers: np.ndarray, shortest_event: int = 2) -> np.ndarray:
+    """
+    Same events as `mne.find_events(raw)` with its defaults, straight from a marker column (no `Raw` needed).
+    Returns (n_events, 3) int array like MNE's: [sample, previous value, marker value].
+    - consecutive="increasing": an event starts wherever the marker steps up (0->1, 1->2, ...).
+    - A marker still "on" at the end of the recording counts, a nonzero first sample doesn't (initial_event=False).
+    - Like MNE, raises if two events are closer than `shortest_event` samples.
+    """
+
+    markers = np.abs(np.asarray(markers).astype(np.int64)) # MNE truncates to int and uses |value|
+
+    step_ix = np.flatnonzero(np.diff(markers) != 0) + 1
+    pre, post = markers[step_ix - 1], markers[step_ix]
+    if len(step_ix) and post[-1] != 0: # closing step back to 0 after the last sample
+        step_ix = np.append(step_ix, len(markers))
+        pre, post = np.append(pre, post[-1]), np.append(post, 0)
+
+    onset_ix = np.flatnonzero(post > pre)
+    offset_ix = np.flatnonzero(((post > pre) | (post == 0)) & (pre > 0))
+    if len(onset_ix) == 0 or len(offset_ix) == 0:
+        return np.empty((0, 3), dtype=np.int64)
+    if onset_ix[-1] > offset_ix[-1]: # orphaned onset
+        onset_ix = onset_ix[:-1]
+
+    events = np.column_stack([step_ix[onset_ix], pre[onset_ix], post[onset_ix]])
+
+    n_short = int(np.sum(np.diff(events[:, 0]) < shortest_event))
+    if n_short > 0:
+        raise ValueError(f"{n_short} events are shorter than shortest_event ({shortest_event} samples).")
+
+    return events
+
+
+def extract_epochs(
+    data: np.ndarray,
+    markers: np.ndarray,
+    tmin: float = -0.1,
+    tmax: float = 0.6,
+    event_id: dict | list | int = None,
+    baseline: tuple = None,
+    sfreq: float = SFREQ,
+    events: np.ndarray = None
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Marker-locked epochs, identical to `mne.Epochs(raw, find_events(raw), event_id, tmin, tmax, baseline,
+    preload=True).get_data()` but without building any MNE objects.
+    - `data`: (n_channels, n_times), e.g. the 8 EEG rows. `markers`: (n_times,) marker column.
+    - `event_id`: keep only these marker values ({"Non-Target": 1, "Target": 2}, [1, 2] or 2). Default: all.
+    - `baseline`: (bmin, bmax) in seconds, None = start/end of the epoch. Mean over it is subtracted per channel.
+    - Epochs running off either end of the recording are dropped, like MNE does.
+    - `events`: precomputed `find_events` output, if you have it.
+
+    Returns (X, y, events): (n_epochs, n_channels, n_times) array in `data`'s dtype, marker value of each epoch,
+    and the events that were kept.
+    """
+
+    events = find_events(markers) if events is None else events
+    if event_id is not None:
+        ids = list(event_id.values()) if isinstance(event_id, dict) else np.atleast_1d(event_id)
+        events = events[np.isin(events[:, 2], ids)]
+
+    # MNE rounds tmin/tmax to samples and includes both ends
+    start, stop = int(round(tmin * sfreq)), int(round(tmax * sfreq))
+    n_times = stop - start + 1
+
+    first = events[:, 0] + start
+    in_bounds = (first >= 0) & (first + n_times <= data.shape[1])
+    events, first = events[in_bounds], first[in_bounds]
+    if len(events) == 0:
+        return np.empty((0, data.shape[0], n_times), dtype=data.dtype), events[:, 2].copy(), events
+
+    # (n_windows, n_channels, n_times) view of every window; one fancy index gathers all epochs in a single copy
+    windows = np.lib.stride_tricks.sliding_window_view(data, n_times, axis=1).transpose(1, 0, 2)
+    X = windows[first]
+
+    if baseline is not None:
+        times = np.arange(start, stop + 1) / sfreq
+        bmin, bmax = baseline
+        imin = 0 if bmin is None else np.flatnonzero(times >= bmin)[0]
+        imax = n_times if bmax is None else np.flatnonzero(times <= bmax)[-1] + 1
+        X -= X[..., imin:imax].mean(axis=-1, keepdims=True)
+
+    return X, events[:, 2].copy(), events
+
+
+def balanced_indices(labels: np.ndarray, classes=None, rng=None) -> np.ndarray:
+    """
+    Indices of a class-balanced subset of `labels` (e.g. the `y` from `extract_epochs`, or `events[:, 2]`):
+    every class is randomly downsampled to the size of the smallest one. Sorted, so time order is kept.
+    - `classes`: only balance/keep these labels (e.g. (1, 2)); default all.
+    - `rng`: seed or np.random.Generator, so the subset is reproducible. Never touches the global RNG.
+    Works on labels only -- O(events), the signal is never read.
+    """
+
+    labels = np.asarray(labels)
+    rng = np.random.default_rng(rng)
+    classes = np.unique(labels) if classes is None else np.asarray(classes)
+
+    members = [np.flatnonzero(labels == c) for c in classes]
+    n_keep = min(len(ix) for ix in members) if members else 0
+
+    keep = [rng.choice(ix, n_keep, replace=False) for ix in members]
+    return np.sort(np.concatenate(keep)) if keep else np.empty(0, dtype=np.int64)
+
+
+def balanced_weights(labels: np.ndarray, classes=None) -> np.ndarray:
+    """
+    Per-sample weights 1 / (size of its class), for `torch.utils.data.WeightedRandomSampler(weights, len(weights))`.
+    Each class then gets drawn equally often, without dropping any epochs. Labels outside `classes` get weight 0.
+    """
+
+    labels = np.asarray(labels)
+    classes = np.unique(labels) if classes is None else np.asarray(classes)
+
+    weights = np.zeros(len(labels), dtype=np.float64)
+    for c in classes:
+        is_c = labels == c
+        n = np.count_nonzero(is_c)
+        if n:
+            weights[is_c] = 1 / n
+
+    return weights
+
+
+# **** SCIPY FILTER BACKEND **** #
+# Reproduces MNE's defaults for `raw.filter(l, h, fir_design="firwin")` and `raw.notch_filter(freqs)`:
+# hamming window, "auto" transition bandwidths + filter lengths, zero-phase, "reflect_limited" edge padding.
+_HAMMING_LENGTH_FACTOR = 3.3
+_NOTCH_TRANS_BANDWIDTH = 1.0
+
+
+def _fir_length(trans_bandwidth: float, sfreq: float) -> int:
+    n = max(int(np.ceil(_HAMMING_LENGTH_FACTOR / trans_bandwidth * sfreq)), 1)
+    return n + (n - 1) % 2 # odd, so the filter is zero-phase
+
+
+def _firwin_kernel(n: int, freq: list, gain: list, sfreq: float) -> np.ndarray:
+    """
+    Same construction as MNE's firwin design: one windowed-sinc low-pass per transition band, each with its own
+    length, added/subtracted into a length-`n` kernel. `freq` in Hz from 0 to Nyquist, `gain` 0/1 at each point.
+    """
+
+    freq = np.asarray(freq, dtype=np.float64) / (sfreq / 2) # 1 = Nyquist
+    h = np.zeros(n)
+    if gain[-1] == 1:
+        h[n // 2] = 1 # start "all pass"
+
+    prev_freq, prev_gain = freq[-1], gain[-1]
+    for this_freq, this_gain in zip(freq[::-1][1:], gain[::-1][1:]):
+        if this_gain != prev_gain:
+            transition = (prev_freq - this_freq) / 2
+            this_n = int(round(_HAMMING_LENGTH_FACTOR / transition))
+            this_n += 1 - this_n % 2
+
+            low_pass = signal.firwin(this_n, (prev_freq + this_freq) / 2, window="hamming", pass_zero=True, fs=2)
+            offset = (n - this_n) // 2
+            if this_gain == 0:
+                h[offset:n - offset] -= low_pass
+            else:
+                h[offset:n - offset] += low_pass
+        prev_freq, prev_gain = this_freq, this_gain
+
+    return h
+
+
+@functools.lru_cache(maxsize=None)
+def design_filter(
+    sfreq: float = SFREQ,
+    band: tuple[float, float] = (CUTOFF_LOW_FREQ, CUTOFF_HIGH_FREQ),
+    notch: float | None = POWERLINE_FREQ,
+    design: str = "firwin"
+) -> tuple[np.ndarray, ...]:
+    """
+    FIR kernels for band-pass (+ notch), matching what `filter_mne` gets from MNE. Memoized on all arguments,
+    so batch preprocessing designs each filter once. Returns a tuple of read-only 1-D kernels.
+    """
+
+    if design != "firwin":
+        raise ValueError(f"Filter design {design!r} not supported (only 'firwin').")
+
+    l_freq, h_freq = band
+    nyquist = sfreq / 2
+    if not 0 < l_freq < h_freq < nyquist:
+        raise ValueError(f"Band {band} must satisfy 0 < low < high < Nyquist ({nyquist}).")
+
+    # Band-pass
+    l_trans = min(max(0.25 * l_freq, 2.0), l_freq)
+    h_trans = min(max(0.25 * h_freq, 2.0), nyquist - h_freq)
+    l_stop, h_stop = l_freq - l_trans, h_freq + h_trans
+
+    freq, gain = [l_stop, l_freq, h_freq, h_stop], [0, 1, 1, 0]
+    if h_stop != nyquist:
+        freq, gain = freq + [nyquist], gain + [0]
+    if l_stop != 0:
+        freq, gain = [0] + freq, [0] + gain
+
+    kernels = [_firwin_kernel(_fir_length(min(l_trans, h_trans), sfreq), freq, gain, sfreq)]
+
+    # Notch (band-stop), MNE defaults: notch width = freq / 200, 1 Hz transition
+    if notch is not None:
+        half_trans = _NOTCH_TRANS_BANDWIDTH / 2
+        pass_low = notch - notch / 400 - half_trans
+        pass_high = notch + notch / 400 + half_trans
+
+        freq = [0, pass_low, pass_low + half_trans, pass_high - half_trans, pass_high, nyquist]
+        gain = [1, 1, 0, 0, 1, 1]
+        kernels.append(_firwin_kernel(_fir_length(half_trans, sfreq), freq, gain, sfreq))
+
+    for h in kernels:
+        h.flags.writeable = False # shared through the cache
+    return tuple(kernels)
+
+
+def apply_fir(data: np.ndarray, h: np.ndarray) -> np.ndarray:
+    """
+    Zero-phase FIR filter along the last axis (e.g. (n_channels, n_times)). Returns a new array.
+    - Edges are padded like MNE's "reflect_limited" to cut down on edge ringing.
+    - Runs in the data's precision (float32 data -> float32 convolution).
+    """
+
+    h = h.astype(data.dtype, copy=False)
+
+    n_times = data.shape[-1]
+    n_edge = max(min(len(h), n_times) - 1, 0)
+
+    # "reflect_limited": point-symmetric reflection about the edge samples, zero-padded if the signal is too short
+    zeros = np.zeros(data.shape[:-1] + (max(n_edge - n_times + 1, 0),), dtype=data.dtype)
+    padded = np.concatenate([
+        zeros,
+        2 * data[..., :1] - data[..., n_edge:0:-1],
+        data,
+        2 * data[..., -1:] - data[..., -2:-n_edge - 2:-1],
+        zeros
+    ], axis=-1)
+
+    full = signal.oaconvolve(padded, h.reshape((1,) * (data.ndim - 1) + (-1,)), mode="full", axes=-1)
+    shift = (len(h) - 1) // 2 + n_edge # left padding is always n_edge long in total
+
+    return full[..., shift:shift + n_times].astype(data.dtype, copy=False)
+
 
 class ReadCSV:
     """
     Works with Neurosity Crown data in CSV format.
 
     Functionality:
-    - `_load_df`: Load entire CSV DataFrame from file.
+    - `_load_df`: Load entire CSV DataFrame from file (through the binary sidecar cache).
     - `get_second`: Access pd.DataFrame representing one second of data.
+    - `windows`: Zero-copy (n_windows, size, n_columns) view of the whole recording.
+
+    `dtype` (default `DTYPE`) is the precision everything downstream works in.
     """
 
-    def __init__(self, csv_file_path: str):
+    def __init__(self, csv_file_path: str, dtype=DTYPE):
         self.csv_file_path = csv_file_path
+        self.dtype = np.dtype(dtype)
         self._DF = self._load_df().iloc[:, CHANNEL_IX[0]:CHANNEL_IX[1]]
     
 
     def _load_df(self) -> pd.DataFrame:
         """
-        Load entire CSV DataFrame from file. Returns pd.DataFrame
+        Load entire CSV DataFrame from file. Returns pd.DataFrame of floats (header row, if any, becomes the column labels).
+        - Backed by a memory-mapped `.npy` sidecar (see `load_sidecar`), so reloading a session is near-instant.
 
         Returns error if file not found or not readable.
         """
         if not os.path.exists(self.csv_file_path):
             raise FileNotFoundError(f"The file at {self.csv_file_path} does not exist.")
         try:
-            init_df = pd.read_csv(self.csv_file_path, header=None, float_precision="round_trip")
-
-            # Convert all cells to floats, except first column
-            init_df.iloc[1:, CHANNEL_IX[0]:CHANNEL_IX[1]] = init_df.iloc[1:, CHANNEL_IX[0]:CHANNEL_IX[1]].astype(float)
+            data, columns = load_sidecar(self.csv_file_path, self.dtype)
 
             #! Markers are all floats (0.0, 1.0, 2.0)
 
-            return init_df
+            return pd.DataFrame(data, columns=columns, copy=False)  # no copy: frame wraps the memmap
 
         except Exception as e:
             raise ValueError(f"An error occurred while reading the CSV file: {e}")
@@ -81,36 +635,278 @@ class ReadCSV:
         return df.iloc[start_ix:start_ix+256, :], start_ix+255 < df.shape[0]
 
 
+    def windows(self, size: int = 256, hop: int = None) -> np.ndarray:
+        """
+        (n_windows, size, n_columns) read-only NumPy view over the loaded data, built with stride tricks (no copies).
+        - Defaults give every complete second, i.e. `get_second(i)` for all i, stacked.
+        - Unlike `get_second`, the incomplete last window is left out.
+        - Vectorized feature extraction can run over the result in one call, e.g. `x.mean(axis=1)`.
+        """
+
+        return strided_windows(self._DF.to_numpy(), size, hop)
+
+
+class StreamCSV:
+    """
+    Streams Neurosity Crown CSV data from disk in chunks, without loading the whole file.
+    Memory stays at ~(`chunk_rows` + window size) rows no matter how long the recording is.
+
+    Uses the same columns (`CHANNEL_IX`) and header handling as `ReadCSV`.
+
+    Functionality:
+    - `iter_seconds`: Yields the same (pd.DataFrame, bool) pairs as `ReadCSV.get_second(0)`, `get_second(1)`, ...
+    - `iter_windows`: Yields (pd.DataFrame, bool) for any window/hop size.
+    """
+
+    def __init__(self, csv_file_path: str, chunk_rows: int = 8192):
+        if not os.path.exists(csv_file_path):
+            raise FileNotFoundError(f"The file at {csv_file_path} does not exist.")
+
+        self.csv_file_path = csv_file_path
+        self.chunk_rows = chunk_rows
+
+
+    def _iter_chunks(self):
+        """
+        Yields (np.ndarray, column labels) of up to `chunk_rows` rows at a time.
+        """
+
+        reader = pd.read_csv(
+            self.csv_file_path,
+            header=0 if _has_header(self.csv_file_path) else None,
+            usecols=range(CHANNEL_IX[0], CHANNEL_IX[1]),
+            skipinitialspace=True,
+            float_precision="round_trip",
+            dtype=np.float64,
+            chunksize=self.chunk_rows
+        )
+        with reader:
+            for chunk in reader:
+                yield chunk.to_numpy(dtype=np.float64), [str(c) for c in chunk.columns]
+
+
+    def iter_windows(self, size: int = 256, hop: int = None):
+        """
+        Yields (size x n_columns DataFrame, is_complete) for windows starting at 0, hop, 2*hop, ...
+        - `hop` defaults to `size` (back-to-back windows).
+        - Like `get_second`, windows that run past the end of the file are still yielded (shorter), with `False`.
+        - DataFrame index is the row number in the file, same as `ReadCSV._DF`.
+        """
+
+        hop = size if hop is None else hop
+        if size <= 0 or hop <= 0:
+            raise ValueError(f"Window size {size} and hop {hop} must be positive.")
+
+        buf = None     # rows not yet fully consumed
+        buf_start = 0  # file row number of buf[0]
+        next_start = 0 # file row number of the next window to yield
+        columns = None
+
+        for chunk, columns in self._iter_chunks():
+            buf = chunk if buf is None else np.concatenate((buf, chunk))
+
+            while next_start + size <= buf_start + len(buf):
+                yield self._window(buf, buf_start, next_start, size, columns), True
+                next_start += hop
+
+            # Drop rows no future window needs (may drop the whole buffer if hop > size)
+            cut = min(next_start - buf_start, len(buf))
+            buf = buf[cut:]
+            buf_start += cut
+
+        if buf is None:
+            return
+
+        # Incomplete windows at the end of the recording
+        while next_start < buf_start + len(buf):
+            yield self._window(buf, buf_start, next_start, size, columns), False
+            next_start += hop
+
+
+    def iter_seconds(self):
+        """
+        Yields (256 x n_columns DataFrame, is_complete) for every second, in order.
+        - Same output as calling `ReadCSV.get_second` for each second, but streamed from disk.
+        """
+
+        return self.iter_windows(size=256, hop=256)
+
+
+    @staticmethod
+    def _window(buf, buf_start, start, size, columns) -> pd.DataFrame:
+        rows = buf[start - buf_start:start - buf_start + size]
+        return pd.DataFrame(
+            rows.copy(), # own the rows -- `buf` gets recycled for the next chunk
+            index=pd.RangeIndex(start, start + len(rows)),
+            columns=columns,
+            copy=False
+        )
+
+
 class MNEFilter(ReadCSV):
     """
-    Preprocesses data using MNE-python.
+    Preprocesses data using MNE-python (or plain SciPy, with `backend="scipy"`).
 
     Functionality:
     - `to_mne`: Converts CSV file to MNE `Raw` data format.
     - `filter_mne`: Filters MNE data using low-pass and powerline filters.
+    - `filter_scipy`: Same filters applied straight to the channel array (no MNE objects).
+    - `filtered_data`: Filtered (n_channels, n_times) array, whichever backend made it.
     - `plot_raw`: Plots raw data using MNE.
     - `plot_filtered_raw`: Plots raw data with filters applied.
     - `plot_psd`: Plots power spectral density (PSD) of filtered data using MNE.
+    - `windows`: Zero-copy window view of raw (µV) or filtered (V) data.
+    - `epochs`: Marker-locked epochs (n_epochs, 8, n_times), same as mne.Epochs but vectorized.
+
+    `_RAW` (unfiltered) and `_RAW_FILTERED` are built the first time they're used, then cached according to
+    `raw_policy`:
+    - "share": one buffer. Filtering runs in place on the cached raw, so afterwards `_RAW is _RAW_FILTERED`.
+      (This is what the pipeline always did -- `raw.filter()`/`notch_filter()` work in place.)
+      The scipy backend only shares when `dtype` is float64 (MNE's); otherwise it filters a `dtype` copy.
+    - "copy": `_RAW` stays truly unfiltered. Filtering copies the raw only if it's currently held;
+      otherwise it filters a fresh build and the raw is rebuilt (cheaply, from the sidecar) if asked for later.
+    - "none": the raw is never held; every `_RAW` access rebuilds it. Least memory for long sessions.
+
+    MNE objects (`_RAW`, `_RAW_FILTERED`, the "mne" backend) are always float64; for float32 end to end use
+    `backend="scipy"`.
+
+    With a `cache` (`cache.PipelineCache`), filtered data and epochs are stored on disk keyed by file contents +
+    settings, so re-running a notebook on unchanged data skips straight to modeling.
     """
 
-    def __init__(self, _DF): # parameters passed into ReadCSV, not MNEFilter
-                             # e.g. if you initialize MNEFilter(X), X is not a pd.DataFrame, but a path to a CSV file
-        super().__init__(_DF)
-        self._RAW = self.to_mne()
-        self._RAW_FILTERED = self.filter_mne()
-    
+    def __init__(self, _DF, backend: str = "mne", raw_policy: str = "copy", cache=None, dtype=DTYPE): # parameters passed into ReadCSV, not MNEFilter
+                                                                              # e.g. if you initialize MNEFilter(X), X is not a pd.DataFrame, but a path to a CSV file
+        super().__init__(_DF, dtype)
+
+        if backend not in FILTER_BACKENDS:
+            raise ValueError(f"Filter backend {backend!r} not one of {FILTER_BACKENDS}.")
+        if raw_policy not in RAW_POLICIES:
+            raise ValueError(f"Raw policy {raw_policy!r} not one of {RAW_POLICIES}.")
+        self.backend = backend
+        self.raw_policy = raw_policy
+        self.cache = cache
+
+        # Nothing is built or filtered until it's needed
+        self._raw_cache = None       # mne.RawArray, unfiltered (or filtered in place, with "share")
+        self._filtered_cache = None  # mne.RawArray, filtered
+        self._filtered_array = None  # np.ndarray, filtered (scipy backend)
+
+
+    @property
+    def _RAW(self):
+        """
+        Unfiltered data as mne.RawArray. Built on first use; kept unless `raw_policy="none"`.
+        """
+
+        if self._raw_cache is not None:
+            return self._raw_cache
+        if self.raw_policy == "share" and self._filtered_cache is not None:
+            return self._filtered_cache # raw buffer was filtered in place
+
+        raw = self.to_mne()
+        if self.raw_policy != "none":
+            self._raw_cache = raw
+        return raw
+
+
+    @property
+    def _RAW_FILTERED(self):
+        """
+        Filtered data as mne.RawArray. Filtered on first use, then cached.
+        """
+
+        if self._filtered_cache is None and self.backend == "mne":
+            cached = self._cache_get()
+            if cached is not None:
+                self._filtered_cache = self._array_to_mne(np.array(cached))
+
+        if self._filtered_cache is None:
+            if self.backend == "scipy":
+                filtered = self._FILTERED
+                if self._raw_cache is not None and self._raw_cache._data is filtered:
+                    self._filtered_cache = self._raw_cache # "share": raw buffer was filtered in place
+                else:
+                    self._filtered_cache = self._array_to_mne(filtered)
+            elif self.raw_policy == "share":
+                self._filtered_cache = self.filter_mne(self._RAW)
+            else:
+                self._filtered_cache = self.filter_mne()
+
+            if self.backend == "mne":
+                self._cache_put(self._filtered_cache._data)
+
+        return self._filtered_cache
+
+
+    @property
+    def _FILTERED(self) -> np.ndarray:
+        """
+        Filtered (n_channels, n_times) array from the scipy backend. Filtered on first use, then cached.
+        """
+
+        if self._filtered_array is None:
+            self._filtered_array = self._cache_get()
+
+        if self._filtered_array is None:
+            if self.raw_policy == "share" and self._raw_cache is not None and self._raw_cache._data.dtype == self.dtype:
+                self._filtered_array = self.filter_scipy(self._raw_cache._data) # in place: raw becomes filtered
+            elif self._raw_cache is not None:
+                self._filtered_array = self.filter_scipy(np.array(self._raw_cache._data, dtype=self.dtype))
+            else:
+                self._filtered_array = self.filter_scipy()
+
+            self._cache_put(self._filtered_array)
+
+        return self._filtered_array
+
+
+    def _cache_key(self, stage: str = "filtered", **params) -> str:
+        # Everything that changes the filtered output, + whatever the stage adds
+        return self.cache.key(
+            stage, self.csv_file_path,
+            backend=self.backend,
+            dtype=self.dtype.name,
+            columns=list(CHANNEL_IX),
+            sfreq=SFREQ,
+            band=(CUTOFF_LOW_FREQ, CUTOFF_HIGH_FREQ),
+            notch=POWERLINE_FREQ,
+            **params
+        )
+
+
+    def _cache_get(self) -> np.ndarray | None:
+        if self.cache is None:
+            return None
+        cached = self.cache.get(self._cache_key())
+        return None if cached is None else cached["data"]
+
+
+    def _cache_put(self, data: np.ndarray) -> None:
+        if self.cache is not None:
+            self.cache.put(self._cache_key(), {"data": data}, stage="filtered")
     
-    def to_mne(self):
+
+    def _volts(self) -> np.ndarray:
         """
-        Converts CSV file to MNE `Raw` data format (similar to pd.DataFrame)
-        - Takes pd.DataFrame --> mne.RawArray
-        - Outputted RawArray contains metadata `info`.
- 
-        *Note that MNE has channels in rows instead of columns.*
+        Channels-in-rows `dtype` copy of the data, EEG rows converted from microvolts to volts (MNE expects volts).
+        Marker row (if any) is left alone. A copy, so the cached sidecar is never touched.
         """
 
+        data = np.array(self._DF.to_numpy().T, dtype=self.dtype)
+        data[:8] *= 1e-6
+        return data
+
+
+    def _array_to_mne(self, data: np.ndarray):
+        """
+        Wraps a (n_channels, n_times) array in an mne.RawArray with our channel names/types and 10-20 montage.
+        """
+
+        if mne is None:
+            raise ImportError("MNE-python is needed for the 'mne' backend and for plotting.")
+
         ch_types = ["eeg"] * 8
-        ch_names = channels
+        ch_names = list(channels) # copy -- don't append "marker" onto the module-level list
         if IS_TRAIN_DATA: # ! Marker column
             ch_types.append("stim")
             ch_names.append("marker")
@@ -118,43 +914,51 @@ class MNEFilter(ReadCSV):
         # Instantiates metadata(labels) associated with CSV data. `sfreq` is sampling rate (256 Hz).
         info = mne.create_info(
             ch_names=ch_names,
-            sfreq=256,
+            sfreq=SFREQ,
             ch_types=ch_types
         )
 
-        df = self._DF.T.iloc[:, 1:] # Transpose DataFrame to have channels in rows
-                                    # Exclude first column (channels)
-
-        # Convert from microvolts to volts (MNE expects volts)
-        if IS_TRAIN_DATA:
-            df.iloc[:-1, 1:] = df.iloc[:-1, 1:].mul(1e-6)
-        else:
-            df.iloc[:, 1:] = df.iloc[:, 1:].mul(1e-6)
-        raw = mne.io.RawArray(df, info)
+        raw = mne.io.RawArray(data, info)
 
         # 10-20 channel location system
         montage = mne.channels.make_standard_montage("standard_1020")
         raw.set_montage(montage)
 
         return raw
+
+
+    def to_mne(self):
+        """
+        Converts CSV file to MNE `Raw` data format (similar to pd.DataFrame)
+        - Takes pd.DataFrame --> mne.RawArray
+        - Outputted RawArray contains metadata `info`.
+ 
+        *Note that MNE has channels in rows instead of columns.*
+        """
+
+        return self._array_to_mne(self._volts())
     
 
-    def filter_mne(self):
+    def _unfiltered_copy(self):
+        # Unfiltered mne.RawArray the caller may modify: a copy of the cached raw, or a fresh build if there's
+        # none (or "share" has filtered it in place)
+        raw = self._raw_cache
+        if raw is None or raw is self._filtered_cache or raw._data is self._filtered_array:
+            return self.to_mne()
+        return raw.copy()
+
+
+    def filter_mne(self, raw=None):
         """
-        Filters mne.RawArray data using:
-        - Low-pass filter: removes any noise outside of P300 frequencies
+        Filters mne.RawArray data (in place on `raw`; default: a copy of the unfiltered data, so `_RAW` is never
+        touched) using:
+        - Low-pass filter: removes any noise outside of P300 frequencies (`CUTOFF_LOW_FREQ`-`CUTOFF_HIGH_FREQ`)
           - According to Lafuente et al. (https://doi.org/10.1016/j.eswa.2016.12.038):
             "The smaller the probability of related event is, the more prominent the P300 will be" (Citi, Poli, & Cinel, 2010).
         - Powerline filter: removes any frequency emitted by powerlines (60Hz in Americas)        
         """
 
-        raw_U = self._RAW
-
-        # Low-pass filter
-        CUTOFF_LOW_FREQ, CUTOFF_HIGH_FREQ = 1, 18  # !! 10/9/24 # Changed from 1, 40 to 1, 18
-            # TODO -- EXPERIMENT WITH DIFFERENT P300 FREQUENCIES
-            # https://arc.net/l/quote/yiztowhs (0.1, 20)
-            # https://arc.net/l/quote/vadqwzby (1, 40)
+        raw_U = self._unfiltered_copy() if raw is None else raw
         
         # FIRwin is type of low-pass filter. Other type is butterworth.
         raw_Lpass = raw_U.filter(
@@ -165,11 +969,87 @@ class MNEFilter(ReadCSV):
 
         # Powerline filter
         raw_Lpass_notch = raw_Lpass.notch_filter(
-            freqs=60,             # 60 Hz in Americas
+            freqs=POWERLINE_FREQ,
             picks=list(range(8))  # Channels to pick; all 8 EEG channels
         )
 
         return raw_Lpass_notch # Low-pass & Powerline-filtered
+
+
+    def filter_scipy(self, data: np.ndarray = None) -> np.ndarray:
+        """
+        Same band-pass + powerline filters as `filter_mne`, applied directly to a channel array with SciPy.
+        - `data`: (n_channels, n_times) array in volts, filtered in place. Default: a fresh copy of the CSV data.
+        - Filter kernels come from `design_filter`, which is memoized, so they're designed once per process.
+        - Returns the filtered array; marker row (if any) untouched.
+        """
+
+        data = self._volts() if data is None else data
+        band_pass, notch = design_filter(SFREQ, (CUTOFF_LOW_FREQ, CUTOFF_HIGH_FREQ), POWERLINE_FREQ)
+        data[:8] = apply_fir(apply_fir(data[:8], band_pass), notch)
+
+        return data
+
+
+    def filtered_data(self) -> np.ndarray:
+        """
+        Filtered (n_channels, n_times) array in volts. No copy: it's the backend's own buffer
+        (except "mne" backend + float32, which has to cast MNE's float64).
+        """
+
+        if self.backend == "mne":
+            return self._RAW_FILTERED._data.astype(self.dtype, copy=False)
+        return self._FILTERED
+
+
+    def windows(self, size: int = 256, hop: int = None, filtered: bool = False) -> np.ndarray:
+        """
+        Same as `ReadCSV.windows`, optionally over the filtered data.
+        - `filtered=False`: CSV values (µV), straight from the cached array.
+        - `filtered=True`: `filtered_data()` values (V). Views the backend's own buffer, since `get_data()` would copy.
+        """
+
+        if not filtered:
+            return super().windows(size, hop)
+
+        return strided_windows(self.filtered_data().T, size, hop)
+    
+
+    def epochs(
+        self,
+        tmin: float = -0.1,
+        tmax: float = 0.6,
+        event_id: dict = None,
+        baseline: tuple = None,
+        filtered: bool = True
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        (X, y, events) of the 8 EEG channels around every marker onset, in volts. See `extract_epochs`.
+        - Replaces `find_events(raw)` + `Epochs(raw, events, event_id, tmin, tmax, baseline=None, preload=True)`.
+        - `filtered=False` epochs the unfiltered data.
+        - Cached on disk when the MNEFilter has a `cache`.
+        """
+
+        if not IS_TRAIN_DATA:
+            raise ValueError(f"Epoching needs a marker column; DATA_MODE {DATA_MODE!r} has none.")
+
+        def compute():
+            data = self.filtered_data() if filtered else self._volts()
+            X, y, events = extract_epochs(data[:8], data[-1], tmin, tmax, event_id, baseline)
+            return {"X": X, "y": y, "events": events}
+
+        if self.cache is None:
+            arrays = compute()
+        else:
+            key = self._cache_key(
+                "epochs", tmin=tmin, tmax=tmax, event_id=event_id, baseline=baseline, filtered=filtered
+            )
+            arrays = self.cache.get(key)
+            if arrays is None:
+                arrays = compute()
+                self.cache.put(key, arrays, stage="epochs")
+
+        return arrays["X"], arrays["y"], arrays["events"]
     
 
     def plot_raw(self):
@@ -262,34 +1142,20 @@ class MNEFilter(ReadCSV):
 
         return 0
     
-    def equalize_markers(self):
+    def equalize_markers(self, rng=None) -> np.ndarray:
         """
-        Each training file has markers in the last column. (Unique set = {0, 1, 2})
-        Remove surplus 1s such that 1s = 2s. We perform this action by replacing the 1s with 3s.
+        Each training file has markers in the last column (1 = non-target, 2 = target).
+        Returns the `find_events` rows of a balanced subset: surplus 1s dropped at random so 1s = 2s.
+        - Only the marker column is read (no copy of the recording, no new RawArray).
+        - `rng`: seed or np.random.Generator, for a reproducible subset.
+        - Pass the result to `mne.Epochs(raw, events, ...)` or `extract_epochs(..., events=events)`.
         """
 
         if not IS_TRAIN_DATA:
-            return 1
-
-        raw_F = self._RAW_FILTERED
-        data, times = raw_F.get_data(return_times=True)
-        markers = data[-1]
+            raise ValueError(f"Equalizing needs a marker column; DATA_MODE {DATA_MODE!r} has none.")
 
-        # find all 2s
-        marker_ix_2 = np.where(markers == 2)[0]
-        # find all 1s
-        marker_ix_1 = np.where(markers == 1)[0]
-        np.random.shuffle(marker_ix_1)
-        # indices of the 1s to remove
-        rem_ix = marker_ix_1[:len(marker_ix_1) - len(marker_ix_2)]
-
-        # replace 1s with 3s
-        markers[rem_ix] = 3
-        data[-1] = markers
-
-        raw_F = mne.io.RawArray(data, raw_F.info)
-
-        return raw_F
+        events = find_events(self._DF.iloc[:, -1].to_numpy())
+        return events[balanced_indices(events[:, 2], classes=(1, 2), rng=rng)]
 
 
 
@@ -301,16 +1167,11 @@ if __name__ == "__main__":
     data = MNEFilter(test_path) # parameters passed into ReadCSV, not MNEFilter
 
     # ! TEST MARKER EQUALIZER
-    x = data.equalize_markers()
-    data1, times = x.get_data(return_times=True)
-
-    df = pd.DataFrame(data1.T,index=times,columns=channels)
+    events = data.equalize_markers(rng=0)
 
-    print(df.iloc[:, -1].value_counts()) # should have equal 1s and 2s
+    print(pd.Series(events[:, 2]).value_counts()) # should have equal 1s and 2s
     """ with AAROOSH_data4.csv
-    0.0    70499
-    3.0      170
-    2.0      132
-    1.0      132
+    1    132
+    2    132
     Name: count, dtype: int64
     """
@@ -0,0 +1,164 @@
+"""
+Artifact rejection for epochs
+
+`reject_trials_using_std_per_channel` in `Ci_Classify.ipynb` loops over channels and drops epochs through MNE
+objects. Here every criterion is computed for all epochs x channels at once on the plain (n_epochs, n_channels,
+n_times) array from `MNEFilter.epochs`:
+- peak-to-peak too large (blinks, movement): `ptp_max`
+- peak-to-peak too small (flat / disconnected electrode): `flat_min`
+- variance too large (noisy trial): `var_max`
+Thresholds are a number (all channels) or one per channel. `percentile_thresholds` derives per-channel thresholds
+from the data, like the notebook did with `np.percentile(trial_std, 75)`. Use those for recordings the catalog marks
+as `amplitude: "counts"` -- their scale is off, so fixed µV limits like `PTP_MAX` reject everything.
+
+    keep, report = reject_epochs(X, ptp_max=150e-6, flat_min=1e-6)
+    X, y = X[keep], y[keep]
+
+    rejector = StreamingRejector(ptp_max=150e-6, flat_min=1e-6)   # live: one epoch at a time
+    if rejector(epoch): classify(epoch)
+"""
+
+
+import numpy as np
+
+
+PTP_MAX = 150e-6 # V; typical for µV-scaled EEG (MNE examples use 100-150 µV)
+FLAT_MIN = 1e-6  # V; a channel moving less than 1 µV over a whole epoch isn't recording
+
+REASONS = ("ptp", "flat", "var")
+
+
+def epoch_criteria(X: np.ndarray) -> dict[str, np.ndarray]:
+    """
+    Peak-to-peak and variance of every epoch and channel: {"ptp": (n_epochs, n_channels), "var": ...}.
+    Works for a single epoch (n_channels, n_times) too.
+    """
+
+    X = np.asarray(X)
+    return {
+        "ptp": X.max(axis=-1) - X.min(axis=-1),
+        "var": X.var(axis=-1),
+    }
+
+
+def percentile_thresholds(X: np.ndarray, q: float, criterion: str = "var") -> np.ndarray:
+    """
+    Per-channel threshold at the `q`-th percentile of `criterion` ("ptp" or "var") over epochs.
+    E.g. `var_max=percentile_thresholds(X, 75)` keeps ~75% of epochs per channel (the notebook's std rule).
+    """
+
+    return np.percentile(epoch_criteria(X)[criterion], q, axis=0)
+
+
+def _flags(criteria: dict, ptp_max, flat_min, var_max) -> dict[str, np.ndarray]:
+    # Boolean (..., n_channels) per criterion that's switched on; thresholds broadcast over the channel axis
+    flags = {}
+    if ptp_max is not None:
+        flags["ptp"] = criteria["ptp"] > ptp_max
+    if flat_min is not None:
+        flags["flat"] = criteria["ptp"] < flat_min
+    if var_max is not None:
+        flags["var"] = criteria["var"] > var_max
+    return flags
+
+
+def reject_epochs(
+    X: np.ndarray,
+    ptp_max: float | np.ndarray = None,
+    flat_min: float | np.ndarray = None,
+    var_max: float | np.ndarray = None
+) -> tuple[np.ndarray, dict]:
+    """
+    Flag bad epochs in one vectorized pass. An epoch is dropped if ANY channel fails ANY criterion that's set.
+    Returns (keep, report):
+    - `keep`: (n_epochs,) bool mask, e.g. `X[keep]`, `y[keep]`.
+    - `report`: "n_epochs", "n_kept", and for each criterion used: number of epochs it flagged (`report["ptp"]`)
+      and how often each channel failed it (`report["per_channel"]["ptp"]`, (n_channels,)).
+      An epoch failing several criteria is counted under each.
+    """
+
+    flags = _flags(epoch_criteria(X), ptp_max, flat_min, var_max)
+
+    bad = np.zeros(len(X), dtype=bool)
+    report = {"n_epochs": len(X), "per_channel": {}}
+    for reason, flagged in flags.items():
+        bad_epochs = flagged.any(axis=-1)
+        bad |= bad_epochs
+        report[reason] = int(bad_epochs.sum())
+        report["per_channel"][reason] = flagged.sum(axis=0)
+
+    report["n_kept"] = int((~bad).sum())
+    return ~bad, report
+
+
+class StreamingRejector:
+    """
+    Same criteria as `reject_epochs`, one epoch at a time, for live sessions: bad trials are dropped before they
+    reach the classifier.
+
+    Functionality:
+    - `__call__` / `check`: True if the (n_channels, n_times) epoch is clean.
+    - `last_reasons`: criteria the last epoch failed.
+    - `report`: Running counts, same layout as `reject_epochs`.
+    """
+
+    def __init__(
+        self,
+        ptp_max: float | np.ndarray = None,
+        flat_min: float | np.ndarray = None,
+        var_max: float | np.ndarray = None,
+        n_channels: int = 8
+    ):
+        self.ptp_max, self.flat_min, self.var_max = ptp_max, flat_min, var_max
+        self.last_reasons: list[str] = []
+
+        used = [reason for reason, t in zip(REASONS, (ptp_max, flat_min, var_max)) if t is not None]
+        self.report = {
+            "n_epochs": 0,
+            "n_kept": 0,
+            **{reason: 0 for reason in used},
+            "per_channel": {reason: np.zeros(n_channels, dtype=np.int64) for reason in used},
+        }
+
+
+    def check(self, epoch: np.ndarray) -> bool:
+        flags = _flags(epoch_criteria(epoch), self.ptp_max, self.flat_min, self.var_max)
+
+        self.last_reasons = []
+        for reason, flagged in flags.items():
+            self.report["per_channel"][reason] += flagged
+            if flagged.any():
+                self.report[reason] += 1
+                self.last_reasons.append(reason)
+
+        self.report["n_epochs"] += 1
+        keep = not self.last_reasons
+        self.report["n_kept"] += keep
+        return keep
+
+
+    __call__ = check
+
+
+
+if __name__ == "__main__":
+    import time
+    from preprocess import MNEFilter
+
+    test_path = "../../DATA/neurosity/visual-p300/headset_test/oct_RISHABH_test4.csv"
+    X, y, events = MNEFilter(test_path, backend="scipy").epochs(event_id={"Non-Target": 1, "Target": 2})
+
+    # "counts"-amplitude recording: thresholds from the data itself
+    thresholds = {
+        "ptp_max": percentile_thresholds(X, 95, "ptp"),
+        "flat_min": FLAT_MIN,
+        "var_max": percentile_thresholds(X, 90),
+    }
+
+    keep, report = reject_epochs(X, **thresholds)
+    print(report)
+
+    rejector = StreamingRejector(**thresholds)
+    start = time.perf_counter()
+    live_keep = np.array([rejector(epoch) for epoch in X])
+    print(f"streaming agrees: {np.array_equal(live_keep, keep)}, {(time.perf_counter() - start) / len(X) * 1e6:.1f} µs per epoch")
@@ -0,0 +1,362 @@
+"""
+Riemannian (covariance) P300 classifiers, with per-session caching and incremental recalibration
+
+`Ci_Classify.ipynb` runs pyriemann's `XdawnCovariances` / `ERPCovariances` + `MDM` inside `cross_val_score`, so every
+fold of every setting recomputes every epoch's covariance from scratch. But an ERP "super-trial" covariance splits
+into blocks:
+
+    cov([P; W^T X_i]) = [[ P P^T,       P X_i^T W   ],
+                         [ W^T X_i P^T, W^T X_i X_i^T W ]] / n_times
+
+Only P (class-mean templates) and W (Xdawn filters) depend on the training fold. X_i X_i^T is per epoch and is the
+expensive part, so `SessionCovariances` computes it once per session (optionally stored in the `cache.PipelineCache`)
+and every fold / nfilter / estimator setting just assembles blocks from it.
+
+`LogEuclideanMDM` keeps per-class sums of matrix logs, so its class means (log-Euclidean means) update with new
+calibration trials in O(new trials) -- `partial_fit` instead of a refit, milliseconds mid-session.
+
+    session = SessionCovariances.from_recording(path, cache=PipelineCache())
+    model = RiemannPipeline(nfilter=4).fit(session, train_ix, y[train_ix])
+    scores = model.decision_function(session, test_ix)
+    model.partial_fit(new_epochs, new_labels)            # live recalibration; templates/filters stay fixed
+
+Plain NumPy/SciPy (no sklearn / pyriemann). Labels are 0/1 (1 = target).
+"""
+
+
+import numpy as np
+from scipy import linalg
+
+from preprocess import MNEFilter
+
+
+ESTIMATORS = ("scm", "oas")
+
+
+def epoch_stats(X: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Per-epoch pieces every covariance is built from: time-centered epochs (n, n_channels, n_times) and their
+    empirical covariances X X^T / n_times (n, n_channels, n_channels), both float64.
+    """
+
+    Xc = np.asarray(X, dtype=np.float64)
+    Xc = Xc - Xc.mean(axis=-1, keepdims=True)
+    return Xc, np.einsum("nct,ndt->ncd", Xc, Xc) / Xc.shape[-1]
+
+
+def shrink(S: np.ndarray, n_samples: int, estimator: str = "oas") -> np.ndarray:
+    """
+    Batched covariance estimator on empirical covariances `S` (..., p, p) from `n_samples` samples each.
+    - "scm": `S` as is. "oas": Oracle Approximating Shrinkage towards mu*I (same formula as sklearn's `OAS`).
+    """
+
+    if estimator not in ESTIMATORS:
+        raise ValueError(f"Estimator {estimator!r} not one of {ESTIMATORS}.")
+    if estimator == "scm":
+        return S
+
+    p = S.shape[-1]
+    mu = np.trace(S, axis1=-2, axis2=-1) / p
+    alpha = np.mean(S ** 2, axis=(-2, -1))
+    num = alpha + mu ** 2
+    den = (n_samples + 1) * (alpha - mu ** 2 / p)
+    shrinkage = np.where(den == 0, 1.0, np.minimum(num / np.where(den == 0, 1, den), 1.0))[..., None, None]
+
+    return (1 - shrinkage) * S + shrinkage * mu[..., None, None] * np.eye(p)
+
+
+def logm_spd(C: np.ndarray) -> np.ndarray:
+    """
+    Matrix log of a batch of SPD matrices (..., p, p), via one batched eigendecomposition.
+    """
+
+    w, V = np.linalg.eigh(C)
+    return (V * np.log(w)[..., None, :]) @ np.swapaxes(V, -1, -2)
+
+
+def expm_sym(L: np.ndarray) -> np.ndarray:
+    w, V = np.linalg.eigh(L)
+    return (V * np.exp(w)[..., None, :]) @ np.swapaxes(V, -1, -2)
+
+
+class SessionCovariances:
+    """
+    Fold-independent per-epoch statistics of one session (see `epoch_stats`), computed once.
+
+    Functionality:
+    - `from_recording`: Epoch a CSV (`MNEFilter.epochs`) and compute the stats; stored in a `PipelineCache` if given.
+    - `X`, `XX`, `y`: Centered epochs, empirical covariances, labels (1 = target).
+    - `covariances`: Plain per-epoch covariances (pyriemann `Covariances`).
+    """
+
+    def __init__(self, X: np.ndarray, y: np.ndarray = None, XX: np.ndarray = None):
+        """
+        `X` raw or centered epochs (n, n_channels, n_times); pass `XX` only with already-centered `X`
+        (e.g. from the cache).
+        """
+
+        if XX is None:
+            X, XX = epoch_stats(X)
+        self.X, self.XX = X, XX
+        self.y = None if y is None else np.asarray(y)
+
+
+    def __len__(self) -> int:
+        return len(self.X)
+
+
+    @classmethod
+    def from_recording(
+        cls,
+        csv_file_path: str,
+        cache=None,
+        tmin: float = -0.1,
+        tmax: float = 0.6,
+        event_id: dict = None,
+        target: int = 2,
+        **filter_kwargs
+    ) -> "SessionCovariances":
+        """
+        Epochs of one recording (filtered, volts), labels `marker == target`. `filter_kwargs` go to MNEFilter.
+        """
+
+        event_id = {"Non-Target": 1, "Target": 2} if event_id is None else event_id
+        mne_filter = MNEFilter(csv_file_path, cache=cache, **filter_kwargs)
+
+        def compute():
+            X, markers, _ = mne_filter.epochs(tmin, tmax, event_id)
+            Xc, XX = epoch_stats(X)
+            return {"X": Xc, "XX": XX, "y": (markers == target).astype(np.int64)}
+
+        if cache is None:
+            arrays = compute()
+        else:
+            # Same key fields as the filtered/epochs entries (band, notch, backend, ...), so a filter change misses
+            key = mne_filter._cache_key("covariances", tmin=tmin, tmax=tmax, event_id=event_id, target=target)
+            arrays = cache.get(key)
+            if arrays is None:
+                arrays = compute()
+                cache.put(key, arrays, stage="covariances")
+
+        return cls(arrays["X"], arrays["y"], arrays["XX"])
+
+
+    def covariances(self, ix=slice(None), estimator: str = "oas") -> np.ndarray:
+        return shrink(self.XX[ix], self.X.shape[-1], estimator)
+
+
+class ERPCovariances:
+    """
+    Super-trial covariances [templates; (filtered) epoch] for P300, like pyriemann's `XdawnCovariances` (default)
+    or `ERPCovariances` (`xdawn=False`). Fitted from a `SessionCovariances` + training indices, so nothing per-epoch
+    is recomputed.
+
+    Functionality:
+    - `fit`: Class templates P and (with `xdawn`) spatial filters W from the training epochs.
+    - `transform`: Covariances of session epochs (by index) or of new raw epochs.
+    """
+
+    def __init__(self, nfilter: int = 4, xdawn: bool = True, classes=None, estimator: str = "oas"):
+        self.nfilter = nfilter
+        self.xdawn = xdawn
+        self.classes = classes
+        self.estimator = estimator
+
+
+    def fit(self, session: SessionCovariances, ix: np.ndarray, y: np.ndarray) -> "ERPCovariances":
+        X = session.X[ix]
+        y = np.asarray(y)
+        classes = np.unique(y) if self.classes is None else np.atleast_1d(self.classes)
+        evoked = [X[y == c].mean(axis=0) for c in classes] # (n_channels, n_times) each
+
+        if self.xdawn:
+            # Per class: filters maximizing evoked power / total (noise) power. Noise covariance = mean of the cached XX
+            noise = session.XX[ix].mean(axis=0)
+            filters = []
+            for P_c in evoked:
+                signal_cov = P_c @ P_c.T / P_c.shape[-1]
+                _, V = linalg.eigh(signal_cov, noise)
+                filters.append(V[:, ::-1][:, :self.nfilter]) # largest generalized eigenvalues first
+            self.W_ = np.hstack(filters)
+            self.P_ = np.vstack([V_c.T @ P_c for V_c, P_c in zip(filters, evoked)])
+        else:
+            self.W_ = None
+            self.P_ = np.vstack(evoked)
+
+        self.P_ = self.P_ - self.P_.mean(axis=-1, keepdims=True)
+        self.classes_ = classes
+        return self
+
+
+    def _assemble(self, Xc: np.ndarray, XX: np.ndarray) -> np.ndarray:
+        n_times = Xc.shape[-1]
+        m = len(self.P_)
+
+        cross = np.einsum("mt,nct->nmc", self.P_, Xc) / n_times # P X_i^T
+        if self.W_ is not None:
+            cross = cross @ self.W_
+            XX = np.swapaxes(self.W_, 0, 1) @ XX @ self.W_
+
+        p = m + XX.shape[-1]
+        S = np.empty((len(Xc), p, p))
+        S[:, :m, :m] = self.P_ @ self.P_.T / n_times
+        S[:, :m, m:] = cross
+        S[:, m:, :m] = np.swapaxes(cross, -1, -2)
+        S[:, m:, m:] = XX
+        return shrink(S, n_times, self.estimator)
+
+
+    def transform(self, session: SessionCovariances = None, ix=slice(None), X: np.ndarray = None) -> np.ndarray:
+        """
+        (n, p, p) covariances of `session` epochs `ix`, or of new raw epochs `X` (n, n_channels, n_times).
+        """
+
+        if X is not None:
+            return self._assemble(*epoch_stats(X))
+        return self._assemble(session.X[ix], session.XX[ix])
+
+
+class LogEuclideanMDM:
+    """
+    Minimum distance to mean with log-Euclidean class means: mean_c = expm(mean of logm(C_i) over class c).
+    Stored as running sums of matrix logs, so more trials can be added at any time.
+
+    Functionality:
+    - `fit` / `partial_fit`: (Re)start / update the class means with covariances (n, p, p) and labels.
+    - `transform`: Log-Euclidean distance of each covariance to each class mean, (n, n_classes).
+    - `predict`, `decision_function` (target score: d(non-target) - d(target)), `means_`.
+    """
+
+    def __init__(self):
+        self._sums = {}
+        self._counts = {}
+
+
+    def fit(self, C: np.ndarray, y: np.ndarray) -> "LogEuclideanMDM":
+        self._sums, self._counts = {}, {}
+        return self.partial_fit(C, y)
+
+
+    def partial_fit(self, C: np.ndarray, y: np.ndarray) -> "LogEuclideanMDM":
+        L = logm_spd(C)
+        y = np.asarray(y)
+        for c in np.unique(y):
+            c = c.item()
+            self._sums[c] = self._sums.get(c, 0) + L[y == c].sum(axis=0)
+            self._counts[c] = self._counts.get(c, 0) + int(np.sum(y == c))
+
+        self.classes_ = np.array(sorted(self._sums))
+        self._log_means = np.stack([self._sums[c] / self._counts[c] for c in self.classes_])
+        return self
+
+
+    @property
+    def means_(self) -> np.ndarray:
+        return expm_sym(self._log_means)
+
+
+    def transform(self, C: np.ndarray) -> np.ndarray:
+        L = logm_spd(C)
+        return np.linalg.norm(L[:, None] - self._log_means[None], axis=(-2, -1))
+
+
+    def predict(self, C: np.ndarray) -> np.ndarray:
+        return self.classes_[self.transform(C).argmin(axis=1)]
+
+
+    def decision_function(self, C: np.ndarray) -> np.ndarray:
+        d = self.transform(C)
+        return d[:, 0] - d[:, -1] # > 0: closer to the last class (target)
+
+
+class RiemannPipeline:
+    """
+    `ERPCovariances` + `LogEuclideanMDM` (the notebook's "XdawnCov + MDM" / "ERPCov + MDM").
+    - `fit` / `decision_function` / `predict` take a `SessionCovariances` + indices, or new raw epochs (`X=`).
+    - `partial_fit(X, y)`: add new calibration epochs to the class means. Templates/filters stay as fitted.
+    """
+
+    def __init__(self, nfilter: int = 4, xdawn: bool = True, estimator: str = "oas"):
+        self.covariances = ERPCovariances(nfilter, xdawn, estimator=estimator)
+        self.mdm = LogEuclideanMDM()
+
+
+    def fit(self, session: SessionCovariances, ix: np.ndarray, y: np.ndarray = None) -> "RiemannPipeline":
+        y = session.y[ix] if y is None else y
+        self.covariances.fit(session, ix, y)
+        self.mdm.fit(self.covariances.transform(session, ix), y)
+        return self
+
+
+    def partial_fit(self, X: np.ndarray, y: np.ndarray) -> "RiemannPipeline":
+        self.mdm.partial_fit(self.covariances.transform(X=X), y)
+        return self
+
+
+    def decision_function(self, session: SessionCovariances = None, ix=slice(None), X: np.ndarray = None) -> np.ndarray:
+        return self.mdm.decision_function(self.covariances.transform(session, ix, X))
+
+
+    def predict(self, session: SessionCovariances = None, ix=slice(None), X: np.ndarray = None) -> np.ndarray:
+        return self.mdm.predict(self.covariances.transform(session, ix, X))
+
+
+def stratified_splits(y: np.ndarray, n_splits: int = 10, test_size: float = 0.25, rng=42) -> list[tuple]:
+    """
+    (train_ix, test_ix) pairs, each test set `test_size` of every class -- like sklearn's StratifiedShuffleSplit.
+    """
+
+    y = np.asarray(y)
+    rng = np.random.default_rng(rng)
+    splits = []
+    for _ in range(n_splits):
+        test = []
+        for c in np.unique(y):
+            members = rng.permutation(np.flatnonzero(y == c))
+            test.append(members[:int(round(test_size * len(members)))])
+        test = np.sort(np.concatenate(test))
+        splits.append((np.setdiff1d(np.arange(len(y)), test), test))
+    return splits
+
+
+def roc_auc(y: np.ndarray, scores: np.ndarray) -> float:
+    """
+    Area under the ROC curve (Mann-Whitney U; ties count half).
+    """
+
+    y = np.asarray(y).astype(bool)
+    ranks = np.empty(len(scores))
+    order = np.argsort(scores, kind="mergesort")
+    ranks[order] = np.arange(1, len(scores) + 1)
+    # average ranks over ties
+    _, inverse, counts = np.unique(scores, return_inverse=True, return_counts=True)
+    ranks = (np.bincount(inverse, ranks) / counts)[inverse]
+
+    n_pos, n_neg = y.sum(), (~y).sum()
+    return float((ranks[y].sum() - n_pos * (n_pos + 1) / 2) / (n_pos * n_neg))
+
+
+
+if __name__ == "__main__":
+    import time
+
+    test_path = "../../DATA/neurosity/visual-p300/headset_test/oct_RISHABH_test4.csv"
+    session = SessionCovariances.from_recording(test_path, backend="scipy")
+    splits = stratified_splits(session.y)
+
+    # Every fold and setting reuses the same per-epoch stats
+    for name, kwargs in {"XdawnCov + MDM": {"xdawn": True}, "ERPCov + MDM": {"xdawn": False}}.items():
+        start = time.perf_counter()
+        auc = [
+            roc_auc(session.y[test], RiemannPipeline(**kwargs).fit(session, train).decision_function(session, test))
+            for train, test in splits
+        ]
+        print(f"{name}: AUC {np.mean(auc):.3f} +- {np.std(auc):.3f} ({time.perf_counter() - start:.3f}s for {len(splits)} folds)")
+
+    # Mid-session recalibration: fit on the first half, then add the rest in blocks of 12 flashes
+    n = len(session) // 2
+    model = RiemannPipeline().fit(session, np.arange(n))
+    start = time.perf_counter()
+    for i in range(n, len(session) - 12, 12):
+        model.partial_fit(session.X[i:i + 12], session.y[i:i + 12])
+    print(f"partial_fit: {(time.perf_counter() - start) / ((len(session) - n) // 12) * 1e3:.2f} ms per 12 trials")
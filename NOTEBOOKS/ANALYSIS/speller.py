@@ -0,0 +1,261 @@
+"""
+Dynamic-stopping decoder for the 6x6 P300 speller
+
+`lsl2.Start_GUI` / `aaroosh-pygame.Start_GUI` flash rows and columns forever; nothing decides which key the user
+wants. Here every classified flash is evidence: a posterior over the 36 keys is updated with the classifier score
+(keys in the flashed rows/columns get the score's target-vs-non-target log-likelihood ratio, the rest nothing), as
+one vectorized update per batch of flashes. As soon as the top key's posterior passes `threshold`, it's selected and
+the next character starts. Higher threshold = fewer errors, more flashes per character: characters per minute is a
+dial (`simulate` shows the trade-off) instead of a fixed number of repetitions.
+
+    decoder = SpellerDecoder(EvidenceAccumulator(threshold=0.95), mark=board.insert_marker)
+    detector = P300Detector(checker.predict, markers=decoder.codes, out=decoder.decisions)
+    Start_GUI(decoder)                          # lsl2: flashes call `decoder.flashed`, selected keys get typed
+
+Each flash gets its own marker value (cycling through `FLASH_CODES`), and a decision is matched to its flash by
+that value, so an epoch the detector drops or rejects costs one flash, not the alignment of every later one.
+
+Scores are whatever the detector sends (`P300Detector` decisions); `EvidenceAccumulator.calibrate` fits the
+target / non-target score distributions from calibration flashes.
+"""
+
+
+import queue
+from collections import deque
+
+import numpy as np
+from scipy.special import logsumexp
+
+
+KEYS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+N_ROWS, N_COLS = 6, 6
+FLASH_CODES = range(101, 165) # marker values of free-spelling flashes (1/2 stay non-target/target of calibration)
+
+
+def flash_mask(rows=(), cols=(), n_rows: int = N_ROWS, n_cols: int = N_COLS) -> np.ndarray:
+    """
+    (n_rows * n_cols,) bool: which keys lit up when `rows` and `cols` flashed together (row-major, like the GUIs).
+    """
+
+    grid = np.zeros((n_rows, n_cols), dtype=bool)
+    grid[list(rows), :] = True
+    grid[:, list(cols)] = True
+    return grid.ravel()
+
+
+class EvidenceAccumulator:
+    """
+    Posterior over the keys from a stream of (flash mask, classifier score) pairs.
+
+    Functionality:
+    - `update`: Add a batch of flashes; returns the selected key index once confident, else None.
+    - `posterior`: Current P(key | flashes so far).
+    - `calibrate`: Fit the score model from labelled calibration scores.
+    - `reset`: Start the next character.
+
+    Score model: target scores ~ N(`target_mean`, `std`), non-target ~ N(`nontarget_mean`, `std`), so a score's
+    log-likelihood ratio is linear in the score.
+    """
+
+    def __init__(
+        self,
+        n_keys: int = N_ROWS * N_COLS,
+        threshold: float = 0.95,
+        min_flashes: int = 4,
+        max_flashes: int = 120,
+        target_mean: float = 1.0,
+        nontarget_mean: float = -1.0,
+        std: float = 1.0
+    ):
+        """
+        Parameters:
+        - `threshold`: Posterior the top key needs to be selected.
+        - `min_flashes`: Never select before this many flashes (guards against one lucky score).
+        - `max_flashes`: Select the top key anyway after this many (~36 s at 300 ms per flash).
+        - `target_mean`, `nontarget_mean`, `std`: Score model (see `calibrate`).
+        """
+
+        self.n_keys = n_keys
+        self.threshold = threshold
+        self.min_flashes = min_flashes
+        self.max_flashes = max_flashes
+        self.target_mean, self.nontarget_mean, self.std = target_mean, nontarget_mean, std
+        self.reset()
+
+
+    def reset(self) -> None:
+        self._log_post = np.full(self.n_keys, -np.log(self.n_keys)) # uniform prior
+        self.n_flashes = 0
+
+
+    def calibrate(self, scores: np.ndarray, labels: np.ndarray) -> "EvidenceAccumulator":
+        """
+        Class means + pooled std of calibration `scores` (`labels`: 1 = target flash, 0 = non-target).
+        """
+
+        scores, labels = np.asarray(scores, dtype=np.float64), np.asarray(labels).astype(bool)
+        self.target_mean, self.nontarget_mean = scores[labels].mean(), scores[~labels].mean()
+        residuals = np.concatenate([scores[labels] - self.target_mean, scores[~labels] - self.nontarget_mean])
+        self.std = residuals.std()
+        return self
+
+
+    def llr(self, scores: np.ndarray) -> np.ndarray:
+        # log N(s; target) - log N(s; non-target)
+        scores = np.asarray(scores, dtype=np.float64)
+        return ((scores - self.nontarget_mean) ** 2 - (scores - self.target_mean) ** 2) / (2 * self.std ** 2)
+
+
+    @property
+    def posterior(self) -> np.ndarray:
+        return np.exp(self._log_post)
+
+
+    def update(self, masks: np.ndarray, scores: np.ndarray) -> int | None:
+        """
+        Add flashes: `masks` (n_flashes, n_keys) bool (see `flash_mask`), `scores` (n_flashes,).
+        Returns the selected key index (and resets) once the top key passes `threshold`, else None.
+        A batch is applied as a whole, so a selection can only happen at the end of it.
+        """
+
+        masks = np.atleast_2d(masks)
+        self._log_post = self._log_post + self.llr(scores) @ masks
+        self._log_post -= logsumexp(self._log_post)
+        self.n_flashes += len(masks)
+
+        top = int(np.argmax(self._log_post))
+        if self.n_flashes >= self.max_flashes or (
+            self.n_flashes >= self.min_flashes and self._log_post[top] >= np.log(self.threshold)
+        ):
+            self.reset()
+            return top
+        return None
+
+
+class SpellerDecoder:
+    """
+    Glue between the GUI, the detector and an `EvidenceAccumulator`.
+    - `flashed(rows, cols)`: the GUI flashed these; remembered under the next code of `codes`, which `mark()` gets
+      (e.g. `board.insert_marker`). Call it right after the flip that shows the flash.
+    - `poll()`: consume the detector decisions that arrived -> selected key or None.
+    Decisions are matched to flashes by marker value. They arrive in flash order, so flashes older than a decision's
+    one never got a decision (epoch dropped, marker filtered) and are given up (`missed`). Decisions without a score
+    (rejected epochs) just drop their flash; decisions for no pending flash are ignored (`unmatched`).
+    """
+
+    def __init__(
+        self,
+        accumulator: EvidenceAccumulator = None,
+        decisions: queue.Queue = None,
+        mark=None,
+        keys: str = KEYS,
+        codes=FLASH_CODES
+    ):
+        """
+        `codes` have to outnumber the flashes waiting for a decision at any time (64 flashes = ~19 s at 300 ms).
+        """
+
+        self.accumulator = EvidenceAccumulator() if accumulator is None else accumulator
+        self.decisions = queue.Queue() if decisions is None else decisions
+        self.mark = mark
+        self.keys = keys
+        self.codes = list(codes)
+        self._next = 0
+        self._pending = deque() # (code, character, mask) of flashes still waiting for their decision, in flash order
+        self.missed = self.unmatched = 0
+        self.typed = ""
+
+
+    def flashed(self, rows=(), cols=()) -> None:
+        code = self.codes[self._next % len(self.codes)]
+        self._next += 1
+        self._pending.append((code, len(self.typed), flash_mask(rows, cols)))
+        if self.mark is not None:
+            self.mark(code)
+
+
+    def _match(self, decision: dict):
+        # Pending (character, mask) of `decision`'s flash; drops the older flashes that were skipped
+        marker = decision.get("marker")
+        for i, (code, _, _) in enumerate(self._pending):
+            if code == marker:
+                break
+        else:
+            self.unmatched += 1
+            return None
+
+        for _ in range(i):
+            self._pending.popleft()
+        self.missed += i
+        return self._pending.popleft()[1:]
+
+
+    def poll(self) -> str | None:
+        masks, scores = [], []
+        while True:
+            try:
+                decision = self.decisions.get_nowait()
+            except queue.Empty:
+                break
+            flash = self._match(decision)
+            if flash is None:
+                continue
+            char, mask = flash
+            if char == len(self.typed) and decision.get("score") is not None: # late flashes of a typed key: dropped
+                masks.append(mask)
+                scores.append(decision["score"])
+
+        if not masks:
+            return None
+
+        selected = self.accumulator.update(np.array(masks), np.array(scores))
+        if selected is None:
+            return None
+
+        self.typed += self.keys[selected]
+        return self.keys[selected]
+
+
+def simulate(
+    accumulator: EvidenceAccumulator,
+    n_chars: int = 200,
+    d_prime: float = 1.0,
+    flash_duration: float = 0.3,
+    rows_per_flash: int = 3,
+    rng=None
+) -> dict:
+    """
+    Spell `n_chars` random keys with synthetic scores (non-target N(0, 1), target N(d_prime, 1)) and random
+    row/column flashes like lsl2's. Returns accuracy, mean flashes per character and characters per minute.
+    """
+
+    rng = np.random.default_rng(rng)
+    accumulator.target_mean, accumulator.nontarget_mean, accumulator.std = d_prime, 0.0, 1.0
+
+    correct, flashes = 0, 0
+    for _ in range(n_chars):
+        target = rng.integers(N_ROWS * N_COLS)
+        accumulator.reset()
+        selected = None
+        while selected is None:
+            mask = flash_mask(rng.choice(N_ROWS, rows_per_flash, replace=False), rng.choice(N_COLS, rows_per_flash, replace=False))
+            score = rng.normal(d_prime if mask[target] else 0.0)
+            selected = accumulator.update(mask, [score])
+            flashes += 1
+        correct += selected == target
+
+    return {
+        "accuracy": float(correct / n_chars),
+        "flashes_per_char": flashes / n_chars,
+        "chars_per_minute": n_chars / (flashes * flash_duration / 60),
+    }
+
+
+
+if __name__ == "__main__":
+    # Speed / accuracy trade-off for a moderately separable classifier
+    for threshold in (0.8, 0.9, 0.95, 0.99):
+        print(threshold, simulate(EvidenceAccumulator(threshold=threshold), d_prime=1.5, rng=0))
+
+    # 1 row + 1 column per flash (aaroosh-pygame style) instead of lsl2's 3 + 3
+    print("1+1", simulate(EvidenceAccumulator(threshold=0.95), d_prime=1.5, rows_per_flash=1, rng=0))
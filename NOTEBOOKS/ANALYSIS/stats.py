@@ -0,0 +1,107 @@
+"""
+Statistics for ERP plots
+
+Replaces the `bootstrap_ci` / `bootstrap_ci_per_channel` loops in `Ci_Classify.ipynb` (1000 x `np.random.choice` +
+mean, per channel, per condition). Here all resamples are drawn at once as a (n_bootstraps, n_trials) matrix of
+how many times each trial was picked; the bootstrap means for every channel and time point are then one matrix
+product. Channels x times are processed in chunks so memory stays bounded, optionally in a process pool.
+
+    lower, upper = bootstrap_ci(X[y == 2] * 1e6)    # (n_channels, n_times) CI band, µV
+    bands = erp_ci(X * 1e6, y)                       # {marker: (erp, lower, upper)} for every condition
+"""
+
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+
+BOOTSTRAP_CHUNK_BYTES = 64 << 20 # max size of one chunk of bootstrap means (64 MiB)
+
+
+def resample_counts(n_trials: int, n_bootstraps: int = 1000, rng=None) -> np.ndarray:
+    """
+    (n_bootstraps, n_trials) matrix: how often each trial was drawn in each resample (with replacement).
+    Same distribution as `np.random.choice(n_trials, n_trials)` per resample, drawn in one call.
+    """
+
+    rng = np.random.default_rng(rng)
+    picks = rng.integers(0, n_trials, size=(n_bootstraps, n_trials))
+    picks += np.arange(n_bootstraps)[:, None] * n_trials # row offset, so one bincount counts every row
+    return np.bincount(picks.ravel(), minlength=n_bootstraps * n_trials).reshape(n_bootstraps, n_trials)
+
+
+def _ci_chunk(weights: np.ndarray, data: np.ndarray, percentiles: tuple[float, float]) -> np.ndarray:
+    # (n_bootstraps, n_trials) @ (n_trials, chunk) -> bootstrap means of every column, then the two percentiles
+    means = weights @ data
+    return np.percentile(means, percentiles, axis=0)
+
+
+def bootstrap_ci(
+    data: np.ndarray,
+    ci: float = 95,
+    n_bootstraps: int = 1000,
+    rng=None,
+    n_jobs: int = None,
+    chunk_bytes: int = BOOTSTRAP_CHUNK_BYTES
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Percentile bootstrap confidence interval of the mean over trials (axis 0).
+    - `data`: (n_trials, n_times) or (n_trials, n_channels, n_times) -- any trailing shape works.
+    - Returns (lower, upper), each `data.shape[1:]`.
+    - `rng`: seed or np.random.Generator. The resamples are shared by every channel/time point (like resampling
+      whole trials), and drawn up front, so results don't depend on `n_jobs` or chunking.
+    - `n_jobs`: spread the chunks over a process pool (None = in this process; worth it for big batches only).
+    """
+
+    data = np.asarray(data)
+    n_trials = data.shape[0]
+    flat = data.reshape(n_trials, -1)
+
+    weights = resample_counts(n_trials, n_bootstraps, rng) / n_trials # one row per resample: mean = weights @ data
+    percentiles = ((100 - ci) / 2, 100 - (100 - ci) / 2)
+
+    # Columns per chunk, so (n_bootstraps, chunk) of means stays under `chunk_bytes`
+    chunk = max(1, chunk_bytes // (n_bootstraps * 8))
+    starts = range(0, flat.shape[1], chunk)
+
+    if n_jobs is None:
+        bounds = [_ci_chunk(weights, flat[:, i:i + chunk], percentiles) for i in starts]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            futures = [pool.submit(_ci_chunk, weights, flat[:, i:i + chunk], percentiles) for i in starts]
+            bounds = [future.result() for future in futures]
+
+    lower, upper = np.concatenate(bounds, axis=1) if bounds else np.empty((2, 0))
+    return lower.reshape(data.shape[1:]), upper.reshape(data.shape[1:])
+
+
+def erp_ci(X: np.ndarray, y: np.ndarray, ci: float = 95, n_bootstraps: int = 1000, rng=None, **kwargs) -> dict:
+    """
+    ERP + CI band for every condition in `y` (e.g. from `MNEFilter.epochs`): {label: (erp, lower, upper)},
+    each (n_channels, n_times). One seeded stream drives all conditions, so plots are reproducible.
+    """
+
+    rng = np.random.default_rng(rng)
+    bands = {}
+    for label in np.unique(y):
+        trials = X[y == label]
+        bands[label.item()] = (trials.mean(axis=0), *bootstrap_ci(trials, ci, n_bootstraps, rng, **kwargs))
+
+    return bands
+
+
+
+if __name__ == "__main__":
+    import time
+    from preprocess import MNEFilter, channels
+
+    test_path = "../../DATA/neurosity/visual-p300/2024_12_25_s01/X_rishabh_P300_01.csv"
+    X, y, events = MNEFilter(test_path, backend="scipy").epochs(event_id={"Non-Target": 1, "Target": 2})
+
+    start = time.perf_counter()
+    bands = erp_ci(X * 1e6, y, rng=0)
+    print(f"target + non-target CI, {len(channels)} channels: {time.perf_counter() - start:.3f}s")
+
+    for label, (erp, lower, upper) in bands.items():
+        print(label, erp.shape, float((upper - lower).mean()))
@@ -0,0 +1,316 @@
+"""
+Preprocessing x classifier sweeps
+
+Compares the P300 bands listed next to `CUTOFF_LOW_FREQ, CUTOFF_HIGH_FREQ` in `preprocess.py` ((1, 18), (0.1, 20),
+(1, 40)): evaluates every combination of band, notch, epoch window and decimation with every classifier, cross-validated like
+`Ci_Classify.ipynb` (stratified shuffle splits, ROC AUC).
+
+    sweep = Sweep(recordings, grid={"band": [(1, 18), (0.1, 20), (1, 40)], "decim": [1, 4]})
+    results = sweep.run(n_jobs=4)          # pd.DataFrame, one row per (recording, grid cell)
+
+Work is shared wherever the grid allows:
+- filtering depends only on (recording, band, notch): done once per combination, first, in a process pool;
+- epochs + per-epoch covariance stats depend on the window/decimation as well: one pool task per preprocessing
+  combination, which then runs every classifier and every fold on them (`riemann.SessionCovariances`).
+Both stages go through the `PipelineCache`, so a later sweep with an overlapping grid reuses them too.
+
+Results are appended to `results_path` as each task finishes; a rerun (or a crashed run, restarted) only computes
+the cells that aren't done yet. Cells that raised are recorded with status "failed" and retried by the next run;
+combinations that can never work (e.g. a decimation that aliases the band) are checked up front, recorded as
+"invalid" and not retried.
+"""
+
+
+import os
+import json
+import time
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from preprocess import (
+    CACHE_DIR_NAME, SFREQ, CUTOFF_LOW_FREQ, CUTOFF_HIGH_FREQ, POWERLINE_FREQ,
+    MNEFilter, design_filter, apply_fir, extract_epochs, source_digest,
+)
+from cache import PipelineCache
+from riemann import SessionCovariances, RiemannPipeline, shrink, stratified_splits, roc_auc
+
+
+SWEEP_RESULTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", CACHE_DIR_NAME, "sweep_results.csv")
+
+DEFAULT_GRID = {
+    "band": [(CUTOFF_LOW_FREQ, CUTOFF_HIGH_FREQ)],
+    "notch": [POWERLINE_FREQ],
+    "window": [(-0.1, 0.6)],
+    "decim": [1],
+    "classifier": ["XdawnCov + MDM", "ERPCov + MDM", "Vect + RegLDA"],
+}
+PREPROCESSING = ("band", "notch", "window", "decim")
+EVENT_ID = {"Non-Target": 1, "Target": 2}
+
+
+def _vect_lda(session: SessionCovariances, train: np.ndarray, test: np.ndarray) -> np.ndarray:
+    # Vectorized epochs + LDA with OAS-shrunk pooled covariance (the notebook's "Vect + RegLDA")
+    X = session.X.reshape(len(session), -1)
+    y = session.y
+    X_train, y_train = X[train], y[train]
+
+    means = np.stack([X_train[y_train == c].mean(axis=0) for c in (0, 1)])
+    centered = X_train - means[y_train]
+    S = shrink(centered.T @ centered / len(X_train), len(X_train), "oas")
+
+    w = np.linalg.solve(S, means[1] - means[0])
+    return X[test] @ w
+
+
+# name -> (session, train indices, test indices) -> target scores for the test epochs
+CLASSIFIERS = {
+    "XdawnCov + MDM": lambda s, train, test: RiemannPipeline(xdawn=True).fit(s, train).decision_function(s, test),
+    "ERPCov + MDM": lambda s, train, test: RiemannPipeline(xdawn=False).fit(s, train).decision_function(s, test),
+    "Vect + RegLDA": _vect_lda,
+}
+
+
+def _filter_key(band: tuple, notch: float) -> dict:
+    return {"band": band, "notch": notch, "sfreq": SFREQ}
+
+
+def _filtered(recording: str, band: tuple, notch: float, cache_root: str) -> np.ndarray:
+    """
+    Stage 1 (cached): (9, n_times) filtered EEG (V) + marker row of `recording`.
+    """
+
+    def compute():
+        data = MNEFilter(recording, backend="scipy")._volts()
+        kernels = design_filter(SFREQ, tuple(band), notch)
+        for h in kernels:
+            data[:8] = apply_fir(data[:8], h)
+        return {"data": data}
+
+    cache = PipelineCache(cache_root)
+    return cache.cached("sweep_filtered", recording, _filter_key(band, notch), compute)["data"]
+
+
+def _prefilter(recording: str, band: tuple, notch: float, cache_root: str) -> None:
+    # Pool task for stage 1: fills the cache; the array stays in the worker instead of being pickled back
+    _filtered(recording, band, notch, cache_root)
+
+
+def _invalid(band: tuple, notch: float, window: tuple, decim: int) -> str:
+    """
+    Why a preprocessing combination can't be evaluated -- the same on every run, so it's not worth retrying --
+    or "" if it can.
+    """
+
+    nyquist = SFREQ / 2
+    if not 0 < band[0] < band[1] < nyquist:
+        return f"Band {band} must satisfy 0 < low < high < Nyquist ({nyquist} Hz)."
+    if notch is not None and not 0 < notch < nyquist:
+        return f"Notch {notch} Hz must be between 0 and Nyquist ({nyquist} Hz)."
+    if not window[0] < window[1]:
+        return f"Window {window} must satisfy tmin < tmax."
+    if decim < 1 or SFREQ / decim / 2 <= band[1]:
+        return f"decim={decim} aliases: new Nyquist {SFREQ / decim / 2} Hz <= band edge {band[1]} Hz."
+    return ""
+
+
+def _session(recording: str, band: tuple, notch: float, window: tuple, decim: int, cache_root: str) -> SessionCovariances:
+    """
+    Stage 2 (cached): epochs of `recording` for one preprocessing combination, as `SessionCovariances`.
+    """
+
+    reason = _invalid(band, notch, window, decim)
+    if reason:
+        raise ValueError(reason)
+
+    def compute():
+        data = _filtered(recording, band, notch, cache_root)
+        X, markers, _ = extract_epochs(data[:8], data[-1], *window, event_id=EVENT_ID)
+        session = SessionCovariances(X[..., ::decim], (markers == EVENT_ID["Target"]).astype(np.int64))
+        return {"X": session.X, "XX": session.XX, "y": session.y}
+
+    cache = PipelineCache(cache_root)
+    params = {**_filter_key(band, notch), "window": window, "decim": decim, "event_id": EVENT_ID}
+    arrays = cache.cached("sweep_epochs", recording, params, compute)
+    return SessionCovariances(arrays["X"], arrays["y"], arrays["XX"])
+
+
+def _evaluate(recording: str, preprocessing: dict, classifiers: list[str], cv: dict, cache_root: str) -> list[dict]:
+    """
+    Pool task: build one preprocessing combination, then cross-validate every classifier on it.
+    Returns one result row per classifier (errors are recorded, not raised, so one bad cell can't stop a sweep).
+    """
+
+    rows = []
+    try:
+        start = time.perf_counter()
+        session = _session(recording, cache_root=cache_root, **preprocessing)
+        splits = stratified_splits(session.y, **cv)
+        prep_seconds = time.perf_counter() - start
+    except Exception as e:
+        return [{"classifier": name, "error": f"{type(e).__name__}: {e}"} for name in classifiers]
+
+    for name in classifiers:
+        start = time.perf_counter()
+        try:
+            auc = [roc_auc(session.y[test], CLASSIFIERS[name](session, train, test)) for train, test in splits]
+            rows.append({
+                "classifier": name,
+                "auc_mean": float(np.mean(auc)),
+                "auc_std": float(np.std(auc)),
+                "n_epochs": len(session),
+                "n_targets": int(session.y.sum()),
+                "seconds": prep_seconds + time.perf_counter() - start,
+                "error": "",
+            })
+        except Exception as e:
+            rows.append({"classifier": name, "error": f"{type(e).__name__}: {e}"})
+        prep_seconds = 0 # count the shared stages once
+
+    return rows
+
+
+class Sweep:
+    """
+    Grid of preprocessing settings x classifiers, cross-validated on each recording.
+
+    Functionality:
+    - `cells`: Every (recording, grid cell) of the sweep, as dicts.
+    - `pending`: Cells without a "done" or "invalid" row in the results table (never run, or failed).
+    - `run`: Evaluate the pending cells (optionally in a process pool); returns the full results table.
+      Invalid cells (`_invalid`) are recorded as such without being run.
+    - `results`: The persisted results table, latest row per cell.
+    """
+
+    def __init__(
+        self,
+        recordings: str | list[str],
+        grid: dict = None,
+        cv: dict = None,
+        results_path: str = SWEEP_RESULTS,
+        cache: PipelineCache = None
+    ):
+        """
+        Parameters:
+        - `recordings`: Train-format CSV path(s). Each is evaluated on its own.
+        - `grid`: Lists of values per key of `DEFAULT_GRID` (band, notch, window, decim, classifier);
+          missing keys use the default. Names in "classifier" are keys of `CLASSIFIERS`.
+        - `cv`: `stratified_splits` arguments (default 10 splits, 25% test, seed 42 -- as in `Ci_Classify`).
+        """
+
+        self.recordings = [recordings] if isinstance(recordings, str) else list(recordings)
+        self.grid = {**DEFAULT_GRID, **(grid or {})}
+        self.cv = {"n_splits": 10, "test_size": 0.25, "rng": 42, **(cv or {})}
+        self.results_path = os.path.abspath(results_path)
+        self.cache = PipelineCache() if cache is None else cache
+
+        unknown = set(self.grid["classifier"]) - set(CLASSIFIERS)
+        if unknown:
+            raise ValueError(f"Unknown classifiers {sorted(unknown)}; known: {list(CLASSIFIERS)}.")
+
+
+    def cells(self) -> list[dict]:
+        keys = [*PREPROCESSING, "classifier"]
+        cells = []
+        for recording in self.recordings:
+            digest = source_digest(recording) # a cell is identified by content, not file name
+            for values in itertools.product(*(self.grid[key] for key in keys)):
+                cell = dict(zip(keys, values))
+                cell["band"], cell["window"] = tuple(cell["band"]), tuple(cell["window"])
+                cells.append({"recording": recording, "source": digest, **cell, "cell": self._cell_id(digest, cell)})
+        return cells
+
+
+    def _cell_id(self, digest: str, cell: dict) -> str:
+        return json.dumps({"source": digest, **cell, "cv": self.cv}, sort_keys=True)
+
+
+    def results(self) -> pd.DataFrame:
+        if not os.path.exists(self.results_path):
+            return pd.DataFrame(columns=["cell", "status"])
+        results = pd.read_csv(self.results_path, keep_default_na=False, na_values={"auc_mean": [""], "auc_std": [""]})
+        return results.drop_duplicates("cell", keep="last") # a retried cell appends a new row
+
+
+    def pending(self) -> list[dict]:
+        results = self.results()
+        done = set(results.loc[results["status"].isin(["done", "invalid"]), "cell"])
+        return [cell for cell in self.cells() if cell["cell"] not in done]
+
+
+    def _append(self, rows: list[dict]) -> None:
+        # One small append per finished task; the header is written with the first rows
+        os.makedirs(os.path.dirname(self.results_path), exist_ok=True)
+        df = pd.DataFrame(rows)
+        df["band"] = df["band"].map(list).map(json.dumps)
+        df["window"] = df["window"].map(list).map(json.dumps)
+        status = np.where(df["error"] == "", "done", "failed")
+        df["status"] = df["status"].fillna(pd.Series(status, index=df.index)) if "status" in df else status
+        columns = ["cell", "status", "recording", "source", *PREPROCESSING, "classifier",
+                   "auc_mean", "auc_std", "n_epochs", "n_targets", "seconds", "error"]
+        df.reindex(columns=columns).to_csv(
+            self.results_path, mode="a", header=not os.path.exists(self.results_path), index=False
+        )
+
+
+    def run(self, n_jobs: int = None) -> pd.DataFrame:
+        """
+        Evaluate every pending cell. `n_jobs=None` runs in this process.
+        """
+
+        pending = []
+        for cell in self.pending():
+            reason = _invalid(*(cell[key] for key in PREPROCESSING))
+            if reason:
+                self._append([{**cell, "status": "invalid", "error": f"ValueError: {reason}"}])
+            else:
+                pending.append(cell)
+
+        # Group cells by (recording, preprocessing): each group's upstream stages are built once
+        groups = {}
+        for cell in pending:
+            group = (cell["recording"], *(cell[key] for key in PREPROCESSING))
+            groups.setdefault(group, []).append(cell)
+        filter_jobs = sorted( # notch may be None, which doesn't compare with a frequency
+            {(g[0], g[1], g[2]) for g in groups}, key=lambda job: tuple((x is None, x or 0) for x in job)
+        )
+
+        def tasks(pool_map):
+            # Stage 1 first (one task per recording x band x notch), so stage-2 tasks never filter the same thing twice
+            list(pool_map(_prefilter, *zip(*filter_jobs), [self.cache.root] * len(filter_jobs)))
+            for cells, rows in zip(groups.values(), pool_map(
+                _evaluate,
+                [g[0] for g in groups],
+                [dict(zip(PREPROCESSING, g[1:])) for g in groups],
+                [[cell["classifier"] for cell in cells] for cells in groups.values()],
+                [self.cv] * len(groups),
+                [self.cache.root] * len(groups),
+            )):
+                self._append([{**cell, **row} for cell, row in zip(cells, rows)])
+
+        if groups:
+            if n_jobs is None:
+                tasks(map)
+            else:
+                with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+                    tasks(pool.map)
+
+        return self.results()
+
+
+
+if __name__ == "__main__":
+    data_dir = "../../DATA/neurosity/visual-p300/headset_test"
+    sweep = Sweep(
+        [os.path.join(data_dir, "oct_RISHABH_test4.csv")],
+        grid={"band": [(1, 18), (0.1, 20), (1, 40)], "decim": [1, 4]},
+    )
+
+    print(f"{len(sweep.pending())} of {len(sweep.cells())} cells to compute")
+    start = time.perf_counter()
+    results = sweep.run(n_jobs=4)
+    print(f"{time.perf_counter() - start:.1f}s")
+
+    print(results.sort_values("auc_mean", ascending=False)[["band", "decim", "classifier", "auc_mean", "auc_std", "error"]].to_string(index=False))
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+
+from catalog import Catalog, scan_file
+from preprocess import SFREQ, channels
+
+
+def _write_train(path, eeg: np.ndarray) -> str:
+    # Train format: index, 8 channels, marker (a target flash every second)
+    markers = np.zeros(len(eeg))
+    markers[::SFREQ] = 2
+    df = pd.DataFrame(eeg, columns=channels)
+    df.insert(0, "1-31", np.arange(len(eeg), dtype=float))
+    df["Marker"] = markers
+    df.to_csv(path, index=False)
+    return str(path)
+
+
+def _eeg(n: int = 10 * SFREQ, seed: int = 0) -> np.ndarray:
+    # ~20 µV of noise + a 60 Hz line, like an unfiltered Crown recording
+    rng = np.random.default_rng(seed)
+    t = np.arange(n) / SFREQ
+    return 20 * rng.standard_normal((n, 8)) + 50 * np.sin(2 * np.pi * 60 * t)[:, None]
+
+
+def test_large_dc_offset_is_still_uv(tmp_path):
+    # The Crown's DC offsets reach ~5e5 µV; the offset alone doesn't make a file raw counts
+    offsets = np.array([-88e3, 5.03e5, 5.03e5, 5.03e5, 5.03e5, 5.03e5, 5.03e5, -76e3])
+    entry = scan_file(_write_train(tmp_path / "offset.csv", _eeg() + offsets))
+
+    assert entry["format"] == "train"
+    assert entry["amplitude"] == "uV"
+    assert entry["markers"] == {"2": 10}
+
+
+def test_raw_counts(tmp_path):
+    # Unscaled ADC counts: same signal, ~45 counts per µV
+    entry = scan_file(_write_train(tmp_path / "counts.csv", _eeg() * 45 * 20 + 8e6))
+    assert entry["amplitude"] == "counts"
+
+
+def test_query_by_amplitude(tmp_path):
+    _write_train(tmp_path / "offset.csv", _eeg() + 5e5)
+    _write_train(tmp_path / "counts.csv", _eeg(seed=1) * 45 * 20)
+
+    cat = Catalog(str(tmp_path), manifest_path=str(tmp_path / "catalog.json")).build(max_workers=1)
+    assert cat.query(amplitude="uV") == ["offset.csv"]
+    assert cat.query(amplitude="counts") == ["counts.csv"]
@@ -0,0 +1,112 @@
+import json
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from epoch_store import EpochStore, EpochDataset
+
+
+def _epochs(n: int, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).standard_normal((n, 8, 181)).astype(np.float32)
+
+
+def _fill(root) -> tuple[EpochStore, np.ndarray]:
+    store = EpochStore(str(root))
+    X = _epochs(10)
+    store.append(X[:6], [1, 2, 1, 1, 2, 1], session="a", subject="s1", onsets=np.arange(6) * 100)
+    store.append(X[6:], [2, 1, 1, 2], session="b", subject="s2")
+    return store, X
+
+
+def _crash_mid_append(store: EpochStore) -> None:
+    # What a killed append leaves behind: bytes past the commit point, meta.json untouched
+    with open(store._data_path, "ab") as f:
+        f.write(b"\0" * 1000)
+    with open(store._metadata_path, "a") as f:
+        f.write("c,s3,2,")
+
+
+def test_append_and_read_back(tmp_path):
+    store, X = _fill(tmp_path)
+
+    reopened = EpochStore(str(tmp_path))
+    assert reopened.shape == (10, 8, 181)
+    np.testing.assert_array_equal(reopened.X, X)
+    assert reopened.metadata["session"].tolist() == ["a"] * 6 + ["b"] * 4
+    assert reopened.metadata["onset"].tolist()[:6] == [0, 100, 200, 300, 400, 500]
+    np.testing.assert_array_equal(reopened.select(subject="s2", marker=2), [6, 9])
+
+
+def test_crashed_append_is_cut_off(tmp_path):
+    store, X = _fill(tmp_path)
+    _crash_mid_append(store)
+
+    store = EpochStore(str(tmp_path))
+    assert len(store.metadata) == 10 # uncommitted rows aren't read either
+    store.append(X[:2], [1, 1], session="c")
+
+    assert os.path.getsize(store._data_path) == 12 * 8 * 181 * 4
+    np.testing.assert_array_equal(store.X[10:], X[:2])
+    assert pd.read_csv(store._metadata_path)["session"].tolist() == ["a"] * 6 + ["b"] * 4 + ["c"] * 2
+
+
+def test_append_does_not_read_metadata(tmp_path, monkeypatch):
+    store, X = _fill(tmp_path)
+    _crash_mid_append(store)
+
+    def read_csv(*args, **kwargs):
+        raise AssertionError("append read metadata.csv")
+
+    monkeypatch.setattr(pd, "read_csv", read_csv)
+    EpochStore(str(tmp_path)).append(X[:1], [2], session="c")
+
+
+def test_crashed_first_append(tmp_path):
+    store = EpochStore(str(tmp_path))
+    store.append(_epochs(2), [1, 2], session="a")
+    meta = json.load(open(store._meta_path))
+    meta.update(n_epochs=0, metadata_bytes=0) # as if the crash came before the first commit
+    json.dump(meta, open(store._meta_path, "w"))
+
+    store = EpochStore(str(tmp_path))
+    store.append(_epochs(1), [2], session="b")
+    assert EpochStore(str(tmp_path)).metadata["session"].tolist() == ["b"]
+
+
+def test_store_without_metadata_bytes(tmp_path):
+    store, X = _fill(tmp_path)
+    meta = json.load(open(store._meta_path))
+    del meta["metadata_bytes"] # written before the offset was recorded
+    json.dump(meta, open(store._meta_path, "w"))
+    _crash_mid_append(store)
+
+    store = EpochStore(str(tmp_path))
+    store.append(X[:1], [2], session="c")
+    assert EpochStore(str(tmp_path)).metadata["session"].tolist() == ["a"] * 6 + ["b"] * 4 + ["c"]
+
+
+def test_epoch_dataset(tmp_path):
+    torch = pytest.importorskip("torch")
+    store, X = _fill(tmp_path)
+
+    dataset = store.dataset(store.select(marker=[1, 2]), label_map={1: 0, 2: 1}, transform=lambda x: x * 2)
+    assert len(dataset) == 10
+    x, label = dataset[1]
+    assert x.dtype == torch.float32 and x.shape == (8, 181)
+    torch.testing.assert_close(x, torch.from_numpy(X[1]) * 2)
+    assert dataset.labels.tolist() == [0, 1, 0, 0, 1, 0, 1, 0, 0, 1]
+
+    subset = EpochDataset(str(tmp_path), indices=[9, 6])
+    torch.testing.assert_close(subset[0][0], torch.from_numpy(X[9]))
+    assert subset.labels.tolist() == [2, 2]
+
+    # DataLoader workers get a pickled copy that reopens the memmap
+    restored = pickle.loads(pickle.dumps(subset))
+    assert restored._store is not None
+    torch.testing.assert_close(restored[1][0], torch.from_numpy(X[6]))
+
+    batch, labels = next(iter(torch.utils.data.DataLoader(dataset, batch_size=4)))
+    assert batch.shape == (4, 8, 181) and labels.tolist() == [0, 1, 0, 0]